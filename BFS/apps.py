@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class BFSConfig(AppConfig):
+    '''
+    프로젝트 전체에 걸리는 설정 (앱마다 두지 않는다)
+    '''
+    name = 'BFS'
+
+    def ready(self):
+        from . import db  # noqa: F401  DB 연결 설정
@@ -0,0 +1,37 @@
+'''
+DB 연결 설정
+
+- SQLite: 연결마다 WAL 모드와 synchronous=NORMAL 을 켠다. (busy timeout 은 settings 의 OPTIONS['timeout'])
+  WAL 에서는 쓰기 중에도 읽기가 막히지 않고, 쓰기끼리는 timeout 동안 기다렸다가 차례로 실행된다.
+- 재사용하는 연결(CONN_MAX_AGE)은 요청 시작 시 살아 있는지 확인하고 끊긴 연결은 닫는다.
+  (Django 3.2 에는 CONN_HEALTH_CHECKS 가 없다)
+'''
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',  # WAL 에서는 커밋마다 fsync 하지 않아도 DB 가 깨지지 않는다
+)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is not None and connection.settings_dict['CONN_MAX_AGE'] and not connection.is_usable():
+            connection.close()
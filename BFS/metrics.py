@@ -0,0 +1,291 @@
+'''
+요청별 계측: 뷰별 응답 시간, SQL 쿼리 수/시간, serializer 시간, 응답 크기, 같은 SQL 반복(N+1) 감지
+
+- InstrumentationMiddleware 가 요청마다 값을 모아 프로세스 단위 registry 에 더한다. (WSGI, ASGI 모두)
+  SQL 은 모든 DB 연결에 건 execute wrapper 가 contextvar 로 현재 요청을 찾아 재므로,
+  DEBUG 가 꺼져 있거나 sync_to_async 스레드에서 실행된 쿼리도 센다.
+- /metrics 에서 Prometheus text 형식으로 내보낸다. (Authorization: Bearer <METRICS_TOKEN> 일 때만)
+- SLOW_REQUEST_MS 를 넘거나 N+1 이 의심되는 요청은 SLOW_REQUEST_SAMPLE_RATE 비율로 BFS.metrics 로거에 남긴다.
+- serializer 시간은 TimedSerializerMixin / TimedListSerializer 를 쓴 serializer 와 movies.rows 의 .data 만 잰다.
+- INSTRUMENTATION = False 면 미들웨어가 빠지고(MiddlewareNotUsed) 요청별 값이 없으니 아무것도 재지 않는다.
+스트리밍 응답은 내보낸 바이트만 끝난 뒤에 더하고, 스트리밍 중의 쿼리는 세지 않는다.
+'''
+import asyncio
+import contextvars
+import hmac
+import logging
+import random
+import threading
+from collections import Counter, defaultdict
+from functools import wraps
+from time import perf_counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseNotFound
+from rest_framework.serializers import ListSerializer, Serializer
+
+
+logger = logging.getLogger(__name__)
+
+# 응답 시간 히스토그램 구간 (초)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.queries = Counter()  # SQL (파라미터 제외) 별 실행 횟수
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self):
+        '''
+        N_PLUS_ONE_THRESHOLD 번 이상 반복된 SQL: [(sql, 횟수), ...] 많은 순
+        '''
+        return [(sql, count) for sql, count in self.queries.most_common() if count >= settings.N_PLUS_ONE_THRESHOLD]
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += perf_counter() - start
+        metrics.queries[sql] += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    # 맨 앞에 넣어야 connection.execute_wrapper() 블록이 끝날 때 pop() 으로 빠지지 않는다
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def timed_serializer(data):
+    '''
+    serializer 의 data getter 에 걸린 시간을 현재 요청의 serializer_time 에 더한다.
+    '''
+    @wraps(data)
+    def timed_data(self):
+        metrics = _current.get()
+        # 안쪽 serializer 의 .data (중첩 필드 등)는 바깥 시간에 이미 들어 있다
+        if metrics is None or metrics.serializing:
+            return data(self)
+        metrics.serializing = True
+        start = perf_counter()
+        try:
+            return data(self)
+        finally:
+            metrics.serializer_time += perf_counter() - start
+            metrics.serializing = False
+    return timed_data
+
+
+class TimedSerializerMixin:
+    '''
+    .data 를 timed_serializer 로 잰다. many=True 로 쓰는 serializer 는 Meta.list_serializer_class 도 TimedListSerializer 로
+    '''
+    data = property(timed_serializer(Serializer.data.fget))
+
+
+class TimedListSerializer(ListSerializer):
+    data = property(timed_serializer(ListSerializer.data.fget))
+
+
+class Registry:
+    '''
+    프로세스 단위 누적값, 키는 (view, method)
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Counter()  # (view, method, status)
+            self.sums = defaultdict(Counter)  # 이름 -> (view, method) -> 합계
+            self.buckets = defaultdict(lambda: [0] * len(BUCKETS))
+
+    def observe(self, view, method, status, duration, metrics, response_bytes):
+        key = (view, method)
+        duplicates = metrics.duplicates()
+        with self.lock:
+            self.requests[view, method, status] += 1
+            sums = self.sums
+            sums['duration_seconds'][key] += duration
+            sums['db_queries'][key] += metrics.query_count
+            sums['db_seconds'][key] += metrics.db_time
+            sums['serializer_seconds'][key] += metrics.serializer_time
+            sums['response_bytes'][key] += response_bytes
+            sums['duplicate_queries'][key] += sum(count - 1 for _, count in duplicates)
+            sums['n_plus_one_requests'][key] += bool(duplicates)
+            buckets = self.buckets[key]
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    buckets[i] += 1
+
+    def add_bytes(self, view, method, response_bytes):
+        with self.lock:
+            self.sums['response_bytes'][view, method] += response_bytes
+
+    def render(self):
+        '''
+        Prometheus text exposition format
+        '''
+        with self.lock:
+            requests = dict(self.requests)
+            sums = {name: dict(values) for name, values in self.sums.items()}
+            buckets = {key: list(values) for key, values in self.buckets.items()}
+
+        lines = [
+            '# HELP bfs_requests_total 처리한 요청 수',
+            '# TYPE bfs_requests_total counter',
+        ]
+        for (view, method, status), count in sorted(requests.items()):
+            lines.append(f'bfs_requests_total{_labels(view=view, method=method, status=status)} {count}')
+
+        lines += [
+            '# HELP bfs_request_duration_seconds 뷰별 응답 시간',
+            '# TYPE bfs_request_duration_seconds histogram',
+        ]
+        durations = sums.get('duration_seconds', {})
+        for key, counts in sorted(buckets.items()):
+            view, method = key
+            total = sum(count for (v, m, _), count in requests.items() if (v, m) == key)
+            for bound, count in zip(BUCKETS, counts):
+                lines.append(f'bfs_request_duration_seconds_bucket{_labels(view=view, method=method, le=bound)} {count}')
+            lines.append(f'bfs_request_duration_seconds_bucket{_labels(view=view, method=method, le="+Inf")} {total}')
+            lines.append(f'bfs_request_duration_seconds_sum{_labels(view=view, method=method)} {durations.get(key, 0):.6f}')
+            lines.append(f'bfs_request_duration_seconds_count{_labels(view=view, method=method)} {total}')
+
+        for name, help_text in COUNTERS:
+            lines += [f'# HELP bfs_{name}_total {help_text}', f'# TYPE bfs_{name}_total counter']
+            for (view, method), value in sorted(sums.get(name, {}).items()):
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'bfs_{name}_total{_labels(view=view, method=method)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+COUNTERS = (
+    ('db_queries', 'SQL 쿼리 수'),
+    ('db_seconds', 'SQL 실행 시간'),
+    ('serializer_seconds', 'DRF serializer 의 .data 시간'),
+    ('response_bytes', '응답 크기'),
+    ('duplicate_queries', 'N_PLUS_ONE_THRESHOLD 번 이상 반복된 SQL 의 중복 실행 수'),
+    ('n_plus_one_requests', '반복된 SQL 이 있었던 요청 수'),
+)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+registry = Registry()
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all():
+            install_query_recorder(connection)
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, perf_counter() - start)
+
+    def finish(self, request, response, metrics, duration):
+        view, method = view_label(request), request.method
+        if response.streaming:
+            response.streaming_content = self.count_bytes(response.streaming_content, view, method)
+            response_bytes = 0
+        else:
+            response_bytes = len(response.content)
+        registry.observe(view, method, response.status_code, duration, metrics, response_bytes)
+        self.log(request, response, view, duration, metrics, response_bytes)
+        return response
+
+    def count_bytes(self, content, view, method):
+        sent = 0
+        try:
+            for chunk in content:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            registry.add_bytes(view, method, sent)
+
+    def log(self, request, response, view, duration, metrics, response_bytes):
+        duplicates = metrics.duplicates()
+        slow = duration * 1000 >= settings.SLOW_REQUEST_MS
+        if not (slow or duplicates) or random.random() >= settings.SLOW_REQUEST_SAMPLE_RATE:
+            return
+        logger.warning(
+            '%s %s %s (%s) %d %.1f ms, queries %d (%.1f ms), serializer %.1f ms, %d bytes%s',
+            'slow request' if slow else 'repeated queries', request.method, request.get_full_path(), view,
+            response.status_code, duration * 1000, metrics.query_count, metrics.db_time * 1000,
+            metrics.serializer_time * 1000, response_bytes,
+            ''.join(f'\n  {count}x {sql[:200]}' for sql, count in duplicates[:3]),
+        )
+
+
+def authorized(request):
+    '''
+    Authorization: Bearer <METRICS_TOKEN> (Prometheus 의 authorization / bearer_token 설정), METRICS_TOKEN 이 없으면 막는다
+    프록시 뒤에서는 REMOTE_ADDR 이 프록시 주소라 주소로는 가릴 수 없다.
+    '''
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+
+
+def metrics_view(request):
+    '''
+    GET /metrics, Prometheus 가 긁어 가는 주소 (METRICS_TOKEN 을 가진 요청만)
+    '''
+    if not settings.INSTRUMENTATION or not authorized(request):
+        return HttpResponseNotFound()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,31 @@
+'''
+orjson 으로 JSON 을 만드는 DRF renderer (REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'])
+
+출력은 JSONRenderer 와 같다. (UTF-8 그대로, 공백 없음, U+2028/U+2029 이스케이프)
+orjson 이 모르는 값(datetime, Decimal, lazy 문자열 등)은 DRF 의 JSONEncoder 에 맡기고,
+orjson 이 설치되어 있지 않거나 ?indent 를 요청하면 JSONRenderer 로 만든다.
+'''
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                # datetime 은 DRF 와 같은 형식(밀리초까지)으로 쓰도록 encoder 에 넘긴다
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            # 64 bit 를 넘는 정수 등
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -49,6 +49,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'BFS',  # BFS.apps: DB 연결 설정 (BFS.db)
     'accounts',
     'movies',
 
@@ -65,6 +66,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 요청별 계측 (BFS.metrics), 다른 미들웨어 시간까지 재도록 맨 앞
+    'BFS.metrics.InstrumentationMiddleware',
     "corsheaders.middleware.CorsMiddleware",
 
     'django.middleware.security.SecurityMiddleware',
@@ -103,12 +106,37 @@ WSGI_APPLICATION = 'BFS.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# secrets.json 에 DATABASE ({"NAME", "USER", "PASSWORD", "HOST", "PORT"}) 가 있으면 PostgreSQL 을 사용한다.
+# 연결 설정(SQLite WAL, 연결 health check)은 BFS/db.py
+
+if 'DATABASE' in secrets:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            **secrets['DATABASE'],
+            # 워커 스레드마다 연결을 60초 동안 재사용 (pgbouncer 를 앞에 둘 때는 0)
+            'CONN_MAX_AGE': 60,
+            'OPTIONS': {
+                'connect_timeout': 5,
+                'keepalives': 1,
+                'keepalives_idle': 30,
+                'keepalives_interval': 10,
+                'keepalives_count': 3,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'timeout': 20,  # busy timeout (초), 다른 연결이 쓰는 중이면 이만큼 기다린다
+            },
+        }
     }
-}
+
+DB_HEALTH_CHECKS = True  # 재사용하는 연결을 요청 시작 시 확인 (BFS/db.py)
 
 
 # Password validation
@@ -163,6 +191,14 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
     ),
+    # orjson 이 설치되어 있으면 orjson 으로, 없으면 JSONRenderer 와 같게 (BFS.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'BFS.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'movies.pagination.KeysetPagination',
+    # KeysetPagination 의 기본 페이지 크기 (?page_size= 로 최대 100 까지 변경 가능)
+    'PAGE_SIZE': 20,
 }
 
 
@@ -170,4 +206,64 @@ import datetime
 
 JWT_AUTH = {
     'JWT_EXPIRATION_DELTA': datetime.timedelta(days=1),
-}
\ No newline at end of file
+}
+
+
+# TMDB
+TMDB_API_KEY = secrets.get('TMDB_API_KEY', 'YOUR_API_KEY_HERE')
+TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+TMDB_LANGUAGE = 'ko'
+TMDB_TIMEOUT = 5  # 초
+TMDB_MAX_CONCURRENCY = 10  # async 뷰에서 동시에 보내는 TMDB 요청 수 (movies.tmdb_async)
+# movies.models.TmdbMovieInfo 캐시: TTL 이 지난 항목은 다시 받아오고, 개수가 넘치면 가장 오래 안 쓴 것부터 삭제
+TMDB_CACHE_TTL = datetime.timedelta(days=7)
+TMDB_CACHE_MAX_ENTRIES = 100000
+TMDB_CACHE_EVICT_EVERY = 1000  # 새 항목을 이만큼 넣을 때마다 MAX_ENTRIES 를 넘는 항목을 정리한다
+
+
+# 검색 (movies.search), None 이면 DB 에 맞춰 고른다 (SQLite: FTS5 색인, PostgreSQL: tsvector + GIN 색인, 그 외: icontains)
+SEARCH_BACKEND = None
+
+
+# 요청 처리 후로 미루는 작업 (BFS.tasks), 'thread': 커밋 후 스레드 풀에서, 'eager': 호출한 자리에서 바로
+TASK_RUNNER = 'thread'
+TASK_WORKERS = 4
+TASK_RETRIES = 3
+TASK_RETRY_DELAY = 0.5  # 초, 재시도마다 두 배
+TEST_RUNNER = 'BFS.test_runner.TestRunner'
+
+
+# 팔로우한 유저의 활동 피드 (movies.feed), 커밋 후 BFS.tasks 작업으로 타임라인에 복사, False 면 끔
+FEED_FANOUT = True
+FEED_MAX_ENTRIES = 500  # 유저마다 남기는 최신 타임라인 항목 수
+
+
+# 요청별 계측 (BFS.metrics), False 면 미들웨어와 /metrics 를 모두 끈다
+INSTRUMENTATION = True
+# secrets.json 의 METRICS_TOKEN, /metrics 는 Authorization: Bearer <METRICS_TOKEN> 로만 볼 수 있다 (없으면 막는다)
+METRICS_TOKEN = secrets.get('METRICS_TOKEN')
+N_PLUS_ONE_THRESHOLD = 5  # 한 요청에서 같은 SQL 이 이만큼 반복되면 N+1 로 본다
+SLOW_REQUEST_MS = 500  # 이보다 오래 걸린 요청은 BFS.metrics 로거에 남긴다
+SLOW_REQUEST_SAMPLE_RATE = 1.0  # 느린/N+1 요청 중 로그로 남길 비율
+
+
+# 캐시, responses 는 movies.cache 의 GET 응답 캐시 (LocMemCache 는 LRU 로 MAX_ENTRIES 를 넘으면 오래 안 쓴 것부터 지운다)
+# secrets.json 에 REDIS_URL 이 있으면 Redis 사용 (pip install django-redis)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+if secrets.get('REDIS_URL'):
+    CACHES['responses'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': secrets['REDIS_URL'],
+        'TIMEOUT': 600,
+    }
+RESPONSE_CACHE = 'responses'  # None 이면 응답 캐시를 쓰지 않는다
@@ -0,0 +1,147 @@
+'''
+요청 처리 후로 미뤄도 되는 작업(선호도 갱신, TMDB 캐시 갱신 등)을 실행하는 프로세스 내 작업 실행기
+
+    @task(ordered_by='user_pk')
+    def update_something(user_pk, ...):
+        ...
+
+    update_something.delay(request.user.pk, ...)
+
+settings.TASK_RUNNER
+    'thread': 커밋 후에 TASK_WORKERS 개의 스레드 중 하나에 넣는다. (기본)
+    'eager': 호출한 자리에서 바로 실행한다. (테스트, BFS.test_runner)
+ordered_by 인자 값이 같은 작업은 항상 같은 스레드에서 넣은 순서대로 실행되므로, 한 유저의 작업이 뒤바뀌지 않는다.
+실패하면 TASK_RETRY_DELAY 부터 두 배씩 기다리며 TASK_RETRIES 번 다시 시도하고, 그래도 실패하면 로그만 남긴다.
+(시도마다 한 트랜잭션, eager 에서는 마지막 실패를 예외로 올린다)
+큐는 메모리에 있으므로 프로세스가 끝날 때 남아 있던 작업은 사라진다.
+'''
+import inspect
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+
+    def __init__(self, fn, args, kwargs, key):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+
+    def __str__(self):
+        return f'{self.fn.__module__}.{self.fn.__name__}{self.args}'
+
+
+class TaskRunner:
+    '''
+    key 별로 순서를 지키는 스레드 풀, 스레드마다 큐가 하나이고 key 의 해시로 큐를 고른다.
+    (key 가 None 이면 돌아가며 넣는다)
+    '''
+    def __init__(self, workers):
+        self.lanes = [queue.Queue() for _ in range(workers)]
+        self.threads = [None] * workers
+        self.lock = threading.Lock()
+        self.next_lane = itertools.count()
+        self.stats = Counter()
+
+    def submit(self, job):
+        index = (next(self.next_lane) if job.key is None else hash(job.key)) % len(self.lanes)
+        with self.lock:
+            thread = self.threads[index]
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self.work, args=(self.lanes[index],), name=f'tasks-{index}', daemon=True)
+                self.threads[index] = thread
+                thread.start()
+        self.lanes[index].put(job)
+
+    def work(self, lane):
+        while True:
+            job = lane.get()
+            try:
+                self.stats[run(job)] += 1
+            finally:
+                lane.task_done()
+
+    def join(self):
+        '''
+        지금까지 넣은 작업이 모두 끝날 때까지 기다린다. (테스트, 벤치마크)
+        '''
+        for lane in self.lanes:
+            lane.join()
+
+
+def run(job, retries=None, retry_delay=None, eager=False):
+    '''
+    job 을 실행하고 결과('done', 'failed')를 반환, 실패하면 retries 번 다시 시도한다.
+    시도마다 트랜잭션 하나로 실행하므로 실패한 시도의 쓰기는 모두 롤백되고, 재시도가 일부만 두 번 반영하지 않는다.
+    eager: 요청 스레드에서 실행 중이므로 연결을 닫지 않고, 마지막 실패는 예외를 그대로 올린다. (테스트에서 숨지 않도록)
+    '''
+    retries = settings.TASK_RETRIES if retries is None else retries
+    retry_delay = settings.TASK_RETRY_DELAY if retry_delay is None else retry_delay
+    for attempt in range(retries + 1):
+        if not eager:
+            close_old_connections()
+        try:
+            with transaction.atomic():
+                job.fn(*job.args, **job.kwargs)
+            return 'done'
+        except Exception:
+            if attempt == retries:
+                logger.exception('작업 실패: %s', job)
+                if eager:
+                    raise
+                return 'failed'
+            logger.warning('작업 재시도 (%d/%d): %s', attempt + 1, retries, job)
+            time.sleep(retry_delay * 2 ** attempt)
+        finally:
+            if not eager:
+                close_old_connections()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = TaskRunner(settings.TASK_WORKERS)
+        return _runner
+
+
+def enqueue(job):
+    if settings.TASK_RUNNER == 'eager':
+        # 바로 실행하되 재시도 대기는 하지 않는다
+        run(job, retry_delay=0, eager=True)
+    else:
+        transaction.on_commit(lambda: get_runner().submit(job))
+
+
+def task(ordered_by=None):
+    '''
+    fn.delay(*args, **kwargs) 로 fn 을 작업 실행기에 넣는다. ordered_by: 순서를 지킬 기준이 되는 인자 이름
+    '''
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def delay(*args, **kwargs):
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            key = arguments.arguments[ordered_by] if ordered_by else None
+            enqueue(Job(fn, args, kwargs, key))
+
+        fn.delay = delay
+        return fn
+    return decorator
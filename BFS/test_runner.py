@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    '''
+    테스트에서는 백그라운드 스레드를 쓰지 않는다. (테스트 DB 는 트랜잭션 안이라 다른 스레드에서 보이지 않는다)
+    BFS.tasks 의 작업(movies.feed 의 fan-out 포함)은 호출한 자리에서 바로 실행한다.
+    '''
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.TASK_RUNNER = 'eager'
@@ -0,0 +1,29 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed
+from django.http.response import JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .views import profile_data
+
+
+def _authenticated_profile_data(request, user_pk):
+    # DRF 뷰(perform_authentication)처럼 먼저 인증한다, 잘못된 토큰은 AuthenticationFailed
+    request.user
+    return profile_data(request, user_pk)
+
+
+async def profile(request, user_pk):
+    '''
+    accounts.views.profile GET 의 async 버전
+    DRF 뷰처럼 DEFAULT_AUTHENTICATION_CLASSES 로 인증하므로 liked_by_me 가 sync 뷰와 같다. (인증 쿼리는 sync_to_async 안에서)
+    '''
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    try:
+        authenticators = [authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        data = await sync_to_async(_authenticated_profile_data)(Request(request, authenticators=authenticators), user_pk)
+    except APIException as error:
+        return JsonResponse({'detail': error.detail}, status=error.status_code)
+    return JsonResponse(data)
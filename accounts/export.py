@@ -0,0 +1,145 @@
+'''
+유저 활동 전체 내보내기 (NDJSON)
+
+한 줄에 한 행씩 {"type": 종류, ...필드} 를 내보낸다. 첫 줄은 "user", 이후 SECTIONS 순서대로 종류별 pk 순.
+테이블마다 .iterator(chunk_size) 로 읽고 chunk_size 줄씩 묶어 내보내므로,
+활동이 아무리 많아도 메모리에는 한 묶음만 올라간다. (UserSerializer 는 전체를 한 번에 만든다)
+시각은 UTC ISO 8601, 관계는 *_id 로 pk 만 담는다. (컬렉션에 담긴 영화는 collection_movie 줄)
+ASGI 에서는 응답을 이벤트 루프에서 순회하므로 in_thread() 로 감싸 쿼리를 별도 스레드에서 실행한다.
+'''
+import queue
+import threading
+from django.contrib.auth import get_user_model
+from django.db import connections
+from BFS.renderers import FastJSONRenderer
+from movies.models import Bookmark, Collection, CollectionComment, Movie, Review, ReviewComment
+from .models import GenrePreference, WatchedMovie
+
+
+# 한 번에 읽고 내보내는 행 수
+CHUNK_SIZE = 2000
+
+USER_FIELDS = ('pk', 'username', 'nickname', 'is_b_lover', 'is_hipster', 'date_joined')
+
+
+def _likes(model):
+    # (user_id 로 거를 수 있는) 좋아요 through 테이블, 대상 pk 컬럼
+    field = model.like_users.field
+    return lambda user_pk: field.remote_field.through.objects.filter(user_id=user_pk), (f'{field.m2m_field_name()}_id',)
+
+
+def _follows():
+    field = get_user_model().like_users.field
+    through = field.remote_field.through
+    return (
+        lambda user_pk: through.objects.filter(**{f'{field.m2m_field_name()}_id': user_pk}),
+        (f'{field.m2m_reverse_field_name()}_id',),
+    )
+
+
+# 종류: (user pk 의 queryset, values() 필드)
+SECTIONS = {
+    'review': (
+        lambda user_pk: Review.objects.filter(user_id=user_pk),
+        ('pk', 'movie_id', 'movie__title', 'rating', 'content', 'like_count', 'created_at', 'updated_at'),
+    ),
+    'review_comment': (
+        lambda user_pk: ReviewComment.objects.filter(user_id=user_pk),
+        ('pk', 'review_id', 'content', 'like_count', 'created_at', 'updated_at'),
+    ),
+    'collection': (
+        lambda user_pk: Collection.objects.filter(user_id=user_pk),
+        ('pk', 'title', 'content', 'like_count', 'created_at', 'updated_at'),
+    ),
+    'collection_movie': (
+        lambda user_pk: Collection.movies.through.objects.filter(collection__user_id=user_pk),
+        ('collection_id', 'movie_id'),
+    ),
+    'collection_comment': (
+        lambda user_pk: CollectionComment.objects.filter(user_id=user_pk),
+        ('pk', 'collection_id', 'content', 'like_count', 'created_at', 'updated_at'),
+    ),
+    'bookmark': (
+        lambda user_pk: Bookmark.objects.filter(user_id=user_pk),
+        ('pk', 'movie_id', 'movie__title', 'content', 'created_at', 'updated_at'),
+    ),
+    'like_movie': _likes(Movie),
+    'like_review': _likes(Review),
+    'like_review_comment': _likes(ReviewComment),
+    'like_collection': _likes(Collection),
+    'like_collection_comment': _likes(CollectionComment),
+    'follow': _follows(),
+    'genre_preference': (
+        lambda user_pk: GenrePreference.objects.filter(user_id=user_pk),
+        ('genre', 'score'),
+    ),
+    'watched_movie': (
+        lambda user_pk: WatchedMovie.objects.filter(user_id=user_pk),
+        ('movie_id', 'count'),
+    ),
+}
+
+
+def export_lines(user_pk, chunk_size=CHUNK_SIZE):
+    '''
+    user_pk 유저의 활동을 NDJSON bytes 로 chunk_size 줄씩 묶어 yield, 유저가 없으면 아무것도 내보내지 않는다.
+    '''
+    renderer = FastJSONRenderer()
+    user = get_user_model().objects.filter(pk=user_pk).values(*USER_FIELDS).first()
+    if user is None:
+        return
+    yield renderer.render({'type': 'user', **user}) + b'\n'
+
+    for kind, (queryset, fields) in SECTIONS.items():
+        lines = []
+        for row in queryset(user_pk).order_by('pk').values(*fields).iterator(chunk_size=chunk_size):
+            lines.append(renderer.render({'type': kind, **row}))
+            if len(lines) == chunk_size:
+                yield b'\n'.join(lines) + b'\n'
+                lines = []
+        if lines:
+            yield b'\n'.join(lines) + b'\n'
+
+
+def in_thread(lines, buffer=4):
+    '''
+    lines 를 별도 스레드에서 순회하고 만든 chunk 를 넘겨받아 yield 한다.
+    Django 3.2 의 ASGIHandler 는 StreamingHttpResponse 를 이벤트 루프에서 동기로 순회하므로
+    그 자리에서 ORM 을 부르면 SynchronousOnlyOperation 이 난다. 스레드는 buffer 개까지만 미리 만들고,
+    클라이언트가 끊어 응답이 닫히면 멈춘다.
+    '''
+    chunks = queue.Queue(maxsize=buffer)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in lines:
+                if not put(chunk):
+                    return
+            put(end)
+        except Exception as error:
+            put(error)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=produce, name='export', daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
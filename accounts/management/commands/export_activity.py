@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from accounts.export import CHUNK_SIZE, export_lines
+
+
+class Command(BaseCommand):
+    help = '유저의 활동 전체(리뷰, 댓글, 컬렉션, 북마크, 좋아요, 팔로우)를 NDJSON 으로 내보냅니다. (accounts/export/ 와 같은 형식)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='유저 pk 또는 username')
+        parser.add_argument('-o', '--output', help='저장할 파일, 생략하면 표준 출력')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects
+        user = options['user']
+        user_pk = users.filter(**{'pk' if user.isdigit() else 'username': user}).values_list('pk', flat=True).first()
+        if user_pk is None:
+            raise CommandError(f'{user} 유저가 존재하지 않습니다.')
+
+        lines = export_lines(user_pk, chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as file:
+                file.writelines(lines)
+        else:
+            for chunk in lines:
+                self.stdout.write(chunk.decode(), ending='')
@@ -0,0 +1,76 @@
+# Generated by Django 3.2.9 on 2026-10-18 20:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_json_preferences(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    GenrePreference = apps.get_model('accounts', 'GenrePreference')
+    WatchedMovie = apps.get_model('accounts', 'WatchedMovie')
+
+    users = User.objects.values_list('pk', 'genre_preference', 'watched_movies_dict')
+    for user_pk, genre_preference, watched_movies_dict in users.iterator(chunk_size=500):
+        GenrePreference.objects.bulk_create([
+            GenrePreference(user_id=user_pk, genre=genre, score=score)
+            for genre, score in (genre_preference or {}).items()
+        ])
+        WatchedMovie.objects.bulk_create([
+            WatchedMovie(user_id=user_pk, movie_id=int(movie_pk), count=count)
+            for movie_pk, count in (watched_movies_dict or {}).items()
+            if count > 0
+        ])
+
+
+def copy_preferences_to_json(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    for user in User.objects.prefetch_related('genre_preferences', 'watched_movies').iterator(chunk_size=500):
+        user.genre_preference = {row.genre: row.score for row in user.genre_preferences.all()}
+        user.watched_movies_dict = {str(row.movie_id): row.count for row in user.watched_movies.all()}
+        user.save(update_fields=['genre_preference', 'watched_movies_dict'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchedMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_id', models.BigIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watched_movies', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GenrePreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=100)),
+                ('score', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genre_preferences', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='watchedmovie',
+            constraint=models.UniqueConstraint(fields=('user', 'movie_id'), name='unique_watched_movie'),
+        ),
+        migrations.AddConstraint(
+            model_name='genrepreference',
+            constraint=models.UniqueConstraint(fields=('user', 'genre'), name='unique_genre_preference'),
+        ),
+        migrations.RunPython(copy_json_preferences, copy_preferences_to_json),
+        migrations.RemoveField(
+            model_name='user',
+            name='genre_preference',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='watched_movies_dict',
+        ),
+    ]
@@ -1,6 +1,62 @@
+from collections import Counter
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connection, models
+
+
+def _increment(model, user, key_field, value_field, deltas):
+    '''
+    user 의 key 별 행에 value_field += delta, 없는 행은 delta 로 새로 만든다.
+    (INSERT ... ON CONFLICT DO UPDATE 한 문장이라 동시에 요청이 와도 값이 유실되지 않음)
+    '''
+    _increment_many(model, key_field, value_field, {(user.pk, key): delta for key, delta in deltas.items()})
+
+
+def _increment_many(model, key_field, value_field, deltas):
+    '''
+    deltas: {(user pk, key): delta}, 여러 유저의 행을 _increment 와 같은 방식으로 한 번에 (행 300 개당 쿼리 한 번)
+    '''
+    deltas = [(user_pk, key, delta) for (user_pk, key), delta in deltas.items() if delta]
+    if not deltas:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    user_column = qn(model._meta.get_field('user').column)
+    key_column = qn(model._meta.get_field(key_field).column)
+    value_column = qn(model._meta.get_field(value_field).column)
+
+    with connection.cursor() as cursor:
+        # SQLite 의 바인딩 변수 개수 제한(999) 안에서 나눈다
+        for start in range(0, len(deltas), 300):
+            chunk = deltas[start:start + 300]
+            sql = (
+                f'INSERT INTO {table} ({user_column}, {key_column}, {value_column}) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(chunk))} '
+                f'ON CONFLICT ({user_column}, {key_column}) '
+                f'DO UPDATE SET {value_column} = {table}.{value_column} + excluded.{value_column}'
+            )
+            cursor.execute(sql, [value for row in chunk for value in row])
+
+
+def add_watched_movies(watched):
+    '''
+    watched: [(user pk, movie pk, genre_list, star_rating), ...]
+    여러 건의 User.add_movie_to_watched + add_movie_to_genre_preference 를 한 번에 반영 (대량 가져오기)
+    '''
+    movies, genres = Counter(), Counter()
+    for user_pk, movie_pk, genre_list, star_rating in watched:
+        movies[user_pk, int(movie_pk)] += 1
+        priority = _priority(star_rating)
+        for genre in genre_list:
+            genres[user_pk, str(genre)] += priority
+    _increment_many(WatchedMovie, 'movie_id', 'count', movies)
+    _increment_many(GenrePreference, 'genre', 'score', genres)
+
+
+def _priority(star_rating):
+    if star_rating and star_rating != 2.5:
+        return int(star_rating - 2.5) * 4
+    return 10
 
 
 class User(AbstractUser):
@@ -8,57 +64,70 @@ class User(AbstractUser):
     like_users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='interested_in')
     is_b_lover = models.BooleanField(default=True)
     is_hipster = models.BooleanField(default=False)
+    # 닉네임 등 다른 응답에 함께 들어가는 값이 바뀐 시각 (movies.conditional 의 ETag)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def genre_preference(self):
+        return {preference.genre: preference.score for preference in self.genre_preferences.all()}
 
-    genre_preference = models.JSONField(default=dict)
-    watched_movies_dict = models.JSONField(default=dict)
+    @property
+    def watched_movies_dict(self):
+        return {str(watched.movie_id): watched.count for watched in self.watched_movies.all()}
 
     def add_movie_to_watched(self, movie_pk) -> None:
-        movie_pk = str(movie_pk)
-        if movie_pk in self.watched_movies_dict:
-            self.watched_movies_dict[movie_pk] += 1
-        else:
-            self.watched_movies_dict[movie_pk] = 1
+        _increment(WatchedMovie, self, 'movie_id', 'count', {int(movie_pk): 1})
         return None
 
     def delete_movie_from_watched(self, movie_pk) -> None:
-        movie_pk = str(movie_pk)
-        if movie_pk in self.watched_movies_dict:
-            if self.watched_movies_dict[movie_pk] == 1:
-                self.watched_movies_dict.pop(movie_pk)    
-            else:                  
-                self.watched_movies_dict[movie_pk] -= 1
+        watched = WatchedMovie.objects.filter(user=self, movie_id=movie_pk)
+        deleted, _ = watched.filter(count__lte=1).delete()
+        if not deleted:
+            watched.update(count=models.F('count') - 1)
         return None
 
     def add_movie_to_genre_preference(self, movie_pk, genre_list, star_rating=False) -> None:
-        priority = 10
-        if star_rating and star_rating != 2.5:
-            priority = int(star_rating - 2.5) * 4
-
-        for genre in genre_list:
-            if genre in self.genre_preference:
-                self.genre_preference[genre] += priority
-            else:
-                self.genre_preference[genre] = priority
+        priority = _priority(star_rating)
+        _increment(GenrePreference, self, 'genre', 'score', {
+            str(genre): count * priority for genre, count in Counter(genre_list).items()
+        })
         return None
 
     def delete_movie_from_genre_preference(self, movie_pk, genre_list, star_rating=False):        
-        priority = 10
-        if star_rating and star_rating != 2.5:
-            priority = int(star_rating - 2.5) * 4
-
-        for genre in genre_list:
-            if genre in self.genre_preference:
-                self.genre_preference[genre] -= priority
-            else:
-                self.genre_preference[genre] = -priority
+        priority = _priority(star_rating)
+        _increment(GenrePreference, self, 'genre', 'score', {
+            str(genre): -count * priority for genre, count in Counter(genre_list).items()
+        })
         return None
 
     def update_movie_to_genre_preference(self, movie_pk, genre_list, original_rating, updated_rating):        
         original_priority = int(original_rating - 2.5) * 4
         updated_priority = int(updated_rating - 2.5) * 4
 
-        for genre in genre_list:
-            if genre in self.genre_preference:
-                self.genre_preference[genre] += (updated_priority - original_priority) 
+        # 기존에 점수가 있는 장르만 갱신
+        GenrePreference.objects.filter(user=self, genre__in=[str(genre) for genre in genre_list]).update(
+            score=models.F('score') + (updated_priority - original_priority)
+        )
+        return None
+
+
+class GenrePreference(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='genre_preferences')
+    genre = models.CharField(max_length=100)
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'genre'], name='unique_genre_preference'),
+        ]
+
+
+class WatchedMovie(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='watched_movies')
+    movie_id = models.BigIntegerField()
+    count = models.PositiveIntegerField(default=0)
 
-        return None
\ No newline at end of file
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'movie_id'], name='unique_watched_movie'),
+        ]
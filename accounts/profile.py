@@ -0,0 +1,99 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from movies.models import Bookmark, Collection, CollectionComment, Movie, Review, ReviewComment
+from movies.rows import (
+    MovieRows,
+    ReviewListRows,
+    ReviewCommentRows,
+    CollectionListRows,
+    CollectionCommentRows,
+    BookmarkRows
+    )
+from movies.serializers import full_like_users
+
+
+# ?expand= 로 요청할 수 있는 프로필 섹션
+# 이름: (해당 유저의 queryset, movies.rows 직렬화, 페이지네이션 정렬 기준 필드)
+SECTIONS = {
+    'like_movies': (
+        lambda user: Movie.objects.filter(like_users=user).for_list(),
+        MovieRows, 'pk',
+    ),
+    'review_set': (
+        lambda user: Review.objects.filter(user=user).for_list(),
+        ReviewListRows, 'created_at',
+    ),
+    'like_reviews': (
+        lambda user: Review.objects.filter(like_users=user).for_list(),
+        ReviewListRows, 'created_at',
+    ),
+    'reviewcomment_set': (
+        lambda user: ReviewComment.objects.filter(user=user).for_list(),
+        ReviewCommentRows, 'created_at',
+    ),
+    'collection_set': (
+        lambda user: Collection.objects.filter(user=user).for_list(),
+        CollectionListRows, 'created_at',
+    ),
+    'like_collections': (
+        lambda user: Collection.objects.filter(like_users=user).for_list(),
+        CollectionListRows, 'created_at',
+    ),
+    'collectioncomment_set': (
+        lambda user: CollectionComment.objects.filter(user=user).for_list(),
+        CollectionCommentRows, 'created_at',
+    ),
+    'bookmark_set': (
+        lambda user: Bookmark.objects.filter(user=user),
+        BookmarkRows, 'created_at',
+    ),
+}
+
+# ?expand= 로 요청할 수 있는 취향 데이터, 본 영화/장르 수만큼 커지므로 요약에는 넣지 않는다
+# 이름: User 의 property (페이지 없이 dict 로)
+PREFERENCES = ('watched_movies_dict', 'genre_preference')
+
+
+def section_queryset(section, user, request):
+    '''
+    user 의 section 목록, 요청한 유저 기준 liked_by_me 를 함께 annotate
+    '''
+    get_queryset, _, _ = SECTIONS[section]
+    queryset = get_queryset(user)
+    if hasattr(queryset, 'with_like_state'):
+        queryset = queryset.with_like_state(request.user, full_like_users(request))
+    return queryset
+
+
+# 섹션별 개수를 셀 테이블과 유저를 가리키는 컬럼
+COUNT_SOURCES = {
+    'like_movies': (Movie.like_users.through, 'user'),
+    'review_set': (Review, 'user'),
+    'like_reviews': (Review.like_users.through, 'user'),
+    'reviewcomment_set': (ReviewComment, 'user'),
+    'collection_set': (Collection, 'user'),
+    'like_collections': (Collection.like_users.through, 'user'),
+    'collectioncomment_set': (CollectionComment, 'user'),
+    'bookmark_set': (Bookmark, 'user'),
+}
+
+
+def _count_subquery(model, field):
+    counts = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def with_section_counts(queryset):
+    '''
+    JOIN 을 여러 번 하면 행이 곱으로 불어나므로 섹션별 개수는 상관 서브쿼리로 한 번에 가져온다.
+    '''
+    return queryset.annotate(**{
+        f'num_{section}': _count_subquery(model, field)
+        for section, (model, field) in COUNT_SOURCES.items()
+    })
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from BFS.metrics import TimedSerializerMixin
 from movies.serializers import (
     MovieSerializer,
     ReviewListSerializer, 
@@ -9,9 +10,10 @@ from movies.serializers import (
     BookmarkSerializer
     )
 from django.contrib.auth.password_validation import validate_password
+from .profile import SECTIONS
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     like_movies = MovieSerializer(many=True, read_only=True)
@@ -39,9 +41,30 @@ class UserSerializer(serializers.ModelSerializer):
             )
         read_only_fields = ('genre_preference', 'watched_movies_dict',) 
 
-        
 
-class ChangePasswordSerializer(serializers.ModelSerializer):
+class UserSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    '''
+    accounts.profile.with_section_counts 로 annotate 된 유저를 섹션 목록 없이 개수만 담아 직렬화
+    (취향 데이터 accounts.profile.PREFERENCES 도 넣지 않는다)
+    '''
+    counts = serializers.SerializerMethodField()
+
+    def get_counts(self, user):
+        return {
+            section: getattr(user, f'num_{section}')
+            for section in SECTIONS
+        }
+
+    class Meta:
+        model = get_user_model()
+        fields = (
+            'pk', 'username', 'nickname', 'is_b_lover', 'is_hipster', 'counts'
+            )
+        read_only_fields = fields
+
+
+
+class ChangePasswordSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
     oldPassword = serializers.CharField(write_only=True, required=True)
@@ -0,0 +1,34 @@
+'''
+리뷰/좋아요 후의 시청 기록, 장르 선호도 갱신 (BFS.tasks 로 요청 처리 후에 유저별 순서대로 실행)
+'''
+from django.contrib.auth import get_user_model
+from BFS.tasks import task
+
+
+def _user(user_pk):
+    # 선호도 메서드는 pk 만 쓰므로 유저 행을 다시 읽지 않는다
+    return get_user_model()(pk=user_pk)
+
+
+@task(ordered_by='user_pk')
+def add_watched_movie(user_pk, movie_pk, genre_list, star_rating=False):
+    user = _user(user_pk)
+    user.add_movie_to_watched(movie_pk=movie_pk)
+    user.add_movie_to_genre_preference(movie_pk=movie_pk, genre_list=genre_list, star_rating=star_rating)
+
+
+@task(ordered_by='user_pk')
+def remove_watched_movie(user_pk, movie_pk, genre_list, star_rating=False):
+    user = _user(user_pk)
+    user.delete_movie_from_watched(movie_pk=movie_pk)
+    user.delete_movie_from_genre_preference(movie_pk=movie_pk, genre_list=genre_list, star_rating=star_rating)
+
+
+@task(ordered_by='user_pk')
+def update_movie_rating(user_pk, movie_pk, genre_list, original_rating, updated_rating):
+    _user(user_pk).update_movie_to_genre_preference(
+        movie_pk=movie_pk,
+        genre_list=genre_list,
+        original_rating=original_rating,
+        updated_rating=updated_rating,
+    )
@@ -1,3 +1,388 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_jwt.settings import api_settings
+from BFS.tasks import Job, TaskRunner, run, task
+from movies.likes import add_like
+from movies.models import Bookmark, Collection, CollectionComment, Movie, Review, ReviewComment
+from .export import SECTIONS, export_lines
+from .models import GenrePreference, WatchedMovie
+from .tasks import add_watched_movie
 
-# Create your tests here.
+
+class ProfileTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.other = get_user_model().objects.create(username='other', nickname='other')
+        self.client.force_authenticate(self.user)
+
+    def add_activity(self, count):
+        start = Movie.objects.count()
+        for i in range(start, start + count):
+            movie = Movie.objects.create(pk=i + 1, title=f'영화 {i}', poster_path='/poster.jpg')
+            movie.like_users.add(self.user)
+            review = Review.objects.create(user=self.user, movie=movie, content='리뷰', rating=4.0)
+            review.like_users.add(self.user, self.other)
+            ReviewComment.objects.create(user=self.user, review=review, content='댓글')
+            collection = Collection.objects.create(user=self.user, title='컬렉션', content='')
+            collection.movies.add(movie)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response.json()
+
+    def test_summary_counts(self):
+        self.add_activity(3)
+        _, data = self.count_queries(f'/accounts/profile/{self.user.pk}/')
+        self.assertEqual(data['counts']['like_movies'], 3)
+        self.assertEqual(data['counts']['review_set'], 3)
+        self.assertEqual(data['counts']['like_reviews'], 3)
+        self.assertEqual(data['counts']['reviewcomment_set'], 3)
+        self.assertEqual(data['counts']['collection_set'], 3)
+        self.assertEqual(data['counts']['bookmark_set'], 0)
+        self.assertNotIn('review_set', data)
+
+    def test_preferences_only_when_expanded(self):
+        self.user.add_movie_to_watched(550)
+        self.user.add_movie_to_genre_preference(550, ['18'])
+        summary_queries, data = self.count_queries(f'/accounts/profile/{self.user.pk}/')
+        self.assertNotIn('watched_movies_dict', data)
+        self.assertNotIn('genre_preference', data)
+
+        queries, data = self.count_queries(f'/accounts/profile/{self.user.pk}/?expand=watched_movies_dict,genre_preference')
+        self.assertEqual(data['watched_movies_dict'], {'550': 1})
+        self.assertEqual(data['genre_preference'], {'18': 10})
+        self.assertEqual(queries, summary_queries + 2)
+
+    def test_summary_query_count_is_constant(self):
+        self.add_activity(1)
+        small, _ = self.count_queries(f'/accounts/profile/{self.user.pk}/?expand=review_set,like_movies')
+        self.add_activity(10)
+        large, _ = self.count_queries(f'/accounts/profile/{self.user.pk}/?expand=review_set,like_movies')
+        self.assertEqual(small, large)
+
+    def test_expanded_section_is_paginated(self):
+        self.add_activity(5)
+        _, data = self.count_queries('/accounts/get-user/?expand=like_movies&page_size=2')
+        self.assertEqual([movie['pk'] for movie in data['like_movies']['results']], [5, 4])
+
+        _, page = self.count_queries(data['like_movies']['next'])
+        self.assertEqual([movie['pk'] for movie in page['results']], [3, 2])
+
+    def test_liked_sections_report_total_like_count(self):
+        movie = Movie.objects.create(pk=1, title='영화', poster_path='')
+        review = Review.objects.create(user=self.other, movie=movie, content='리뷰', rating=4.0)
+        collection = Collection.objects.create(user=self.other, title='컬렉션', content='')
+        for user in (self.user, self.other):
+            add_like(Movie, movie.pk, user)
+            add_like(Review, review.pk, user)
+            add_like(Collection, collection.pk, user)
+
+        # 유저로 거른 join 위에서 세면 항상 1 이 된다
+        _, data = self.count_queries(f'/accounts/profile/{self.user.pk}/?expand=like_movies,like_reviews,like_collections')
+        for section in ('like_movies', 'like_reviews', 'like_collections'):
+            self.assertEqual(data[section]['results'][0]['like_count'], 2)
+            _, page = self.count_queries(f'/accounts/profile/{self.user.pk}/{section}/')
+            self.assertEqual(page['results'][0]['like_count'], 2)
+
+    def test_unknown_section(self):
+        response = self.client.get(f'/accounts/profile/{self.user.pk}/?expand=password')
+        self.assertEqual(response.status_code, 404)
+
+
+class PreferenceStoreTest(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+
+    def test_genre_preference(self):
+        self.user.add_movie_to_genre_preference(550, ['18', '53'])
+        self.user.add_movie_to_genre_preference(680, ['18'], star_rating=4.5)
+        self.user.delete_movie_from_genre_preference(13, ['35'])
+        self.user.update_movie_to_genre_preference(680, ['18', '99'], original_rating=4.5, updated_rating=0.5)
+        self.assertEqual(self.user.genre_preference, {'18': 10 + 8 - 8 - 8, '53': 10, '35': -10})
+
+    def test_watched_movies(self):
+        self.user.add_movie_to_watched(550)
+        self.user.add_movie_to_watched(550)
+        self.user.add_movie_to_watched(680)
+        self.user.delete_movie_from_watched(550)
+        self.user.delete_movie_from_watched(680)
+        self.assertEqual(self.user.watched_movies_dict, {'550': 1})
+
+    def test_update_is_a_single_statement(self):
+        self.user.add_movie_to_genre_preference(550, ['18', '53'])
+        with self.assertNumQueries(1):
+            self.user.add_movie_to_genre_preference(680, ['18', '53', '99'])
+        with self.assertNumQueries(1):
+            self.user.update_movie_to_genre_preference(680, ['18'], original_rating=1.0, updated_rating=5.0)
+
+
+class PreferenceMigrationTest(TransactionTestCase):
+
+    def test_json_preferences_are_copied(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('accounts', '0001_initial')])
+        old_apps = executor.loader.project_state([('accounts', '0001_initial')]).apps
+        OldUser = old_apps.get_model('accounts', 'User')
+        OldUser.objects.create(
+            username='old', nickname='old',
+            genre_preference={'18': 20, '53': -4}, watched_movies_dict={'550': 2},
+            )
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+        user = get_user_model().objects.get(username='old')
+        self.assertEqual(user.genre_preference, {'18': 20, '53': -4})
+        self.assertEqual(user.watched_movies_dict, {'550': 2})
+        self.assertEqual(GenrePreference.objects.count(), 2)
+        self.assertEqual(WatchedMovie.objects.count(), 1)
+
+
+class TaskRunnerTest(TestCase):
+
+    def test_jobs_with_same_key_run_in_order(self):
+        runner = TaskRunner(workers=4)
+        done = {key: [] for key in range(8)}
+        lock = threading.Lock()
+
+        def work(key, i):
+            time.sleep(random.random() / 1000)
+            with lock:
+                done[key].append(i)
+
+        for i in range(20):
+            for key in done:
+                runner.submit(Job(work, (key, i), {}, key))
+        runner.join()
+        self.assertEqual(done, {key: list(range(20)) for key in done})
+        self.assertEqual(runner.stats['done'], 160)
+
+    def test_failed_job_is_retried(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RuntimeError('일시적인 오류')
+
+        with self.assertLogs('BFS.tasks', 'WARNING'):
+            self.assertEqual(run(Job(flaky, (), {}, None), retries=3, retry_delay=0), 'done')
+        self.assertEqual(len(attempts), 3)
+
+        attempts.clear()
+        with self.assertLogs('BFS.tasks', 'ERROR'):
+            self.assertEqual(run(Job(flaky, (), {}, None), retries=0, retry_delay=0), 'failed')
+
+
+    def test_failed_attempt_is_rolled_back(self):
+        # 시청 기록을 올린 뒤 장르 선호도에서 실패하면, 재시도가 시청 기록을 두 번 올리지 않는다
+        user = get_user_model().objects.create(username='user', nickname='nick')
+        User = get_user_model()
+        original = User.add_movie_to_genre_preference
+        calls = []
+
+        def flaky(self, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return original(self, **kwargs)
+
+        with mock.patch.object(User, 'add_movie_to_genre_preference', flaky), self.assertLogs('BFS.tasks', 'WARNING'):
+            job = Job(add_watched_movie, (user.pk, 550, [18]), {}, user.pk)
+            self.assertEqual(run(job, retries=1, retry_delay=0), 'done')
+        self.assertEqual(WatchedMovie.objects.get(user=user, movie_id=550).count, 1)
+
+    def test_eager_failure_is_raised(self):
+        @task()
+        def broken():
+            raise RuntimeError('버그')
+
+        with self.assertLogs('BFS.tasks', 'ERROR'), self.assertRaises(RuntimeError):
+            broken.delay()
+
+class DeferredPreferenceTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.client.force_authenticate(self.user)
+        self.data = {'movie_title': '파이트 클럽', 'poster_path': '', 'genre_list': [18], 'rating': 4.5, 'content': '리뷰'}
+
+    def test_review_create_updates_preferences(self):
+        response = self.client.post('/movies/550/review/', self.data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user.watched_movies_dict, {'550': 1})
+        self.assertEqual(self.user.genre_preference, {'18': 8})
+
+        self.client.delete(f"/movies/review/{response.json()['pk']}/", {'genre_list': [18]}, format='json')
+        self.assertEqual(self.user.watched_movies_dict, {})
+        self.assertEqual(self.user.genre_preference, {'18': 0})
+
+    @override_settings(TASK_RUNNER='thread')
+    def test_preferences_are_updated_after_commit(self):
+        with mock.patch('BFS.tasks.get_runner') as get_runner:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/movies/550/review/', self.data, format='json')
+                # 응답 시점에는 아직 반영되지 않고, 커밋 후에 작업 실행기로 넘어간다
+                self.assertFalse(WatchedMovie.objects.exists())
+                get_runner.return_value.submit.assert_not_called()
+        job, = [call.args[0] for call in get_runner.return_value.submit.call_args_list]
+        self.assertEqual(job.fn, add_watched_movie)
+        self.assertEqual(job.key, self.user.pk)
+
+
+class ActivityExportTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user, self.other = [
+            get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}') for i in range(2)
+        ]
+        self.client.force_authenticate(self.user)
+        movies = [Movie.objects.create(pk=pk, title=f'영화 {pk}', poster_path='') for pk in (550, 13, 680)]
+        for movie in movies:
+            review = Review.objects.create(user=self.user, movie=movie, content='리뷰', rating=4.5)
+            ReviewComment.objects.create(user=self.user, review=review, content='댓글')
+            add_like(Review, review.pk, self.user)
+        collection = Collection.objects.create(user=self.user, title='모음', content='내용')
+        collection.set_movies([550, 13])
+        CollectionComment.objects.create(user=self.user, collection=collection, content='댓글')
+        Bookmark.objects.create(user=self.user, movie=movies[0], content='북마크')
+        add_like(Movie, 550, self.user)
+        self.user.like_users.add(self.other)
+        Review.objects.create(user=self.other, movie=movies[0], content='다른 유저 리뷰', rating=1.0)
+
+    def kinds(self, lines, user=None):
+        rows = [json.loads(line) for line in lines if line]
+        self.assertEqual(rows[0]['type'], 'user')
+        self.assertEqual(rows[0]['pk'], (user or self.user).pk)
+        counts = {}
+        for row in rows[1:]:
+            counts[row['type']] = counts.get(row['type'], 0) + 1
+        return rows, counts
+
+    def test_streams_ndjson(self):
+        response = self.client.get('/accounts/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows, counts = self.kinds(b''.join(response.streaming_content).decode().split('\n'))
+        self.assertEqual(counts, {
+            'review': 3, 'review_comment': 3, 'collection': 1, 'collection_movie': 2, 'collection_comment': 1,
+            'bookmark': 1, 'like_movie': 1, 'like_review': 3, 'follow': 1,
+        })
+        review = next(row for row in rows if row['type'] == 'review')
+        self.assertEqual((review['movie_id'], review['movie__title'], review['content']), (550, '영화 550', '리뷰'))
+        self.assertEqual(next(row for row in rows if row['type'] == 'follow')['to_user_id'], self.other.pk)
+
+    def test_reads_each_table_in_chunks(self):
+        # 테이블마다 쿼리 한 번 (+ 유저), 행 수와 상관없이 chunk_size 줄씩 내보낸다
+        with self.assertNumQueries(1 + len(SECTIONS)):
+            chunks = list(export_lines(self.user.pk, chunk_size=2))
+        self.assertTrue(all(chunk.count(b'\n') <= 2 for chunk in chunks))
+        self.assertEqual(list(export_lines(0)), [])
+
+    def test_requires_login(self):
+        self.assertEqual(APIClient().get('/accounts/export/').status_code, 401)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_activity', self.user.username, stdout=out)
+        _, counts = self.kinds(out.getvalue().split('\n'))
+        self.assertEqual(counts['review'], 3)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'export.ndjson')
+            call_command('export_activity', str(self.other.pk), output=path)
+            with open(path, encoding='utf-8') as file:
+                _, counts = self.kinds(file.read().split('\n'), self.other)
+        self.assertEqual(counts, {'review': 1})
+
+        with self.assertRaises(CommandError):
+            call_command('export_activity', 'nobody')
+
+
+class AsyncProfileTest(TransactionTestCase):
+    # ORM 호출이 sync_to_async 스레드에서 일어나므로 테스트 트랜잭션으로 감쌀 수 없다
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        Review.objects.create(user=self.user, movie=movie, content='리뷰', rating=4.5)
+        collection = Collection.objects.create(user=self.user, title='컬렉션', content='')
+        add_like(Collection, collection.pk, self.user)
+        token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(self.user))
+        self.authorization = f'JWT {token}'
+
+    async def test_matches_sync_view_for_logged_in_user(self):
+        url = f'/accounts/profile/{self.user.pk}/?expand=like_collections,review_set'
+        async_response = await AsyncClient().get(
+            url.replace('/profile/', '/async/profile/'), authorization=self.authorization,
+        )
+        self.assertEqual(async_response.status_code, 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=self.authorization)
+        sync_data = await sync_to_async(lambda: client.get(url).json())()
+        self.assertEqual(async_response.json(), sync_data)
+        self.assertTrue(sync_data['like_collections']['results'][0]['liked_by_me'])
+
+    async def test_invalid_token(self):
+        response = await AsyncClient().get(f'/accounts/async/profile/{self.user.pk}/', authorization='JWT invalid')
+        self.assertEqual(response.status_code, 401)
+
+
+class ActivityExportASGITest(TransactionTestCase):
+    # ASGIHandler 는 스트리밍 응답을 이벤트 루프에서 순회한다, 쿼리는 별도 스레드라 테스트 트랜잭션으로 감쌀 수 없다
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        for i in range(3):
+            Review.objects.create(user=self.user, movie=movie, content=f'리뷰 {i}', rating=4.5)
+
+    async def request(self, path, headers=()):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), *headers], 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await ASGIHandler()(scope, receive, send)
+        return messages
+
+    async def test_streams_under_asgi(self):
+        token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(self.user))
+        messages = await self.request('/accounts/export/', [(b'authorization', f'JWT {token}'.encode())])
+        self.assertEqual(messages[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        rows = [json.loads(line) for line in body.decode().split('\n') if line]
+        self.assertEqual([row['type'] for row in rows], ['user', 'review', 'review', 'review'])
+        self.assertNotIn('more_body', messages[-1])
@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework_jwt.views import obtain_jwt_token
 from .views import ChangePasswordView
-from . import views
+from . import async_views, views
 
 
 urlpatterns = [
@@ -9,6 +9,10 @@ urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path('api-token-auth/', obtain_jwt_token),
     path('profile/<int:user_pk>/', views.profile),
+    path('profile/<int:user_pk>/<str:section>/', views.profile_section, name='profile_section'),
+    path('async/profile/<int:user_pk>/', async_views.profile),
+    path('follow/<int:user_pk>/', views.follow),  # 팔로우 (POST 토글, PUT 팔로우, DELETE 취소)
+    path('export/', views.export),  # 로그인한 유저의 활동 전체 (NDJSON 스트리밍)
     path('change_password/<int:pk>/', ChangePasswordView.as_view(), name='auth_change_password'),
     path('get-base-info-for-rec/', views.get_base_info_for_rec, name='get_base_info_for_rec'),
 ]
\ No newline at end of file
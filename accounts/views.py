@@ -1,19 +1,50 @@
 from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework import status
 from rest_framework import generics
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from random import choices
-from .serializers import UserSerializer, ChangePasswordSerializer
+from movies.pagination import paginate, paginate_data
+from .export import export_lines, in_thread
+from .profile import PREFERENCES, SECTIONS, section_queryset, with_section_counts
+from .serializers import UserSerializer, UserSummarySerializer, ChangePasswordSerializer
+
+
+def profile_data(request, user_pk):
+    '''
+    개수만 담은 프로필 요약, ?expand=review_set,like_movies 처럼 요청한 섹션은 첫 페이지를 함께 반환
+    (다음 페이지는 각 섹션의 next 링크 = profile_section)
+    watched_movies_dict, genre_preference 도 ?expand= 로 요청했을 때만 넣는다.
+    '''
+    user = get_object_or_404(with_section_counts(get_user_model().objects), pk=user_pk)
+    data = UserSummarySerializer(user).data
+
+    expand = request.query_params.get('expand')
+    if expand:
+        for section in expand.split(','):
+            if section in PREFERENCES:
+                data[section] = getattr(user, section)
+                continue
+            if section not in SECTIONS:
+                raise NotFound(f'{section} 섹션은 존재하지 않습니다.')
+            _, serializer_class, ordering_field = SECTIONS[section]
+            data[section] = paginate_data(
+                request, section_queryset(section, user, request), serializer_class.for_request(request),
+                ordering_field=ordering_field,
+                base_url=reverse('profile_section', args=(user_pk, section)),
+                )
+    return data
 
 
 @api_view(['GET'])
 def get_user(request):
-    user = get_object_or_404(get_user_model(), pk=request.user.pk)
-    user_serializer = UserSerializer(user)
-    return Response(user_serializer.data)
+    return Response(profile_data(request, request.user.pk))
 
 
 @api_view(['POST'])
@@ -37,10 +68,10 @@ def signup(request):
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AllowAny])
 def profile(request, user_pk):
-    user = get_object_or_404(get_user_model(), pk=user_pk)
     if request.method == 'GET':
-        user_serializer = UserSerializer(user)
-        return Response(user_serializer.data)
+        return Response(profile_data(request, user_pk))
+
+    user = get_object_or_404(get_user_model(), pk=user_pk)
 
     if request.method == 'PUT':
         nickname = request.data.get('nickname')
@@ -51,7 +82,7 @@ def profile(request, user_pk):
         serializer = UserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
-            return Response(serializer.data)
+            return Response(profile_data(request, user_pk))
 
     if request.method == 'DELETE':
         user.delete()
@@ -61,6 +92,54 @@ def profile(request, user_pk):
         return Response(data, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def profile_section(request, user_pk, section):
+    if section not in SECTIONS:
+        raise NotFound(f'{section} 섹션은 존재하지 않습니다.')
+    user = get_object_or_404(get_user_model(), pk=user_pk)
+    _, serializer_class, ordering_field = SECTIONS[section]
+    return paginate(
+        request, section_queryset(section, user, request), serializer_class.for_request(request),
+        ordering_field=ordering_field,
+        )
+
+
+@api_view(['GET'])
+def export(request):
+    '''
+    로그인한 유저의 리뷰, 댓글, 컬렉션, 북마크, 좋아요, 팔로우 전체를 NDJSON 으로 스트리밍 (accounts.export)
+    '''
+    lines = export_lines(request.user.pk)
+    if isinstance(request._request, ASGIRequest):
+        # 이벤트 루프에서 순회되므로 쿼리는 별도 스레드에서
+        lines = in_thread(lines)
+    response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="bfs-activity-{request.user.pk}.ndjson"'
+    return response
+
+
+@api_view(['POST', 'PUT', 'DELETE'])
+def follow(request, user_pk):
+    '''
+    user_pk 유저 팔로우 (POST 토글, PUT 팔로우, DELETE 취소), 팔로우한 유저의 활동은 movies/feed/ 에 보인다
+    '''
+    target = get_object_or_404(get_user_model(), pk=user_pk)
+    if target.pk == request.user.pk:
+        return Response({'error': '자기 자신은 팔로우할 수 없습니다.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    following = request.user.like_users.filter(pk=user_pk).exists()
+    if request.method == 'POST':
+        want = not following
+    else:
+        want = request.method == 'PUT'
+    if want and not following:
+        request.user.like_users.add(target)
+    elif following and not want:
+        request.user.like_users.remove(target)
+    return Response({'following': want, 'follower_count': target.interested_in.count()})
+
+
 class ChangePasswordView(generics.UpdateAPIView):
     """
     다음 링크를 참고하였음
@@ -74,12 +153,8 @@ class ChangePasswordView(generics.UpdateAPIView):
 @api_view(['GET'])
 def get_base_info_for_rec(request):
     user = get_object_or_404(get_user_model(), pk=request.user.pk)
-    user_serializer = UserSerializer(user)
-    liked_movies_picked = choices(user_serializer.data['like_movies'],k=3)
-    
-    liked_movie_pks = []
-    for movie in liked_movies_picked:
-        liked_movie_pks.append(movie['pk'])
+    like_movie_pks = list(user.like_movies.values_list('pk', flat=True))
+    liked_movie_pks = choices(like_movie_pks, k=3) if like_movie_pks else []
 
     data = {
         'is_b_lover': user.is_b_lover,
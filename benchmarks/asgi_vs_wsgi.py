@@ -0,0 +1,86 @@
+'''
+느린 TMDB(로컬 stub) 앞에서 sync(WSGI) movie_detail 과 async(ASGI) movie_detail 의 처리량 비교
+
+    python benchmarks/asgi_vs_wsgi.py --requests 200 --workers 4 --concurrency 64 --delay 0.2
+
+WSGI 는 --workers 개의 스레드(gunicorn sync 워커 수)로, ASGI 는 이벤트 루프 하나에서
+--concurrency 개의 요청을 동시에 보낸다. 매 요청은 처음 보는 영화라 TMDB 를 거친다.
+'''
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test import AsyncClient, Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from movies.tmdb_stub import StubTmdbServer  # noqa: E402
+
+
+def run_wsgi(movie_pks, workers):
+    client = Client()
+
+    def get(movie_pk):
+        return client.get(f'/movies/{movie_pk}/').status_code
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(get, movie_pks))
+
+
+def run_asgi(movie_pks, concurrency):
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get(movie_pk):
+            async with semaphore:
+                return (await client.get(f'/movies/async/{movie_pk}/')).status_code
+
+        return await asyncio.gather(*[get(movie_pk) for movie_pk in movie_pks])
+
+    return asyncio.run(main())
+
+
+def measure(name, fn, movie_pks, *args):
+    start = time.perf_counter()
+    statuses = fn(movie_pks, *args)
+    elapsed = time.perf_counter() - start
+    failed = sum(status != 200 for status in statuses)
+    print(f'{name:<5} {len(movie_pks):>6} req  {elapsed:>7.2f} s  {len(movie_pks) / elapsed:>8.1f} req/s  failed={failed}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4, help='WSGI 워커(스레드) 수')
+    parser.add_argument('--concurrency', type=int, default=64, help='ASGI 동시 요청 수')
+    parser.add_argument('--delay', type=float, default=0.2, help='stub TMDB 응답 지연 (초)')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    # 여러 스레드가 동시에 쓰므로 in-memory 가 아닌 임시 파일 DB 사용
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0)
+        run(args)
+
+
+def run(args):
+    with StubTmdbServer(delay=args.delay) as server, override_settings(TMDB_BASE_URL=server.base_url):
+        measure('wsgi', run_wsgi, range(1, args.requests + 1), args.workers)
+        measure('asgi', run_asgi, range(args.requests + 1, 2 * args.requests + 1), args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+'''
+동시에 좋아요/리뷰를 쓸 때 DB 설정별 처리량 비교
+
+    python benchmarks/db_writes.py --threads 8 --operations 300
+
+- sqlite-default: rollback journal, sqlite3 기본 timeout 5초 (기존 설정)
+- sqlite-wal: WAL + busy timeout (BFS/db.py, settings 의 OPTIONS['timeout'])
+- postgres: secrets.json 에 DATABASE 가 있을 때만, 그 서버에 테스트 DB 를 만들어 실행
+
+스레드마다 자기 연결로 --operations 번, 좋아요 토글과 리뷰 작성을 번갈아 한다.
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import OperationalError, connection, connections  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from BFS.db import configure_sqlite  # noqa: E402
+from movies.likes import toggle_like  # noqa: E402
+from movies.models import Movie, Review  # noqa: E402
+
+
+def populate(threads):
+    users = [get_user_model().objects.create(username=f'bench{i}', nickname=f'bench{i}') for i in range(threads)]
+    movie = Movie.objects.create(pk=1, title='영화', poster_path='')
+    reviews = [Review.objects.create(user=users[0], movie=movie, content='리뷰', rating=3.0) for _ in range(20)]
+    return users, [review.pk for review in reviews]
+
+
+def worker(user, review_pks, operations, seed, errors):
+    rng = random.Random(seed)
+    try:
+        for i in range(operations):
+            try:
+                if i % 2:
+                    toggle_like(Review, rng.choice(review_pks), user)
+                else:
+                    Review.objects.create(user=user, movie_id=1, content='동시 작성', rating=4.0)
+            except OperationalError:  # database is locked
+                errors.append(1)
+    finally:
+        connections.close_all()
+
+
+def measure(name, args):
+    users, review_pks = populate(args.threads)
+    errors = []
+    threads = [
+        threading.Thread(target=worker, args=(user, review_pks, args.operations, seed, errors))
+        for seed, user in enumerate(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done = args.threads * args.operations - len(errors)
+    print(f'{name:<15} {done:>6} writes  {elapsed:>7.2f} s  {done / elapsed:>8.1f} writes/s  locked={len(errors)}')
+
+
+def run_sqlite(name, args, wal):
+    if not wal:
+        connection_created.disconnect(configure_sqlite)
+    options = connection.settings_dict['OPTIONS']
+    saved = dict(options)
+    if not wal:
+        options.pop('timeout', None)
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            measure(name, args)
+        finally:
+            connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+            options.clear()
+            options.update(saved)
+            connection_created.connect(configure_sqlite)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=300, help='스레드당 쓰기 횟수')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    if connection.vendor == 'sqlite':
+        run_sqlite('sqlite-default', args, wal=False)
+        run_sqlite('sqlite-wal', args, wal=True)
+    else:
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            measure(connection.vendor, args)
+        finally:
+            connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
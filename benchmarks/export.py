@@ -0,0 +1,100 @@
+'''
+유저 활동 내보내기의 최대 메모리: UserSerializer 로 한 번에 만들 때 vs accounts.export 스트리밍
+
+    python benchmarks/export.py --sizes 1000 10000
+
+한 유저에게 size 개씩 리뷰, 리뷰 댓글, 컬렉션(영화 3 편), 북마크, 리뷰 좋아요를 만들어 두고
+JSON bytes 를 끝까지 만드는 동안의 Python 메모리 최대치(tracemalloc)와 시간을 잰다.
+스트리밍은 한 묶음씩 버리므로 size 가 늘어도 최대 메모리가 거의 같아야 한다.
+'''
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from accounts.export import export_lines  # noqa: E402
+from accounts.serializers import UserSerializer  # noqa: E402
+from movies.models import Bookmark, Collection, Movie, Review, ReviewComment  # noqa: E402
+
+
+def populate(user_pk, size, offset):
+    '''
+    pk 를 직접 매겨 bulk_create 로 넣는다. (SQLite 의 bulk_create 는 pk 를 돌려주지 않는다)
+    '''
+    get_user_model().objects.create(pk=user_pk, username=f'bench{user_pk}', nickname=f'bench{user_pk}')
+    pks = range(offset + 1, offset + size + 1)
+    Movie.objects.bulk_create([Movie(pk=pk, title=f'영화 {pk}', poster_path='') for pk in pks], batch_size=5000)
+    Review.objects.bulk_create([
+        Review(pk=pk, user_id=user_pk, movie_id=pk, content=f'리뷰 {pk} ' * 20, rating=4.5) for pk in pks
+    ], batch_size=5000)
+    ReviewComment.objects.bulk_create([
+        ReviewComment(user_id=user_pk, review_id=pk, content='댓글 ' * 10) for pk in pks
+    ], batch_size=5000)
+    Review.like_users.through.objects.bulk_create([
+        Review.like_users.through(review_id=pk, user_id=user_pk) for pk in pks
+    ], batch_size=5000)
+    Collection.objects.bulk_create([
+        Collection(pk=pk, user_id=user_pk, title=f'모음 {pk}', content='내용') for pk in pks
+    ], batch_size=5000)
+    Collection.movies.through.objects.bulk_create([
+        Collection.movies.through(collection_id=pk, movie_id=movie_pk)
+        for pk in pks for movie_pk in (pk, offset + 1, offset + size)
+    ], batch_size=5000, ignore_conflicts=True)
+    Bookmark.objects.bulk_create([Bookmark(user_id=user_pk, movie_id=pk, content='북마크') for pk in pks], batch_size=5000)
+
+
+def serializer(user_pk):
+    user = get_user_model().objects.get(pk=user_pk)
+    return len(JSONRenderer().render(UserSerializer(user).data))
+
+
+def streaming(user_pk):
+    return sum(len(chunk) for chunk in export_lines(user_pk))
+
+
+def measure(name, fn, user_pk, size):
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = fn(user_pk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f'{size:>7} rows  {name:<10} peak {peak / 1024 / 1024:>8.1f} MiB  {elapsed:>7.2f} s  '
+        f'{written / 1024 / 1024:>7.1f} MiB written'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000], help='유저당 행 수 (종류별)')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        offset = 0
+        for user_pk, size in enumerate(args.sizes, start=1):
+            populate(user_pk, size, offset)
+            offset += size
+            measure('serializer', serializer, user_pk, size)
+            measure('streaming', streaming, user_pk, size)
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''
+대량 가져오기 처리량: 행마다 Model.objects.create() vs manage.py import_data (movies.importer)
+
+    python benchmarks/import_data.py --rows 50000
+
+영화, 리뷰(JSONL), 리뷰 좋아요(CSV) 덤프를 --rows 행씩 만들어 두고 종류마다 rows/s 를 잰다.
+create() 는 느리므로 --baseline-rows 행만 재서 rows/s 로 비교한다. (signal 로 검색 색인까지 함께 갱신된다)
+'''
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from movies.models import Movie, Review  # noqa: E402
+
+USERS = 100
+
+
+def write_dumps(directory, rows, rng):
+    paths = {
+        'movie': os.path.join(directory, 'movies.jsonl'),
+        'review': os.path.join(directory, 'reviews.jsonl'),
+        'review_like': os.path.join(directory, 'review_likes.csv'),
+    }
+    with open(paths['movie'], 'w', encoding='utf-8') as file:
+        for pk in range(1, rows + 1):
+            file.write(json.dumps({'id': pk, 'title': f'영화 {pk}', 'poster_path': f'/poster{pk}.jpg'}) + '\n')
+    with open(paths['review'], 'w', encoding='utf-8') as file:
+        for pk in range(1, rows + 1):
+            file.write(json.dumps({
+                'id': pk, 'user_id': rng.randrange(1, USERS + 1), 'movie_id': pk, 'content': f'리뷰 {pk} ' * 10,
+                'rating': rng.choice([1.0, 2.5, 4.5]), 'created_at': '2020-01-01T00:00:00+00:00',
+            }) + '\n')
+    with open(paths['review_like'], 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['user_id', 'object_id'])
+        for pk in range(1, rows + 1):
+            writer.writerow([rng.randrange(1, USERS + 1), pk])
+    return paths
+
+
+def baseline(rows, rng):
+    '''
+    행마다 create(), pk 는 import 한 행과 겹치지 않게 10 억부터
+    '''
+    offset = 10 ** 9
+    start = time.perf_counter()
+    for pk in range(offset + 1, offset + rows + 1):
+        Movie.objects.create(pk=pk, title=f'영화 {pk}', poster_path=f'/poster{pk}.jpg')
+    movie_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for pk in range(offset + 1, offset + rows + 1):
+        Review.objects.create(
+            pk=pk, user_id=rng.randrange(1, USERS + 1), movie_id=pk, content=f'리뷰 {pk} ' * 10, rating=4.5,
+        )
+    return movie_elapsed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--baseline-rows', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    setup_test_environment()
+    # create() 의 post_save 작업을 백그라운드 스레드로 넘기면 SQLite 테스트 DB 가 잠긴다
+    settings.TASK_RUNNER = 'eager'
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        User = get_user_model()
+        User.objects.bulk_create([User(pk=i, username=f'bench{i}', nickname=f'bench{i}') for i in range(1, USERS + 1)])
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_dumps(directory, args.rows, rng)
+            for kind, path in paths.items():
+                start = time.perf_counter()
+                call_command('import_data', kind, path, '--batch-size', str(args.batch_size), stdout=StringIO())
+                elapsed = time.perf_counter() - start
+                print(f'{kind:<12} import_data {args.rows / elapsed:>9.0f} rows/s  {elapsed:>7.2f} s')
+        movie_elapsed, review_elapsed = baseline(args.baseline_rows, rng)
+        print(f'{"movie":<12} create()    {args.baseline_rows / movie_elapsed:>9.0f} rows/s')
+        print(f'{"review":<12} create()    {args.baseline_rows / review_elapsed:>9.0f} rows/s')
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
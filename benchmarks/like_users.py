@@ -0,0 +1,82 @@
+'''
+컬렉션 목록의 좋아요 표현별 응답 크기와 쿼리 비교
+
+    python benchmarks/like_users.py --collections 50 --likers 2000
+
+compact: like_count + liked_by_me (기본), full: ?like_users=full 로 좋아요 누른 유저 pk 목록 전체
+컬렉션마다 --likers 명 중 무작위 절반이 좋아요를 누른 상태에서 첫 페이지(--collections 개)를 요청한다.
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from movies.models import Collection  # noqa: E402
+
+
+def populate(args, rng):
+    User = get_user_model()
+    User.objects.bulk_create([User(username=f'bench{i}', nickname=f'bench{i}') for i in range(args.likers)])
+    users = list(User.objects.order_by('pk'))
+    Collection.objects.bulk_create([
+        Collection(user=users[0], title=f'모음 {i}', content='내용') for i in range(args.collections)
+    ])
+    through = Collection.like_users.through
+    rows = []
+    for collection in Collection.objects.all():
+        likers = rng.sample(users, args.likers // 2)
+        rows.extend(through(collection_id=collection.pk, user_id=user.pk) for user in likers)
+        collection.like_count = len(likers)
+        collection.save(update_fields=['like_count'])
+    through.objects.bulk_create(rows, batch_size=10000)
+    return users[0]
+
+
+def measure(name, client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+    assert response.status_code == 200
+    print(
+        f'{name:<8} {len(response.content) / 1024:>9.1f} KiB  {len(context):>3} queries  '
+        f'median {statistics.median(timings):>8.2f} ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--collections', type=int, default=50)
+    parser.add_argument('--likers', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    user = populate(args, random.Random(0))
+
+    client = APIClient()
+    client.force_authenticate(user)
+    url = f'/movies/collection/?page_size={min(args.collections, 100)}'
+    measure('compact', client, url, args.repeat)
+    measure('full', client, url + '&like_users=full', args.repeat)
+
+
+if __name__ == '__main__':
+    main()
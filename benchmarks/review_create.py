@@ -0,0 +1,85 @@
+'''
+리뷰 작성 처리량: 시청 기록/장르 선호도 갱신을 요청 안에서 할 때(inline) vs 작업 실행기로 미룰 때(tasks)
+
+    python benchmarks/review_create.py --users 20 --reviews 50
+
+- inline: TASK_RUNNER='eager', 갱신을 응답 전에 실행 (기존 동작과 같은 쿼리)
+- tasks: TASK_RUNNER='thread', 커밋 후 BFS.tasks 스레드 풀에서 유저별 순서대로 실행
+요청은 유저마다 --reviews 번, 유저를 번갈아 가며 보낸다. tasks 는 모든 작업이 끝날 때까지 걸린 시간도 출력한다.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from accounts.models import WatchedMovie  # noqa: E402
+from BFS import tasks  # noqa: E402
+
+
+GENRES = [18, 53, 35]
+
+
+def measure(name, args):
+    users = [get_user_model().objects.create(username=f'{name}{i}', nickname=f'{name}{i}') for i in range(args.users)]
+    clients = []
+    for user in users:
+        client = APIClient()
+        client.force_authenticate(user)
+        clients.append(client)
+
+    start = time.perf_counter()
+    for i in range(args.reviews):
+        for client in clients:
+            data = {'movie_title': f'영화 {i}', 'poster_path': '', 'genre_list': GENRES, 'rating': 4.5, 'content': '리뷰'}
+            response = client.post(f'/movies/{i + 1}/review/', data, format='json')
+            assert response.status_code == 200, response.content
+    elapsed = time.perf_counter() - start
+    tasks.get_runner().join()
+    drained = time.perf_counter() - start
+
+    count = args.users * args.reviews
+    watched = WatchedMovie.objects.filter(user__in=users).count()
+    assert watched == count, (watched, count)
+    print(
+        f'{name:<7} {count:>6} reviews  {elapsed:>7.2f} s  {count / elapsed:>8.1f} reviews/s  '
+        f'{elapsed / count * 1000:>6.2f} ms/request  (all updates done after {drained:.2f} s)'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--reviews', type=int, default=50, help='유저당 리뷰 수')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    settings.FEED_FANOUT = False
+    with tempfile.TemporaryDirectory() as tmp:
+        if connection.vendor == 'sqlite':
+            # 작업 스레드가 커밋된 데이터를 보도록 in-memory 대신 파일 DB
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            for name, mode in (('inline', 'eager'), ('tasks', 'thread')):
+                settings.TASK_RUNNER = mode
+                measure(name, args)
+        finally:
+            connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
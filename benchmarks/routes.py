@@ -0,0 +1,271 @@
+'''
+모든 API 라우트의 쿼리 수, 응답 시간, 응답 크기와 기록해 둔 예산(route_budgets.json) 비교
+
+    python benchmarks/routes.py                      # 예산을 넘는 라우트가 있으면 exit 1
+    python benchmarks/routes.py --users 1000         # 더 큰 데이터로
+    python benchmarks/routes.py --update-budgets     # 지금 결과를 예산으로 기록
+
+합성 데이터(유저, 영화, 리뷰, 댓글, 좋아요, 컬렉션, 북마크, 팔로우)를 bulk insert 로 만든 뒤
+movies/urls.py 와 accounts/urls.py 의 모든 라우트를 test client 로 --repeat 번씩 호출한다.
+- 응답 캐시(movies.cache)는 요청마다 비운다. (캐시가 없을 때의 쿼리 수)
+- 미루는 작업(BFS.tasks)과 피드 fan-out 은 요청 안에서 실행한다. (요청이 일으키는 쿼리를 모두 센다)
+- DELETE 는 데이터를 지우므로 호출하지 않는다.
+쿼리 수는 예산을 넘으면 실패, 응답 시간은 기계마다 다르므로 예산의 --slack 배를 넘을 때만 실패한다.
+예산이 없는 라우트와 아래 ROUTES 에 없는 라우트도 실패로 본다.
+'''
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.urls import get_resolver  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from movies import feed, search  # noqa: E402
+from movies.cache import get_cache  # noqa: E402
+from movies.likes import LIKE_MODELS, reconcile_like_counts  # noqa: E402
+from movies.models import Bookmark, Collection, CollectionComment, Movie, Review, ReviewComment  # noqa: E402
+from movies.tmdb_stub import StubTmdbServer  # noqa: E402
+
+
+BUDGETS = Path(__file__).resolve().parent / 'route_budgets.json'
+PASSWORD = 'bench-password-2021'
+
+
+def populate(args, rng):
+    '''
+    pk 를 직접 매겨 bulk_create 로 넣는다. (SQLite 의 bulk_create 는 pk 를 돌려주지 않는다)
+    '''
+    User = get_user_model()
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(pk=i, username=f'bench{i}', nickname=f'bench{i}', password=password, is_staff=i == 1)
+        for i in range(1, args.users + 1)
+    ])
+    user_pks = range(1, args.users + 1)
+    Movie.objects.bulk_create([
+        Movie(pk=i, title=f'영화 {i}', poster_path=f'/poster{i}.jpg') for i in range(1, args.movies + 1)
+    ])
+    movie_pks = range(1, args.movies + 1)
+
+    reviews = []
+    for user_pk in user_pks:
+        for movie_pk in rng.sample(movie_pks, args.reviews):
+            reviews.append(Review(pk=len(reviews) + 1, user_id=user_pk, movie_id=movie_pk, content=f'리뷰 {movie_pk}', rating=rng.choice([1.0, 2.5, 4.5])))
+    Review.objects.bulk_create(reviews, batch_size=5000)
+    ReviewComment.objects.bulk_create([
+        ReviewComment(user_id=rng.choice(user_pks), review_id=review.pk, content='댓글')
+        for review in reviews for _ in range(args.comments)
+    ], batch_size=5000)
+
+    collections = [
+        Collection(pk=i + 1, user_id=user_pk, title=f'모음 {i}', content='내용')
+        for i, user_pk in enumerate(user_pk for user_pk in user_pks for _ in range(args.collections))
+    ]
+    Collection.objects.bulk_create(collections, batch_size=5000)
+    Collection.movies.through.objects.bulk_create([
+        Collection.movies.through(collection_id=collection.pk, movie_id=movie_pk)
+        for collection in collections for movie_pk in rng.sample(movie_pks, args.collection_movies)
+    ], batch_size=5000)
+    CollectionComment.objects.bulk_create([
+        CollectionComment(user_id=rng.choice(user_pks), collection_id=collection.pk, content='댓글')
+        for collection in collections for _ in range(args.comments)
+    ], batch_size=5000)
+
+    for model, pks in ((Movie, movie_pks), (Review, range(1, len(reviews) + 1)), (Collection, range(1, len(collections) + 1))):
+        field = model.like_users.field
+        through = field.remote_field.through
+        through.objects.bulk_create([
+            through(**{f'{field.m2m_field_name()}_id': pk, f'{field.m2m_reverse_field_name()}_id': user_pk})
+            for user_pk in user_pks for pk in rng.sample(pks, min(args.likes, len(pks)))
+        ], batch_size=5000)
+    for model in LIKE_MODELS:
+        reconcile_like_counts(model)
+
+    Bookmark.objects.bulk_create([
+        Bookmark(user_id=user_pk, movie_id=movie_pk, content='북마크')
+        for user_pk in user_pks for movie_pk in rng.sample(movie_pks, args.bookmarks)
+    ], batch_size=5000)
+    follows = get_user_model().like_users.through
+    follows.objects.bulk_create([
+        follows(from_user_id=user_pk, to_user_id=other)
+        for user_pk in user_pks for other in rng.sample(user_pks, min(args.follows, args.users)) if other != user_pk
+    ], batch_size=5000)
+
+    search.get_backend().rebuild()
+    feed.rebuild()
+
+    # 수정 라우트가 쓸 유저 1 의 댓글
+    ReviewComment.objects.create(user_id=1, review_id=reviews[0].pk, content='내 댓글')
+    CollectionComment.objects.create(user_id=1, collection_id=collections[0].pk, content='내 댓글')
+
+
+def routes():
+    '''
+    [(라우트 패턴, method, url, data), ...], 패턴은 urls.py 의 경로 그대로
+    '''
+    review = Review.objects.filter(user_id=1).first()
+    collection = Collection.objects.filter(user_id=1).first()
+    review_comment = ReviewComment.objects.filter(user_id=1).last()
+    collection_comment = CollectionComment.objects.filter(user_id=1).last()
+    movie_pk = review.movie_id
+    other_movie = Movie.objects.exclude(review__user_id=1).first().pk
+    pks = lambda model: ','.join(map(str, model.objects.values_list('pk', flat=True)[:50]))  # noqa: E731
+    signup = itertools.count()
+
+    return [
+        ('/movies/<int:movie_pk>/', 'get', f'/movies/{movie_pk}/', None),
+        ('/movies/<int:movie_pk>/like/', 'post', f'/movies/{movie_pk}/like/', {'title': '영화', 'poster_path': '', 'movie_genre': [18]}),
+        ('/movies/<int:movie_pk>/like/only/', 'post', f'/movies/{other_movie}/like/only/', {'pk': other_movie, 'title': '영화', 'poster_path': '', 'genre_list': [18]}),
+        ('/movies/recommend/', 'get', '/movies/recommend/', None),
+        ('/movies/likes/', 'get', f'/movies/likes/?movie={pks(Movie)}&review={pks(Review)}&collection={pks(Collection)}', None),
+        ('/movies/feed/', 'get', '/movies/feed/', None),
+        ('/movies/review/', 'get', '/movies/review/', None),
+        ('/movies/<int:movie_pk>/review/', 'post', f'/movies/{other_movie}/review/', {'movie_title': '영화', 'poster_path': '', 'genre_list': [18], 'rating': 4.5, 'content': '리뷰'}),
+        ('/movies/<int:movie_pk>/review/user/<int:user_pk>/', 'get', f'/movies/{movie_pk}/review/user/1/', None),
+        ('/movies/review/<int:review_pk>/', 'get', f'/movies/review/{review.pk}/', None),
+        ('/movies/review/<int:review_pk>/', 'put', f'/movies/review/{review.pk}/', {'content': '수정', 'rating': review.rating, 'genre_list': [18]}),
+        ('/movies/review/<int:review_pk>/like/', 'post', f'/movies/review/{review.pk}/like/', None),
+        ('/movies/review/<int:review_pk>/comment/', 'get', f'/movies/review/{review.pk}/comment/', None),
+        ('/movies/review/<int:review_pk>/comment/', 'post', f'/movies/review/{review.pk}/comment/', {'content': '댓글'}),
+        ('/movies/review/comment/<int:comment_pk>/', 'put', f'/movies/review/comment/{review_comment.pk}/', {'content': '수정'}),
+        ('/movies/review/comment/<int:comment_pk>/like/', 'post', f'/movies/review/comment/{review_comment.pk}/like/', None),
+        ('/movies/collection/', 'get', '/movies/collection/', None),
+        ('/movies/collection/', 'post', '/movies/collection/', {'title': '모음', 'content': '내용', 'movie_infos': [[pk, '', f'영화 {pk}'] for pk in range(1, 11)]}),
+        ('/movies/collection/<int:collection_pk>/', 'get', f'/movies/collection/{collection.pk}/', None),
+        ('/movies/collection/<int:collection_pk>/', 'put', f'/movies/collection/{collection.pk}/', {'title': '모음', 'content': '수정', 'movie_pks': list(range(1, 11))}),
+        ('/movies/collection/<int:collection_pk>/like', 'post', f'/movies/collection/{collection.pk}/like', None),
+        ('/movies/collection/<int:collection_pk>/comment/', 'get', f'/movies/collection/{collection.pk}/comment/', None),
+        ('/movies/collection/<int:collection_pk>/comment/', 'post', f'/movies/collection/{collection.pk}/comment/', {'content': '댓글'}),
+        ('/movies/collection/comment/<int:comment_pk>/', 'put', f'/movies/collection/comment/{collection_comment.pk}/', {'content': '수정'}),
+        ('/movies/collection/comment/<int:comment_pk>/like/', 'post', f'/movies/collection/comment/{collection_comment.pk}/like/', None),
+        ('/movies/search/', 'get', '/movies/search/?keyword=리뷰', None),
+        ('/movies/cache/stats/', 'get', '/movies/cache/stats/', None),
+        ('/movies/async/<int:movie_pk>/', 'get', f'/movies/async/{movie_pk}/', None),
+        ('/movies/async/search/', 'get', '/movies/async/search/?keyword=리뷰', None),
+
+        ('/accounts/get-user/', 'get', '/accounts/get-user/', None),
+        ('/accounts/signup/', 'post', '/accounts/signup/', lambda: {'username': f'new{next(signup)}', 'nickname': 'new', 'password': PASSWORD, 'passwordConfirmation': PASSWORD}),
+        ('/accounts/api-token-auth/', 'post', '/accounts/api-token-auth/', {'username': 'bench1', 'password': PASSWORD}),
+        ('/accounts/profile/<int:user_pk>/', 'get', '/accounts/profile/1/', None),
+        ('/accounts/profile/<int:user_pk>/<str:section>/', 'get', '/accounts/profile/1/review_set/', None),
+        ('/accounts/async/profile/<int:user_pk>/', 'get', '/accounts/async/profile/1/', None),
+        ('/accounts/follow/<int:user_pk>/', 'post', '/accounts/follow/2/', None),
+        ('/accounts/export/', 'get', '/accounts/export/', None),
+        ('/accounts/change_password/<int:pk>/', 'put', '/accounts/change_password/1/', {'oldPassword': PASSWORD, 'password': PASSWORD, 'password2': PASSWORD}),
+        ('/accounts/get-base-info-for-rec/', 'get', '/accounts/get-base-info-for-rec/', None),
+    ]
+
+
+def url_patterns():
+    '''
+    movies/urls.py, accounts/urls.py 의 모든 라우트 패턴
+    '''
+    patterns = set()
+    for include in get_resolver().url_patterns:
+        prefix = str(include.pattern)
+        if prefix not in ('movies/', 'accounts/'):
+            continue
+        for pattern in include.url_patterns:
+            patterns.add(f'/{prefix}{pattern.pattern}')
+    return patterns
+
+
+def measure(client, method, url, data, repeat):
+    timings, queries = [], []
+    for _ in range(repeat):
+        get_cache().clear()
+        connection.queries_log.clear()  # 9000 개가 차면 CaptureQueriesContext 가 0 을 센다
+        payload = data() if callable(data) else data
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, payload, format='json') if payload is not None else getattr(client, method)(url)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(context))
+    return response.status_code, max(queries), statistics.median(timings), len(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--movies', type=int, default=500)
+    parser.add_argument('--reviews', type=int, default=5, help='유저당 리뷰 수')
+    parser.add_argument('--comments', type=int, default=5, help='리뷰/컬렉션당 댓글 수')
+    parser.add_argument('--likes', type=int, default=20, help='유저당 영화/리뷰/컬렉션 좋아요 수')
+    parser.add_argument('--collections', type=int, default=2, help='유저당 컬렉션 수')
+    parser.add_argument('--collection-movies', type=int, default=10, help='컬렉션당 영화 수')
+    parser.add_argument('--bookmarks', type=int, default=5, help='유저당 북마크 수')
+    parser.add_argument('--follows', type=int, default=20, help='유저당 팔로우 수')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--slack', type=float, default=3.0, help='응답 시간 예산의 몇 배까지 허용할지')
+    parser.add_argument('--update-budgets', action='store_true')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    settings.TASK_RUNNER = 'eager'
+    budgets = json.loads(BUDGETS.read_text()) if BUDGETS.exists() else {}
+
+    with tempfile.TemporaryDirectory() as tmp, StubTmdbServer() as tmdb:
+        settings.TMDB_BASE_URL = tmdb.base_url
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            start = time.perf_counter()
+            populate(args, random.Random(0))
+            print(f'seeded in {time.perf_counter() - start:.1f} s')
+
+            client = APIClient()
+            client.force_authenticate(get_user_model().objects.get(pk=1))
+            specs = routes()
+            failures = [f'{pattern}: ROUTES 에 없음' for pattern in sorted(url_patterns() - {spec[0] for spec in specs})]
+            results = {}
+            print(f'{"route":<58} {"status":>6} {"queries":>7} {"budget":>6} {"ms":>8} {"KiB":>8}')
+            for pattern, method, url, data in specs:
+                name = f'{method.upper()} {pattern}'
+                status, queries, ms, size = measure(client, method, url, data, args.repeat)
+                results[name] = {'queries': queries, 'ms': round(ms, 2)}
+                budget = budgets.get(name)
+                print(f'{name:<58} {status:>6} {queries:>7} {budget["queries"] if budget else "-":>6} {ms:>8.2f} {size / 1024:>8.1f}')
+                if status >= 400:
+                    failures.append(f'{name}: status {status}')
+                if args.update_budgets:
+                    continue
+                if budget is None:
+                    failures.append(f'{name}: 예산 없음 (--update-budgets)')
+                    continue
+                if queries > budget['queries']:
+                    failures.append(f'{name}: 쿼리 {queries} > 예산 {budget["queries"]}')
+                if ms > budget['ms'] * args.slack:
+                    failures.append(f'{name}: {ms:.1f} ms > 예산 {budget["ms"]} ms x {args.slack}')
+        finally:
+            connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+
+    if args.update_budgets and not failures:
+        BUDGETS.write_text(json.dumps(results, ensure_ascii=False, indent=2) + '\n')
+        print(f'budgets written to {BUDGETS.name}')
+    if failures:
+        print('\n'.join(['', 'FAILED', *failures]))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
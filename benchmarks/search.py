@@ -0,0 +1,98 @@
+'''
+합성 코퍼스에서 icontains 검색과 FTS5 색인 검색의 응답 시간 비교
+
+    python benchmarks/search.py --reviews 100000 --queries 50
+
+리뷰/컬렉션은 --vocabulary 개의 무작위 단어로 만들고, 같은 단어 목록에서 뽑은 검색어로
+두 백엔드(movies.search)의 첫 페이지(20개) 검색 시간을 잰다.
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from movies.models import Collection, Movie, Review  # noqa: E402
+from movies.search import IContainsBackend, SQLiteFTS5Backend  # noqa: E402
+
+
+SYLLABLES = '가나다라마바사아자차카타파하영화배우감독장면연기음악결말반전'
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def sentence(vocabulary, rng, length):
+    return ' '.join(rng.choice(vocabulary) for _ in range(length))
+
+
+def populate(args, vocabulary, rng):
+    user = get_user_model().objects.create(username='bench', nickname='bench')
+    Movie.objects.bulk_create([
+        Movie(pk=pk, title=sentence(vocabulary, rng, 2), poster_path='') for pk in range(1, args.movies + 1)
+    ])
+    for start in range(0, args.reviews, 10000):
+        Review.objects.bulk_create([
+            Review(user=user, movie_id=rng.randint(1, args.movies), content=sentence(vocabulary, rng, 30), rating=3.0)
+            for _ in range(start, min(start + 10000, args.reviews))
+        ])
+    Collection.objects.bulk_create([
+        Collection(user=user, title=sentence(vocabulary, rng, 3), content=sentence(vocabulary, rng, 20))
+        for _ in range(args.reviews // 10)
+    ])
+    return SQLiteFTS5Backend().rebuild()  # bulk_create 는 signal 을 보내지 않는다
+
+
+def measure(name, backend, keywords):
+    timings = []
+    for keyword in keywords:
+        start = time.perf_counter()
+        for kind in ('review', 'collection', 'movie'):
+            backend.search(kind, keyword, 0, 20)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+    print(f'{name:<9} median {statistics.median(timings):>8.2f} ms  p95 {p95:>8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--movies', type=int, default=5000)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+
+    start = time.perf_counter()
+    indexed = populate(args, vocabulary, rng)
+    print(f'corpus    {indexed} documents indexed in {time.perf_counter() - start:.1f} s')
+
+    keywords = [rng.choice(vocabulary) for _ in range(args.queries)]
+    measure('icontains', IContainsBackend(), keywords)
+    measure('fts5', SQLiteFTS5Backend(), keywords)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''
+큰 목록의 직렬화 처리량: DRF serializer + JSONRenderer vs movies.rows + FastJSONRenderer(orjson)
+
+    python benchmarks/serialization.py --rows 10000
+
+리뷰(+ 최신 댓글), 컬렉션(+ 담긴 영화), 영화를 --rows 개씩 만들어 두고,
+종류마다 queryset 을 읽어 dict 로 만들고 JSON bytes 로 렌더링하기까지를 --repeat 번 재서 가장 빠른 값으로 rows/s 를 낸다.
+serializer / rows 와 renderer 조합을 따로 재서 어느 쪽이 얼마나 줄였는지 보인다.
+'''
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BFS.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from BFS.renderers import FastJSONRenderer, orjson  # noqa: E402
+from movies.models import Collection, Movie, Review, ReviewComment  # noqa: E402
+from movies.rows import CollectionListRows, MovieRows, ReviewListRows  # noqa: E402
+
+
+def populate(args, rng):
+    '''
+    pk 를 직접 매겨 bulk_create 로 넣는다. (SQLite 의 bulk_create 는 pk 를 돌려주지 않는다)
+    '''
+    User = get_user_model()
+    User.objects.bulk_create([User(pk=i, username=f'bench{i}', nickname=f'bench{i}') for i in range(1, 101)])
+    user_pks = range(1, 101)
+    Movie.objects.bulk_create([
+        Movie(pk=i, title=f'영화 {i}', poster_path=f'/poster{i}.jpg', like_count=rng.randrange(100))
+        for i in range(1, args.rows + 1)
+    ], batch_size=5000)
+    Review.objects.bulk_create([
+        Review(pk=i, user_id=rng.choice(user_pks), movie_id=i, content=f'리뷰 {i} ' * 10, rating=rng.choice([1.0, 2.5, 4.5]))
+        for i in range(1, args.rows + 1)
+    ], batch_size=5000)
+    ReviewComment.objects.bulk_create([
+        ReviewComment(user_id=rng.choice(user_pks), review_id=i, content='댓글')
+        for i in range(1, args.rows + 1) for _ in range(args.comments)
+    ], batch_size=5000)
+    Collection.objects.bulk_create([
+        Collection(pk=i, user_id=rng.choice(user_pks), title=f'모음 {i}', content='내용')
+        for i in range(1, args.rows + 1)
+    ], batch_size=5000)
+    through = Collection.movies.through
+    through.objects.bulk_create([
+        through(collection_id=i, movie_id=movie_pk)
+        for i in range(1, args.rows + 1) for movie_pk in rng.sample(range(1, args.rows + 1), args.movies)
+    ], batch_size=5000)
+
+
+KINDS = (
+    ('review', lambda: Review.objects.for_list().with_like_state(), ReviewListRows),
+    ('collection', lambda: Collection.objects.for_list().with_like_state(), CollectionListRows),
+    ('movie', lambda: Movie.objects.for_list().with_like_state(), MovieRows),
+)
+
+
+def measure(queryset, rows_class, fast, renderer, repeat):
+    best, size = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if fast:
+            data = rows_class(rows_class.values(queryset()), many=True).data
+        else:
+            data = rows_class.serializer_class(queryset(), many=True).data
+        size = len(renderer.render(data))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=3, help='리뷰당 댓글 수')
+    parser.add_argument('--movies', type=int, default=5, help='컬렉션당 영화 수')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        populate(args, random.Random(0))
+        print(f'orjson: {"yes" if orjson else "no (FastJSONRenderer = JSONRenderer)"}')
+        for name, queryset, rows_class in KINDS:
+            baseline = None
+            for label, fast, renderer in (
+                ('serializer + json', False, JSONRenderer()),
+                ('serializer + orjson', False, FastJSONRenderer()),
+                ('rows + json', True, JSONRenderer()),
+                ('rows + orjson', True, FastJSONRenderer()),
+            ):
+                elapsed, size = measure(queryset, rows_class, fast, renderer, args.repeat)
+                baseline = baseline or elapsed
+                print(
+                    f'{name:<10} {label:<20} {args.rows / elapsed:>9.0f} rows/s  {elapsed * 1000:>8.1f} ms  '
+                    f'{size / 1024:>8.1f} KiB  x{baseline / elapsed:.1f}'
+                )
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+'''
+ASGI 로 띄웠을 때 TMDB 를 기다리는 동안 워커를 붙잡지 않도록 읽기 전용 뷰의 async 버전
+(DRF 는 async 뷰를 지원하지 않으므로 인증이 필요 없는 GET 뷰만, 응답 형식은 sync 뷰와 같다)
+'''
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed
+from django.http.response import JsonResponse
+from .models import Movie
+from .tmdb_async import get_client
+from .views import create_movie, movie_detail_data, search_data
+
+
+async def movie_detail(request, movie_pk):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    movie = await sync_to_async(Movie.objects.filter(pk=movie_pk).first)()
+    if movie is None:
+        tmdb_movie_info = await get_client().movie_info(movie_pk)
+        movie = await sync_to_async(create_movie)(movie_pk, tmdb_movie_info)
+    return JsonResponse(await sync_to_async(movie_detail_data)(movie))
+
+
+async def search(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    data = await sync_to_async(search_data)(
+        request.GET.get('keyword'),
+        page=request.GET.get('page'),
+        page_size=request.GET.get('page_size'),
+    )
+    return JsonResponse(data)
@@ -0,0 +1,139 @@
+'''
+자주 읽히는 GET 응답(영화 상세, 리뷰/컬렉션 상세, 댓글 목록)의 캐시
+
+settings.RESPONSE_CACHE 에 지정한 Django 캐시를 사용한다. (LocMemCache 는 LRU, Redis 도 가능, None 이면 끔)
+리소스마다 버전 토큰을 두고, 데이터는 "리소스:pk:버전:variant" 에 저장한다. 무효화는 버전 토큰만 지우므로
+무효화 직전에 DB 를 읽은 요청이 뒤늦게 저장한 값은 새 버전에서 보이지 않는다.
+무효화는 movies.signals 가 모델 저장/삭제, 좋아요 변경 시점에 호출한다.
+'''
+import threading
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .models import Collection, CollectionComment, Movie, Review, ReviewComment
+
+
+# 캐시하는 리소스, 키는 (리소스, pk)
+RESOURCES = ('movie', 'review', 'review_comments', 'collection', 'collection_comments')
+
+
+class Stats:
+    '''
+    리소스별 hit/miss 횟수 (프로세스 단위)
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def add(self, resource, result):
+        with self.lock:
+            self.counts[resource, result] += 1
+
+    def snapshot(self):
+        with self.lock:
+            counts = self.counts.copy()
+        data = {}
+        for resource in RESOURCES:
+            hits, misses = counts[resource, 'hit'], counts[resource, 'miss']
+            data[resource] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            }
+        return data
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+
+stats = Stats()
+
+
+def get_cache():
+    if settings.RESPONSE_CACHE is None:
+        return None
+    return caches[settings.RESPONSE_CACHE]
+
+
+def _version_key(resource, pk):
+    return f'v:{resource}:{pk}'
+
+
+def cached(resource, pk, build, variant=''):
+    '''
+    캐시에 있으면 캐시 값을, 없으면 build() 결과를 저장하고 반환
+    variant: 같은 리소스의 다른 응답(댓글 목록의 cursor 등), 무효화는 리소스 단위로 함께 된다
+    '''
+    cache = get_cache()
+    if cache is None:
+        return build()
+
+    version_key = _version_key(resource, pk)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(version_key)
+    key = f'{resource}:{pk}:{version}:{variant}'
+
+    data = cache.get(key)
+    if data is not None:
+        stats.add(resource, 'hit')
+        return data
+    stats.add(resource, 'miss')
+    data = build()
+    cache.set(key, data)
+    return data
+
+
+def invalidate(keys):
+    '''
+    keys: [(리소스, pk), ...]
+    트랜잭션 안이면 커밋 전에 다른 요청이 옛 값을 다시 채울 수 있으므로 커밋 후에 한 번 더 지운다.
+    '''
+    cache = get_cache()
+    if cache is None or not keys:
+        return
+    version_keys = [_version_key(resource, pk) for resource, pk in set(keys)]
+    cache.delete_many(version_keys)
+    transaction.on_commit(lambda: cache.delete_many(version_keys))
+
+
+# 모델 pk 로 그 객체가 들어가는 캐시 키를 찾는다
+
+def movie_keys(movie_pk):
+    return [('movie', movie_pk)]
+
+
+def review_keys(review_pk, movie_pk=None):
+    if movie_pk is None:
+        movie_pk = Review.objects.filter(pk=review_pk).values_list('movie_id', flat=True).first()
+    keys = [('review', review_pk), ('review_comments', review_pk)]
+    if movie_pk is not None:
+        keys.append(('movie', movie_pk))  # 영화 상세에 리뷰와 댓글이 들어간다
+    return keys
+
+
+def review_comment_keys(comment_pk):
+    review_pk = ReviewComment.objects.filter(pk=comment_pk).values_list('review_id', flat=True).first()
+    return review_keys(review_pk) if review_pk is not None else []
+
+
+def collection_keys(collection_pk):
+    return [('collection', collection_pk), ('collection_comments', collection_pk)]
+
+
+def collection_comment_keys(comment_pk):
+    collection_pk = CollectionComment.objects.filter(pk=comment_pk).values_list('collection_id', flat=True).first()
+    return collection_keys(collection_pk) if collection_pk is not None else []
+
+
+KEYS = {
+    Movie: movie_keys,
+    Review: review_keys,
+    ReviewComment: review_comment_keys,
+    Collection: collection_keys,
+    CollectionComment: collection_comment_keys,
+}
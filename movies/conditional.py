@@ -0,0 +1,165 @@
+'''
+조건부 GET (ETag / Last-Modified)
+
+응답에 들어가는 행들의 개수와 최신 updated_at(좋아요 테이블은 최대 id)을 쿼리 한 번으로 모아 validator 를 만든다.
+If-None-Match 가 맞으면 serializer 를 거치지 않고 304 를 반환한다.
+좋아요 테이블에는 시각이 없어 Last-Modified 만으로는 좋아요 변경을 알 수 없으므로, 304 는 ETag 로만 판단한다.
+응답에 들어가는 작성자(닉네임)는 작성자들의 최신 User.updated_at 으로 반영한다.
+응답의 liked_by_me 가 유저마다 다르므로 ETag 에는 요청한 유저와 쿼리스트링(?like_users, 댓글 cursor)도 들어간다.
+'''
+import hashlib
+from functools import wraps
+from django.contrib.auth import get_user_model
+from django.db.models import DateTimeField, F, Func, IntegerField, Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .models import Bookmark, Collection, CollectionComment, Movie, Review, ReviewComment
+
+
+def _aggregate(queryset, function, field, output_field):
+    # GROUP BY 없이 집계하는 스칼라 서브쿼리
+    return Subquery(
+        queryset.order_by().annotate(value=Func(F(field), function=function, output_field=output_field)).values('value')[:1],
+        output_field=output_field,
+    )
+
+
+def _rows(name, queryset):
+    '''
+    수정될 수 있는 행: 개수 + 최신 updated_at
+    '''
+    return {
+        f'{name}_count': _aggregate(queryset, 'COUNT', 'pk', IntegerField()),
+        f'{name}_updated_at': _aggregate(queryset, 'MAX', 'updated_at', DateTimeField()),
+    }
+
+
+def _links(name, queryset):
+    '''
+    추가/삭제만 되는 행(좋아요 등): 개수 + 최대 id (id 는 재사용되지 않는다)
+    '''
+    return {
+        f'{name}_count': _aggregate(queryset, 'COUNT', 'pk', IntegerField()),
+        f'{name}_last_id': _aggregate(queryset, 'MAX', 'pk', IntegerField()),
+    }
+
+
+def _authors(name, queryset):
+    '''
+    queryset 행의 작성자(user): 최신 updated_at (닉네임을 바꾸면 달라진다)
+    '''
+    authors = get_user_model().objects.filter(pk__in=queryset.values('user_id'))
+    return {f'{name}_authors_updated_at': _aggregate(authors, 'MAX', 'updated_at', DateTimeField())}
+
+
+def _likes(model, **lookups):
+    field = model.like_users.field
+    return field.remote_field.through.objects.filter(**{f'{field.m2m_field_name()}__{key}': value for key, value in lookups.items()})
+
+
+def movie_parts(movie_pk):
+    return Movie, {
+        **_links('likes', _likes(Movie, pk=movie_pk)),
+        **_links('bookmarks', Bookmark.objects.filter(movie_id=movie_pk)),
+        **_rows('reviews', Review.objects.filter(movie_id=movie_pk)),
+        **_authors('reviews', Review.objects.filter(movie_id=movie_pk)),
+        **_links('review_likes', _likes(Review, movie_id=movie_pk)),
+        **_rows('comments', ReviewComment.objects.filter(review__movie_id=movie_pk)),
+        **_authors('comments', ReviewComment.objects.filter(review__movie_id=movie_pk)),
+        **_links('comment_likes', _likes(ReviewComment, review__movie_id=movie_pk)),
+    }
+
+
+def review_comments_parts(review_pk):
+    return Review, {
+        **_rows('comments', ReviewComment.objects.filter(review_id=review_pk)),
+        **_authors('comments', ReviewComment.objects.filter(review_id=review_pk)),
+        **_links('comment_likes', _likes(ReviewComment, review_id=review_pk)),
+    }
+
+
+def review_parts(review_pk):
+    _, parts = review_comments_parts(review_pk)
+    return Review, {
+        'updated_at': F('updated_at'),
+        **_authors('review', Review.objects.filter(pk=review_pk)),
+        **_links('likes', _likes(Review, pk=review_pk)),
+        **parts,
+    }
+
+
+def collection_comments_parts(collection_pk):
+    return Collection, {
+        **_rows('comments', CollectionComment.objects.filter(collection_id=collection_pk)),
+        **_authors('comments', CollectionComment.objects.filter(collection_id=collection_pk)),
+        **_links('comment_likes', _likes(CollectionComment, collection_id=collection_pk)),
+    }
+
+
+def collection_parts(collection_pk):
+    _, parts = collection_comments_parts(collection_pk)
+    return Collection, {
+        'updated_at': F('updated_at'),
+        **_authors('collection', Collection.objects.filter(pk=collection_pk)),
+        **_links('likes', _likes(Collection, pk=collection_pk)),
+        **_links('movies', Collection.movies.through.objects.filter(collection_id=collection_pk)),
+        **parts,
+    }
+
+
+PARTS = {
+    'movie': movie_parts,
+    'review': review_parts,
+    'review_comments': review_comments_parts,
+    'collection': collection_parts,
+    'collection_comments': collection_comments_parts,
+}
+
+
+def validators(resource, pk, variant=''):
+    '''
+    (ETag, Last-Modified 또는 None), 대상이 없으면 None
+    '''
+    model, parts = PARTS[resource](pk)
+    row = model.objects.filter(pk=pk).annotate(**{f'v_{name}': value for name, value in parts.items()})
+    row = row.values_list(*[f'v_{name}' for name in parts]).first()
+    if row is None:
+        return None
+    signature = '|'.join([resource, str(pk), variant, *map(str, row)])
+    etag = quote_etag(hashlib.md5(signature.encode()).hexdigest())
+    timestamps = [value for value in row if hasattr(value, 'timestamp')]
+    last_modified = max(timestamps).timestamp() if timestamps else None
+    return etag, last_modified
+
+
+def conditional(resource, pk_kwarg):
+    '''
+    GET 에 ETag / Last-Modified 헤더를 붙이고, If-None-Match 가 맞으면 view 를 실행하지 않고 304 를 반환
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            variant = f'{request.user.pk}|{request.GET.urlencode()}'
+            result = validators(resource, kwargs[pk_kwarg], variant)
+            if result is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = result
+            if request.META.get('HTTP_IF_NONE_MATCH'):
+                not_modified = get_conditional_response(request, etag=etag)
+                if not_modified is not None:
+                    not_modified['ETag'] = etag
+                    patch_vary_headers(not_modified, ['Authorization'])
+                    return not_modified
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                patch_vary_headers(response, ['Authorization'])
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
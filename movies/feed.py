@@ -0,0 +1,228 @@
+'''
+팔로우한 유저의 활동 피드 (fan-out on write)
+
+리뷰/컬렉션 작성, 영화/리뷰/컬렉션 좋아요가 일어나면 작성자를 팔로우하는 유저마다 TimelineEntry 를 한 행씩 복사해 둔다.
+피드 조회는 (owner, created_at) 인덱스 범위 읽기 한 번이고, 팔로우 관계나 리뷰/컬렉션 테이블을 조인하지 않는다.
+
+복사는 커밋 후에 BFS.tasks 작업(fan_out)으로 처리한다. (settings.TASK_RUNNER, settings.FEED_FANOUT 이 False 면 끔)
+유저마다 최신 settings.FEED_MAX_ENTRIES 개만 남긴다.
+작업이 처리되기 전에 프로세스가 끝나면 그 이벤트는 사라지므로, 어긋나면 manage.py rebuild_timelines 로 다시 만든다.
+'''
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from BFS.tasks import task
+from .models import Collection, Movie, Review, TimelineEntry
+
+
+def _movie(movie):
+    return {'movie': movie.pk, 'title': movie.title, 'poster_path': movie.poster_path}
+
+
+def _review(review):
+    return {
+        'review': review.pk,
+        'movie': review.movie_id,
+        'movie_title': review.movie.title,
+        'poster_path': review.movie.poster_path,
+        'content': review.content,
+        'rating': review.rating,
+    }
+
+
+def _collection(collection):
+    return {'collection': collection.pk, 'title': collection.title, 'content': collection.content}
+
+
+# kind: (요약을 만들 때 쓰는 queryset, 요약 함수)
+KINDS = {
+    'review': (Review.objects.select_related('movie'), _review),
+    'collection': (Collection.objects.all(), _collection),
+    'like_movie': (Movie.objects.all(), _movie),
+    'like_review': (Review.objects.select_related('movie'), _review),
+    'like_collection': (Collection.objects.all(), _collection),
+}
+
+# 같은 대상을 가리키는 kind (대상이 수정/삭제되면 함께 갱신/삭제)
+OBJECT_KINDS = {
+    Movie: ('like_movie',),
+    Review: ('review', 'like_review'),
+    Collection: ('collection', 'like_collection'),
+}
+
+LIKE_KINDS = {Movie: 'like_movie', Review: 'like_review', Collection: 'like_collection'}
+
+
+def _follow_table():
+    field = get_user_model().like_users.field
+    return field.remote_field.through, field.m2m_field_name(), field.m2m_reverse_field_name()
+
+
+def followers(actor_pks):
+    '''
+    {actor pk: [actor 를 팔로우하는 유저 pk, ...]} (쿼리 한 번)
+    '''
+    through, follower_field, followee_field = _follow_table()
+    result = {pk: [] for pk in actor_pks}
+    rows = through.objects.filter(**{f'{followee_field}__in': actor_pks})
+    for follower_pk, actor_pk in rows.values_list(f'{follower_field}_id', f'{followee_field}_id'):
+        if follower_pk != actor_pk:
+            result[actor_pk].append(follower_pk)
+    return result
+
+
+def _snapshots(targets):
+    '''
+    targets: {kind: {object pk, ...}} -> {(kind, object pk): 요약}, 이미 삭제된 대상은 빠진다
+    '''
+    data = {}
+    for kind, pks in targets.items():
+        queryset, snapshot = KINDS[kind]
+        for obj in queryset.filter(pk__in=pks):
+            data[kind, obj.pk] = snapshot(obj)
+    return data
+
+
+def _add(events):
+    '''
+    events: [('add', kind, object pk, actor pk, created_at), ...] 를 팔로워 타임라인에 한 번에 넣는다
+    '''
+    targets = {}
+    for _, kind, object_id, _, _ in events:
+        targets.setdefault(kind, set()).add(object_id)
+    data = _snapshots(targets)
+    fans = followers({actor_pk for _, _, _, actor_pk, _ in events})
+
+    entries = [
+        TimelineEntry(owner_id=owner_pk, actor_id=actor_pk, kind=kind, object_id=object_id,
+                      data=data[kind, object_id], created_at=created_at)
+        for _, kind, object_id, actor_pk, created_at in events if (kind, object_id) in data
+        for owner_pk in fans[actor_pk]
+    ]
+    # 같은 이벤트를 다시 처리해도 unique 제약에 걸려 중복되지 않는다
+    TimelineEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+    return {entry.owner_id for entry in entries}
+
+
+def _backfill(owner_pk, actor_pk):
+    '''
+    새로 팔로우한 유저의 최근 리뷰/컬렉션을 타임라인에 넣는다. (좋아요는 시각이 없어 넣지 않는다)
+    '''
+    limit = settings.FEED_MAX_ENTRIES
+    entries = []
+    for kind in ('review', 'collection'):
+        queryset, snapshot = KINDS[kind]
+        for obj in queryset.filter(user_id=actor_pk).order_by('-created_at', '-pk')[:limit]:
+            entries.append(TimelineEntry(
+                owner_id=owner_pk, actor_id=actor_pk, kind=kind, object_id=obj.pk,
+                data=snapshot(obj), created_at=obj.created_at,
+            ))
+    TimelineEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+
+def _refresh(model, pk):
+    kinds = OBJECT_KINDS[model]
+    data = _snapshots({kinds[0]: {pk}}).get((kinds[0], pk))
+    if data is not None:
+        TimelineEntry.objects.filter(kind__in=kinds, object_id=pk).update(data=data)
+
+
+def trim(owner_pks, limit=None):
+    '''
+    owner 마다 최신 limit 개(기본 settings.FEED_MAX_ENTRIES)만 남기고 지운다. (owner 500 명당 쿼리 한 번)
+    '''
+    limit = settings.FEED_MAX_ENTRIES if limit is None else limit
+    owner_pks = list(owner_pks)
+    qn = connection.ops.quote_name
+    table = qn(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(owner_pks), 500):
+            chunk = owner_pks[start:start + 500]
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {qn("id")} IN ('
+                f'SELECT {qn("id")} FROM ('
+                f'SELECT {qn("id")}, ROW_NUMBER() OVER ('
+                f'PARTITION BY {qn("owner_id")} ORDER BY {qn("created_at")} DESC, {qn("id")} DESC'
+                f') AS {qn("position")} FROM {table} WHERE {qn("owner_id")} IN ({", ".join(["%s"] * len(chunk))})'
+                f') AS {qn("ranked")} WHERE {qn("position")} > %s)',
+                [*chunk, limit],
+            )
+
+
+def apply(events):
+    '''
+    이벤트를 순서대로 반영한다. 연달아 있는 'add' 는 모아서 한 번에 넣는다.
+        ('add', kind, object pk, actor pk, created_at)
+        ('remove', kind, object pk, actor pk)     좋아요 취소
+        ('delete', model, object pk)              대상 삭제
+        ('refresh', model, object pk)             대상 수정
+        ('follow', owner pk, actor pk)
+        ('unfollow', owner pk, actor pk)
+        ('clear', field, user pk)                 팔로우 전체 해제 (field: 'owner' 또는 'actor')
+    '''
+    touched = set()
+    pending = []
+    # 작업 실행기(BFS.tasks)가 이미 트랜잭션을 열어 두므로 savepoint 는 만들지 않는다
+    with transaction.atomic(savepoint=False):
+        for event in events:
+            if event[0] == 'add':
+                pending.append(event)
+                continue
+            if pending:
+                touched |= _add(pending)
+                pending = []
+
+            action, *args = event
+            if action == 'remove':
+                kind, object_id, actor_pk = args
+                TimelineEntry.objects.filter(kind=kind, object_id=object_id, actor_id=actor_pk).delete()
+            elif action == 'delete':
+                model, object_id = args
+                TimelineEntry.objects.filter(kind__in=OBJECT_KINDS[model], object_id=object_id).delete()
+            elif action == 'refresh':
+                _refresh(*args)
+            elif action == 'follow':
+                _backfill(*args)
+                touched.add(args[0])
+            elif action == 'unfollow':
+                owner_pk, actor_pk = args
+                TimelineEntry.objects.filter(owner_id=owner_pk, actor_id=actor_pk).delete()
+            elif action == 'clear':
+                field, user_pk = args
+                TimelineEntry.objects.filter(**{f'{field}_id': user_pk}).delete()
+        if pending:
+            touched |= _add(pending)
+        trim(touched)
+
+
+@task(ordered_by='lane')
+def fan_out(event, lane='feed'):
+    '''
+    BFS.tasks 에서 이벤트 하나를 반영한다. 모든 이벤트가 같은 lane 이므로 한 스레드에서 커밋된 순서대로 처리된다.
+    '''
+    apply([event])
+
+
+def dispatch(event):
+    '''
+    현재 트랜잭션이 커밋되면 이벤트를 작업 실행기(BFS.tasks)에 넣는다. settings.FEED_FANOUT 이 False 면 버린다.
+    '''
+    if settings.FEED_FANOUT:
+        transaction.on_commit(lambda: fan_out.delay(event))
+
+
+def rebuild():
+    '''
+    모든 타임라인을 팔로우 관계와 리뷰/컬렉션으로 처음부터 다시 만들고 행 수를 반환 (좋아요 항목은 복구되지 않는다)
+    '''
+    through, follower_field, followee_field = _follow_table()
+    pairs = through.objects.values_list(f'{follower_field}_id', f'{followee_field}_id')
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        owners = set()
+        for owner_pk, actor_pk in pairs.iterator():
+            if owner_pk != actor_pk:
+                _backfill(owner_pk, actor_pk)
+                owners.add(owner_pk)
+        trim(owners)
+    return TimelineEntry.objects.count()
@@ -0,0 +1,446 @@
+'''
+대량 가져오기 (manage.py import_data)
+
+TMDB 카탈로그, 과거 리뷰/좋아요 등의 덤프를 batch_size 행씩 읽어 bulk insert 한다.
+파일은 JSONL(.jsonl, .ndjson, .json: 한 줄에 객체 하나) 또는 CSV(첫 줄이 헤더), .gz 로 압축되어 있어도 된다.
+
+- 한 batch 가 한 트랜잭션이다. 커밋할 때마다 몇 행까지 처리했는지 checkpoint 파일에 적어 두므로,
+  중단된 뒤 같은 명령을 다시 실행하면 다음 행부터 이어서 읽는다. (끝까지 넣으면 checkpoint 는 지운다)
+- pk 가 이미 있는 행, 이미 있는 좋아요/컬렉션 영화는 건너뛴다. (ignore_conflicts)
+  그래서 checkpoint 를 적기 전에 멈춰 마지막 batch 를 다시 넣어도 중복되지 않는다.
+- 값이 잘못됐거나 참조하는 유저/영화/리뷰/컬렉션이 없는 행은 건너뛰고 개수만 센다.
+  리뷰에 movie_title 이 있으면 없는 영화는 그 제목으로 만든다.
+- created_at/updated_at 은 덤프의 값을 그대로 넣는다. (updated_at 이 없으면 created_at, 둘 다 없으면 지금)
+- bulk insert 는 post_save 를 보내지 않으므로 검색 색인, like_count, 응답 캐시는 batch 마다 직접 맞춘다.
+  이미 있던 행은 바꾸지 않으므로 색인도 새로 넣은 행만 한다.
+- 새로 넣은 리뷰와 영화 좋아요는 시청 기록, 장르 선호도(행의 genre_ids 또는 genre_list)에 반영한다. (추천에 쓰인다)
+  팔로워 타임라인에는 넣지 않는다. (필요하면 manage.py rebuild_timelines)
+'''
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from accounts.models import add_watched_movies
+from . import cache
+from . import search as search_index
+from .likes import reconcile_like_counts
+from .models import Bookmark, Collection, CollectionComment, Movie, Review, ReviewComment
+
+
+BATCH_SIZE = 2000
+
+# batch 에서 바뀐 객체가 이보다 많으면 키를 하나씩 지우지 않고 커밋 후 응답 캐시를 통째로 비운다
+INVALIDATE_LIMIT = 200
+
+
+class InvalidRow(Exception):
+    pass
+
+
+def read_records(path):
+    '''
+    파일의 행을 dict 로 하나씩 yield
+    '''
+    name = path[:-3] if path.endswith('.gz') else path
+    raw = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+    with io.TextIOWrapper(raw, encoding='utf-8', newline='') as file:
+        if name.endswith('.csv'):
+            yield from csv.DictReader(file)
+            return
+        for number, line in enumerate(file, start=1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as error:
+                    raise ValueError(f'{path}:{number}: {error}')
+
+
+def _get(row, names):
+    for name in names:
+        value = row.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def _convert(field, value):
+    '''
+    덤프의 값(CSV 는 모두 문자열)을 필드 값으로, 비어 있으면 기본값
+    '''
+    if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+        if value in (None, ''):
+            return timezone.now()
+    if value == '' and not field.empty_strings_allowed:
+        value = None
+    if value is None and field.blank and field.empty_strings_allowed:
+        return ''
+    if value is None:
+        if field.has_default():
+            return field.get_default()
+        if not field.null:
+            raise InvalidRow(f'{field.name} 없음')
+        return None
+    if isinstance(value, str) and isinstance(field, models.DateTimeField):
+        # parse_datetime(정규식)보다 훨씬 빠르다, 못 읽는 형식은 to_python 에 맡긴다
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    try:
+        value = field.to_python(value)
+    except ValidationError:
+        raise InvalidRow(f'{field.name}: {value!r}')
+    if getattr(value, 'tzinfo', 1) is None:
+        value = timezone.make_aware(value)
+    return value
+
+
+def _existing(model, pks):
+    return set(model.objects.filter(pk__in=set(pks)).values_list('pk', flat=True)) if pks else set()
+
+
+def _invalidate(model, pks):
+    '''
+    pks 가 들어가는 응답 캐시를 지운다. (movies.signals.invalidate_cache 와 같은 키, 쿼리 한 번)
+    '''
+    response_cache = cache.get_cache()
+    if response_cache is None or not pks:
+        return
+    if len(pks) > INVALIDATE_LIMIT:
+        transaction.on_commit(response_cache.clear)
+        return
+    if model is Movie:
+        keys = [key for pk in pks for key in cache.movie_keys(pk)]
+    elif model is Review:
+        rows = Review.objects.filter(pk__in=pks).values_list('pk', 'movie_id')
+        keys = [key for pk, movie_pk in rows for key in cache.review_keys(pk, movie_pk)]
+    elif model is ReviewComment:
+        rows = ReviewComment.objects.filter(pk__in=pks).values_list('review_id', 'review__movie_id').distinct()
+        keys = [key for pk, movie_pk in rows for key in cache.review_keys(pk, movie_pk)]
+    elif model is Collection:
+        keys = [key for pk in pks for key in cache.collection_keys(pk)]
+    else:
+        collection_pks = CollectionComment.objects.filter(pk__in=pks).values_list('collection_id', flat=True).distinct()
+        keys = [key for pk in collection_pks for key in cache.collection_keys(pk)]
+    cache.invalidate(keys)
+
+
+class Table:
+    '''
+    pk 가 있는 모델 한 종류
+    fields: {모델 attname: 덤프에서 읽을 key 들(앞의 것 우선)}
+    references: {attname: 참조하는 모델}, 없는 대상을 가리키는 행은 건너뛴다
+    defaults: 덤프에 없을 때 넣을 값
+    search_kind: 검색 색인 종류, invalidate: (캐시를 지울 모델, 그 pk 를 담은 attname)
+    '''
+    def __init__(self, model, fields, references=None, defaults=None, search_kind=None, invalidate=None):
+        self.model = model
+        self.fields = fields
+        self.references = references or {}
+        self.defaults = defaults or {}
+        self.search_kind = search_kind
+        self.invalidate = invalidate
+
+    def build(self, row):
+        values = {}
+        for attname, field, keys, default in self.columns:
+            value = _get(row, keys)
+            values[attname] = _convert(field, default if value is None else value)
+        return self.model(**values)
+
+    @cached_property
+    def columns(self):
+        return [
+            (attname, self.model._meta.get_field(attname), keys, self.defaults.get(attname))
+            for attname, keys in self.fields.items()
+        ]
+
+    @cached_property
+    def timestamps(self):
+        # auto_now / auto_now_add 필드는 bulk_create 가 지금 시각으로 덮어쓴다
+        return [
+            attname for attname, field, _, _ in self.columns
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        ]
+
+    def prepare(self, rows, objects):
+        '''
+        insert 전에 참조 대상을 만들거나 확인, 넣을 (행, 객체) 목록을 반환
+        '''
+        existing = {
+            attname: _existing(model, [getattr(obj, attname) for obj in objects])
+            for attname, model in self.references.items()
+        }
+        return [
+            (row, obj) for row, obj in zip(rows, objects)
+            if all(getattr(obj, attname) in pks for attname, pks in existing.items())
+        ]
+
+    def insert(self, pairs):
+        # pk 가 이미 있는 행(과 batch 안에서 겹치는 pk)은 bulk_create 가 건너뛰므로 색인, 후처리도 새 행만
+        existing = _existing(self.model, [obj.pk for _, obj in pairs])
+        new = {}
+        for row, obj in pairs:
+            if obj.pk not in existing:
+                new.setdefault(obj.pk, (row, obj))
+        pairs = list(new.values())
+        objects = [obj for _, obj in pairs]
+        stamps = [[getattr(obj, attname) for attname in self.timestamps] for obj in objects]
+        self.model.objects.bulk_create(objects, batch_size=1000, ignore_conflicts=True)
+        if self.timestamps:
+            # 덤프의 시각으로 되돌려 다시 쓴다 (bulk_update 는 pre_save 를 부르지 않는다)
+            for obj, values in zip(objects, stamps):
+                for attname, value in zip(self.timestamps, values):
+                    setattr(obj, attname, value)
+            self.model.objects.bulk_update(objects, self.timestamps, batch_size=1000)
+        if self.search_kind:
+            search_index.get_backend().index_many(self.search_kind, objects)
+        if self.invalidate:
+            model, attname = self.invalidate
+            _invalidate(model, list({getattr(obj, attname) for obj in objects}))
+        self.inserted(pairs)
+
+    def inserted(self, pairs):
+        '''
+        새로 넣은 (행, 객체) 의 후처리
+        '''
+
+    @property
+    def models(self):
+        return [self.model]
+
+
+def _genres(row):
+    # 덤프의 장르 id 목록 (TMDB 의 genre_ids, 요청과 같은 genre_list), JSON 배열 또는 쉼표로 구분한 문자열
+    value = _get(row, ('genre_ids', 'genre_list')) or []
+    if isinstance(value, str):
+        value = [genre.strip() for genre in value.split(',') if genre.strip()]
+    return value
+
+
+class ReviewTable(Table):
+    '''
+    새로 넣은 리뷰는 작성할 때(accounts.tasks.add_watched_movie)처럼 시청 기록과 장르 선호도에 반영한다.
+    '''
+
+    def prepare(self, rows, objects):
+        # 덤프에 제목이 있는 영화는 없으면 만든다
+        movies = {}
+        for row, obj in zip(rows, objects):
+            title = _get(row, ('movie_title', 'movie__title'))
+            if title:
+                movies.setdefault(obj.movie_id, Movie(pk=obj.movie_id, title=title, poster_path=row.get('poster_path') or ''))
+        created = Movie.objects.create_missing(list(movies.values()))
+        search_index.get_backend().index_many('movie', created)
+        return super().prepare(rows, objects)
+
+    def inserted(self, pairs):
+        add_watched_movies([(obj.user_id, obj.movie_id, _genres(row), obj.rating) for row, obj in pairs])
+
+
+class CollectionTable(Table):
+    '''
+    movies: 담긴 영화 pk 목록 (JSON 배열 또는 쉼표로 구분한 문자열), DB 에 없는 영화는 빠진다
+    '''
+    def inserted(self, pairs):
+        movies = {}
+        for row, obj in pairs:
+            value = row.get('movies') or []
+            if isinstance(value, str):
+                value = [pk for pk in value.split(',') if pk.strip()]
+            movies[obj.pk] = [int(pk) for pk in value]
+        existing = _existing(Movie, [pk for pks in movies.values() for pk in pks])
+        through = Collection.movies.through
+        through.objects.bulk_create([
+            through(collection_id=collection_pk, movie_id=movie_pk)
+            for collection_pk, pks in movies.items() for movie_pk in pks if movie_pk in existing
+        ], batch_size=1000, ignore_conflicts=True)
+
+
+class UserTable(Table):
+
+    def build(self, row):
+        user = super().build(row)
+        # 가져온 유저는 비밀번호로 로그인할 수 없다 (비밀번호 재설정 필요)
+        user.password = make_password(None)
+        return user
+
+
+class Likes:
+    '''
+    좋아요 (user_id, 대상 pk) 를 like_users through 테이블에 넣고 대상의 like_count 를 맞춘다.
+    대상 pk 는 object_id 또는 through 컬럼 이름(movie_id, review_id, ...)으로 받는다.
+    새로 넣은 영화 좋아요는 시청 기록과 장르 선호도(genre_ids)에도 반영한다. (accounts.tasks.add_watched_movie)
+    '''
+    def __init__(self, model):
+        self.model = model
+        field = model.like_users.field
+        self.through = field.remote_field.through
+        self.object_column = f'{field.m2m_field_name()}_id'
+        self.user_column = f'{field.m2m_reverse_field_name()}_id'
+
+    def build(self, row):
+        object_pk = _get(row, ('object_id', self.object_column, self.object_column[:-3]))
+        user_pk = _get(row, ('user_id', 'user'))
+        try:
+            return self.through(**{self.object_column: int(object_pk), self.user_column: int(user_pk)})
+        except (TypeError, ValueError):
+            raise InvalidRow(f'좋아요 대상/유저: {object_pk!r}, {user_pk!r}')
+
+    def prepare(self, rows, objects):
+        objects_existing = _existing(self.model, [getattr(obj, self.object_column) for obj in objects])
+        users_existing = _existing(get_user_model(), [getattr(obj, self.user_column) for obj in objects])
+        return [
+            (row, obj) for row, obj in zip(rows, objects)
+            if getattr(obj, self.object_column) in objects_existing and getattr(obj, self.user_column) in users_existing
+        ]
+
+    def insert(self, pairs):
+        # 이미 있는 좋아요(와 batch 안에서 겹치는 좋아요)를 빼고 새 좋아요만
+        new = {}
+        for row, obj in pairs:
+            new.setdefault((getattr(obj, self.object_column), getattr(obj, self.user_column)), (row, obj))
+        existing = set(self.through.objects.filter(**{
+            f'{self.object_column}__in': {pk for pk, _ in new},
+            f'{self.user_column}__in': {user_pk for _, user_pk in new},
+        }).values_list(self.object_column, self.user_column))
+        pairs = [pair for key, pair in new.items() if key not in existing]
+        if not pairs:
+            return
+        self.through.objects.bulk_create([obj for _, obj in pairs], batch_size=1000, ignore_conflicts=True)
+        pks = list({getattr(obj, self.object_column) for _, obj in pairs})
+        reconcile_like_counts(self.model, pks=pks)
+        _invalidate(self.model, pks)
+        if self.model is Movie:
+            add_watched_movies([(obj.user_id, obj.movie_id, _genres(row), False) for row, obj in pairs])
+
+    @property
+    def models(self):
+        return []
+
+
+def _table_fields(*names):
+    # attname -> (attname, _id 를 뺀 이름), pk 는 id 또는 pk, updated_at 이 없으면 created_at
+    fields = {}
+    for name in names:
+        if name == 'id':
+            fields[name] = ('id', 'pk')
+        elif name == 'updated_at':
+            fields[name] = ('updated_at', 'created_at')
+        elif name.endswith('_id'):
+            fields[name] = (name, name[:-3])
+        else:
+            fields[name] = (name,)
+    return fields
+
+
+def _kinds():
+    User = get_user_model()
+    return {
+        'user': UserTable(User, {**_table_fields('id', 'username', 'date_joined'), 'nickname': ('nickname', 'username')}),
+        'movie': Table(
+            # TMDB 일일 export 는 original_title 만 있고 포스터가 없다
+            Movie, {**_table_fields('id', 'poster_path'), 'title': ('title', 'original_title')},
+            defaults={'poster_path': ''}, search_kind='movie', invalidate=(Movie, 'pk'),
+        ),
+        'review': ReviewTable(
+            Review, _table_fields('id', 'user_id', 'movie_id', 'content', 'rating', 'created_at', 'updated_at'),
+            references={'user_id': User, 'movie_id': Movie}, search_kind='review', invalidate=(Review, 'pk'),
+        ),
+        'review_comment': Table(
+            ReviewComment, _table_fields('id', 'user_id', 'review_id', 'content', 'created_at', 'updated_at'),
+            references={'user_id': User, 'review_id': Review}, invalidate=(ReviewComment, 'pk'),
+        ),
+        'collection': CollectionTable(
+            Collection, _table_fields('id', 'user_id', 'title', 'content', 'created_at', 'updated_at'),
+            references={'user_id': User}, search_kind='collection', invalidate=(Collection, 'pk'),
+        ),
+        'collection_comment': Table(
+            CollectionComment, _table_fields('id', 'user_id', 'collection_id', 'content', 'created_at', 'updated_at'),
+            references={'user_id': User, 'collection_id': Collection}, invalidate=(CollectionComment, 'pk'),
+        ),
+        'bookmark': Table(
+            Bookmark, _table_fields('id', 'user_id', 'movie_id', 'content', 'created_at', 'updated_at'),
+            references={'user_id': User, 'movie_id': Movie}, invalidate=(Movie, 'movie_id'),
+        ),
+        'movie_like': Likes(Movie),
+        'review_like': Likes(Review),
+        'review_comment_like': Likes(ReviewComment),
+        'collection_like': Likes(Collection),
+        'collection_comment_like': Likes(CollectionComment),
+    }
+
+
+KINDS = _kinds()
+
+
+def import_batches(kind, records, batch_size=BATCH_SIZE):
+    '''
+    records 를 batch_size 행씩 batch 마다 한 트랜잭션으로 넣고, 커밋할 때마다 (읽은 행 수, 건너뛴 행 수) 를 yield
+    '''
+    spec = KINDS[kind]
+    records = iter(records)
+    while True:
+        rows = list(islice(records, batch_size))
+        if not rows:
+            break
+        valid_rows, objects = [], []
+        for row in rows:
+            try:
+                objects.append(spec.build(row))
+            except InvalidRow:
+                continue
+            valid_rows.append(row)
+        with transaction.atomic():
+            pairs = spec.prepare(valid_rows, objects)
+            if pairs:
+                spec.insert(pairs)
+        yield len(rows), len(rows) - len(pairs)
+
+
+def reset_sequences(kind):
+    '''
+    pk 를 직접 넣은 뒤 다음 자동 pk 가 겹치지 않도록 시퀀스를 맞춘다. (PostgreSQL, SQLite 는 필요 없음)
+    '''
+    statements = connection.ops.sequence_reset_sql(no_style(), KINDS[kind].models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+class Checkpoint:
+    '''
+    {"kind": 종류, "done": 커밋까지 끝난 행 수}, 원자적으로 바꿔 쓴다
+    '''
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, kind):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding='utf-8') as file:
+            data = json.load(file)
+        if data['kind'] != kind:
+            raise ValueError(f'{self.path} 는 {data["kind"]} 가져오기의 checkpoint 입니다.')
+        return data['done']
+
+    def save(self, kind, done):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as file:
+            json.dump({'kind': kind, 'done': done}, file)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
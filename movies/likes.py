@@ -0,0 +1,148 @@
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from .models import Movie, Review, ReviewComment, Collection, CollectionComment, liked_by
+
+
+# like_count 컬럼을 가진 모델
+LIKE_MODELS = (Movie, Review, ReviewComment, Collection, CollectionComment)
+
+# through 테이블에 직접 쓰므로 m2m_changed 대신 보내는 signal (sender=model, pk=좋아요 대상 pk, user, liked=눌렀는지/취소했는지)
+like_changed = Signal()
+
+
+def _through(model):
+    field = model.like_users.field
+    return field.remote_field.through, field.m2m_field_name(), field.m2m_reverse_field_name()
+
+
+def _columns(model):
+    through, object_field, user_field = _through(model)
+    quote = connection.ops.quote_name
+    return (
+        quote(through._meta.db_table),
+        quote(through._meta.get_field(object_field).column),
+        quote(through._meta.get_field(user_field).column),
+    )
+
+
+def _can_return():
+    # UPDATE ... RETURNING 은 SQLite 3.35 부터 지원한다
+    return connection.vendor != 'sqlite' or connection.Database.sqlite_version_info >= (3, 35)
+
+
+def _apply(cursor, model, pk, user, delta):
+    '''
+    like_count 에 delta 를 더하고 새 값을 반환, 대상이 없으면 model.DoesNotExist
+    '''
+    table, pk_column = connection.ops.quote_name(model._meta.db_table), connection.ops.quote_name(model._meta.pk.column)
+    if delta and _can_return():
+        cursor.execute(
+            f'UPDATE {table} SET like_count = like_count + %s WHERE {pk_column} = %s RETURNING like_count',
+            [delta, pk],
+        )
+    else:
+        if delta:
+            # 트랜잭션 안이므로 UPDATE 가 잡은 잠금이 SELECT 까지 유지된다
+            cursor.execute(f'UPDATE {table} SET like_count = like_count + %s WHERE {pk_column} = %s', [delta, pk])
+        cursor.execute(f'SELECT like_count FROM {table} WHERE {pk_column} = %s', [pk])
+    row = cursor.fetchone()
+    if row is None:
+        raise model.DoesNotExist(f'{model.__name__} {pk} 이(가) 없습니다.')
+    if delta:
+        like_changed.send(sender=model, pk=pk, user=user, liked=delta > 0)
+    return row[0]
+
+
+def _insert(cursor, model, pk, user):
+    table, object_column, user_column = _columns(model)
+    # unique (object, user) 제약에 걸리면 아무것도 하지 않는다
+    cursor.execute(
+        f'INSERT INTO {table} ({object_column}, {user_column}) VALUES (%s, %s) ON CONFLICT DO NOTHING',
+        [pk, user.pk],
+    )
+    return cursor.rowcount
+
+
+def _delete(cursor, model, pk, user):
+    table, object_column, user_column = _columns(model)
+    cursor.execute(f'DELETE FROM {table} WHERE {object_column} = %s AND {user_column} = %s', [pk, user.pk])
+    return cursor.rowcount
+
+
+def add_like(model, pk, user):
+    '''
+    좋아요를 누른 상태로 만들고 (새로 눌렀는지, 좋아요 수) 를 반환
+    여러 번 호출해도 결과가 같고, 쿼리는 INSERT 와 UPDATE ... RETURNING (이미 눌렀으면 SELECT) 두 번 (SQLite 3.35 미만은 UPDATE 뒤 SELECT 까지 세 번)
+    '''
+    with transaction.atomic(), connection.cursor() as cursor:
+        inserted = _insert(cursor, model, pk, user)
+        return inserted == 1, _apply(cursor, model, pk, user, inserted)
+
+
+def remove_like(model, pk, user):
+    '''
+    좋아요를 취소한 상태로 만들고 (새로 취소했는지, 좋아요 수) 를 반환
+    '''
+    with transaction.atomic(), connection.cursor() as cursor:
+        deleted = _delete(cursor, model, pk, user)
+        return deleted > 0, _apply(cursor, model, pk, user, -deleted)
+
+
+def toggle_like(model, pk, user):
+    '''
+    좋아요 상태를 뒤집고 (상태가 바뀌었는지, 좋아요 여부, 좋아요 수) 를 반환
+    '''
+    with transaction.atomic(), connection.cursor() as cursor:
+        deleted = _delete(cursor, model, pk, user)
+        if deleted:
+            return True, False, _apply(cursor, model, pk, user, -deleted)
+        inserted = _insert(cursor, model, pk, user)
+        # 삭제와 INSERT 사이에 동시 요청이 먼저 눌렀으면 INSERT 가 충돌한다, 행은 있으므로 좋아요 상태
+        return inserted == 1, True, _apply(cursor, model, pk, user, inserted)
+
+
+def liked_pks(model, pks, user):
+    '''
+    pks 중 user 가 좋아요를 누른 pk 집합 (쿼리 한 번)
+    '''
+    if not pks or not user.is_authenticated:
+        return set()
+    through, object_field, user_field = _through(model)
+    return set(
+        through.objects.filter(**{f'{object_field}__in': pks, user_field: user.pk})
+        .values_list(f'{object_field}_id', flat=True)
+    )
+
+
+def like_states(model, pks, user):
+    '''
+    [(pk, 좋아요 여부, 좋아요 수), ...] 쿼리 한 번, 없는 pk 는 빠진다
+    '''
+    return list(
+        model.objects.filter(pk__in=pks).order_by('pk')
+        .annotate(liked=liked_by(model, user))
+        .values_list('pk', 'liked', 'like_count')
+    )
+
+
+def reconcile_like_counts(model, dry_run=False, pks=None):
+    '''
+    like_count 를 실제 like_users 행 개수로 맞추고, 어긋나 있던 행의 수를 반환 (pks 를 주면 그 행만)
+    '''
+    through, object_field, _ = _through(model)
+    actual = Coalesce(Subquery(
+        through.objects.filter(**{object_field: OuterRef('pk')})
+        .order_by()
+        .values(object_field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+    drifted = model.objects.annotate(actual=actual).exclude(like_count=F('actual'))
+    if pks is not None:
+        drifted = drifted.filter(pk__in=pks)
+    if dry_run:
+        return drifted.count()
+    with transaction.atomic():
+        return model.objects.filter(pk__in=drifted.values('pk')).update(like_count=actual)
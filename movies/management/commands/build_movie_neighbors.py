@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from movies import similarity
+
+
+class Command(BaseCommand):
+    help = (
+        '좋아요, 리뷰 평점, 컬렉션 담기로 영화-영화 유사도를 계산해 영화마다 상위 K 개 이웃을 저장합니다. '
+        '--incremental 이면 지난 실행 이후 활동이 생긴 영화와 그 이웃만, 관련된 활동만 읽어 다시 계산합니다.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=similarity.DEFAULT_TOP_K)
+        parser.add_argument('--chunk-size', type=int, default=similarity.CHUNK_SIZE, help='한 번에 읽을 행 수')
+        parser.add_argument('--batch-size', type=int, default=similarity.BATCH_SIZE, help='한 번에 계산할 영화 수')
+        parser.add_argument('--incremental', action='store_true')
+
+    def handle(self, *args, **options):
+        build = similarity.refresh if options['incremental'] else similarity.rebuild
+        count = build(
+            top_k=options['top_k'],
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            )
+        self.stdout.write(f'{count} neighbors saved')
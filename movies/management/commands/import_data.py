@@ -0,0 +1,49 @@
+import time
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from movies.importer import BATCH_SIZE, KINDS, Checkpoint, import_batches, read_records, reset_sequences
+
+
+class Command(BaseCommand):
+    help = (
+        '영화, 유저 활동 덤프(JSONL/CSV)를 batch 단위로 대량으로 넣습니다. 중단되면 같은 명령으로 이어서 넣습니다. '
+        '새 리뷰와 영화 좋아요는 시청 기록, 장르 선호도(genre_ids 컬럼)에도 반영합니다. 팔로워 타임라인은 rebuild_timelines 로 만드세요.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(KINDS), help='넣을 종류')
+        parser.add_argument('path', help='.jsonl/.ndjson/.json 또는 .csv 파일 (.gz 가능)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='한 트랜잭션에 넣을 행 수')
+        parser.add_argument('--checkpoint', help='진행 상황 파일, 생략하면 <path>.checkpoint')
+        parser.add_argument('--restart', action='store_true', help='checkpoint 를 무시하고 처음부터 넣습니다.')
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        checkpoint = Checkpoint(options['checkpoint'] or f'{path}.checkpoint')
+        if options['restart']:
+            checkpoint.clear()
+        try:
+            done = checkpoint.load(kind)
+        except ValueError as error:
+            raise CommandError(error)
+        if done:
+            self.stdout.write(f'{checkpoint.path}: {done} 행 다음부터 이어서 넣습니다.')
+
+        records = islice(read_records(path), done, None)
+        read = skipped = 0
+        start = time.perf_counter()
+        try:
+            for batch_read, batch_skipped in import_batches(kind, records, batch_size=options['batch_size']):
+                read += batch_read
+                skipped += batch_skipped
+                checkpoint.save(kind, done + read)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{done + read} rows  {read / elapsed:.0f} rows/s  skipped {skipped}')
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        reset_sequences(kind)
+        checkpoint.clear()
+
+        self.stdout.write(f'{kind}: {read} rows, {skipped} skipped')
+        if kind in ('review', 'collection'):
+            self.stdout.write('팔로워 타임라인에 넣으려면 manage.py rebuild_timelines 를 실행하세요.')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from movies.search import get_backend
+
+
+class Command(BaseCommand):
+    help = '검색 색인을 DB 의 리뷰, 컬렉션, 영화로 처음부터 다시 만듭니다. (loaddata 이후 등)'
+
+    def handle(self, *args, **options):
+        indexed = get_backend().rebuild()
+        self.stdout.write(f'indexed: {indexed}')
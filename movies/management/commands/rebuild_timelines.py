@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from movies.feed import rebuild
+
+
+class Command(BaseCommand):
+    help = '팔로워 타임라인을 팔로우 관계와 리뷰, 컬렉션으로 처음부터 다시 만듭니다. (loaddata 이후, fan-out 이벤트 유실 시)'
+
+    def handle(self, *args, **options):
+        entries = rebuild()
+        self.stdout.write(f'entries: {entries}')
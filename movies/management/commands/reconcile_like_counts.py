@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from movies.likes import LIKE_MODELS, reconcile_like_counts
+
+
+class Command(BaseCommand):
+    help = 'like_count 컬럼을 실제 좋아요(like_users) 행 개수와 맞춥니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='수정하지 않고 어긋난 행의 수만 출력합니다.',
+        )
+
+    def handle(self, *args, **options):
+        for model in LIKE_MODELS:
+            drifted = reconcile_like_counts(model, dry_run=options['dry_run'])
+            self.stdout.write(f'{model.__name__}: {drifted}')
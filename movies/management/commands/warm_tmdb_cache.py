@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from movies import tmdb
+from movies.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'TMDB movie info 캐시를 미리 채웁니다. (이미 신선한 항목은 건너뜀)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('movie_pks', nargs='*', type=int, help='영화 id, 생략하면 DB 의 모든 영화')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8, help='동시에 보낼 TMDB 요청 수')
+
+    def handle(self, *args, **options):
+        movie_pks = options['movie_pks'] or list(Movie.objects.values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(movie_pks), batch_size):
+            batch = movie_pks[start:start + batch_size]
+            tmdb.movie_infos(batch, workers=options['workers'])
+            self.stdout.write(f'{min(start + batch_size, len(movie_pks))}/{len(movie_pks)}')
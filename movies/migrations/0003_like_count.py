@@ -0,0 +1,56 @@
+# Generated by Django 3.2.9 on 2026-10-18 20:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_like_count(apps, schema_editor):
+    for model_name in ('Movie', 'Review', 'ReviewComment', 'Collection', 'CollectionComment'):
+        model = apps.get_model('movies', model_name)
+        field = model._meta.get_field('like_users')
+        object_field = field.m2m_field_name()
+        counts = (
+            field.remote_field.through.objects.filter(**{object_field: OuterRef('pk')})
+            .order_by()
+            .values(object_field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        model.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='collectioncomment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reviewcomment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_like_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.9 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_like_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TmdbMovieInfo',
+            fields=[
+                ('movie_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+                ('fetched_at', models.DateTimeField()),
+                ('accessed_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
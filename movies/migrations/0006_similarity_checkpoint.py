@@ -0,0 +1,23 @@
+# Generated by Django 3.2.9 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_movie_neighbor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_like_id', models.BigIntegerField(default=0)),
+                ('last_collection_movie_id', models.BigIntegerField(default=0)),
+                ('last_review_updated_at', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.9 on 2026-10-18 21:40
+
+from django.db import migrations
+
+
+# movies.search.SQLiteFTS5Backend 의 색인 테이블, rowid = pk * 3 + (review 0, collection 1, movie 2)
+SOURCES = (
+    (0, 'review', 'movies_review', "''", 'content'),
+    (1, 'collection', 'movies_collection', 'title', 'content'),
+    (2, 'movie', 'movies_movie', 'title', "''"),
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE VIRTUAL TABLE movies_search_index USING fts5('
+            "kind UNINDEXED, title, content, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        for code, kind, table, title, content in SOURCES:
+            cursor.execute(
+                'INSERT INTO movies_search_index (rowid, kind, title, content) '
+                f'SELECT id * 3 + %s, %s, {title}, {content} FROM {table}',
+                [code, kind],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS movies_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_similarity_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.9 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='collectioncomment',
+            index=models.Index(fields=['collection', '-created_at', '-id'], name='movies_collection_comment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewcomment',
+            index=models.Index(fields=['review', '-created_at', '-id'], name='movies_review_comment_idx'),
+        ),
+    ]
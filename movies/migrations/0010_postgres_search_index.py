@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+# movies.search.PostgresSearchBackend 의 색인 테이블, rowid 는 0007 (SQLite FTS5) 과 같다
+SOURCES = (
+    (0, 'review', 'movies_review', "''", 'content'),
+    (1, 'collection', 'movies_collection', 'title', 'content'),
+    (2, 'movie', 'movies_movie', 'title', "''"),
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE movies_search_index ('
+            'rowid bigint PRIMARY KEY, kind varchar(20) NOT NULL, document tsvector NOT NULL)'
+        )
+        for code, kind, table, title, content in SOURCES:
+            cursor.execute(
+                'INSERT INTO movies_search_index (rowid, kind, document) '
+                f"SELECT id * 3 + %s, %s, to_tsvector('simple', {title} || ' ' || {content}) FROM {table}",
+                [code, kind],
+            )
+        cursor.execute('CREATE INDEX movies_search_index_document ON movies_search_index USING gin (document)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS movies_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,12 +1,74 @@
-from django.db import models
+from django.db import connection, models
+from django.db.models import BooleanField, Count, Exists, OuterRef, Q, Value
+from django.db.models.expressions import RawSQL
 from django.conf import settings
 
 
+def liked_by(model, user):
+    '''
+    user 가 좋아요를 눌렀는지 나타내는 Exists, (object, user) unique 인덱스로 조회된다
+    '''
+    field = model.like_users.field
+    return Exists(field.remote_field.through.objects.filter(**{
+        field.m2m_field_name(): OuterRef('pk'),
+        field.m2m_reverse_field_name(): user.pk,
+    }))
+
+
+class LikeQuerySet(models.QuerySet):
+
+    def with_like_state(self, user=None, full=False):
+        '''
+        liked_by_me 를 annotate 하고, full 이면 like_users 전체를 미리 불러온다. (serializers.LikeStateMixin)
+        '''
+        if user is not None and user.is_authenticated:
+            queryset = self.annotate(liked_by_me=liked_by(self.model, user))
+        else:
+            # 유저가 없으면(캐시에 넣을 공용 결과 포함) 조회하지 않고 False
+            queryset = self.annotate(liked_by_me=Value(False, output_field=BooleanField()))
+        if full:
+            queryset = queryset.prefetch_related('like_users')
+        return queryset
+
+
+class MovieQuerySet(LikeQuerySet):
+
+    def for_list(self):
+        return self.annotate(num_bookmarks=Count('bookmark'))
+
+    def create_missing(self, movies):
+        '''
+        movies 중 DB 에 없는 영화만 한 번에 추가하고 새로 추가한 영화 목록을 반환 (이미 있는 영화는 그대로 둔다)
+        '''
+        existing = set(self.filter(pk__in=[movie.pk for movie in movies]).values_list('pk', flat=True))
+        created = [movie for movie in movies if movie.pk not in existing]
+        # 그 사이 다른 요청이 추가한 영화는 건너뛴다
+        self.bulk_create(created, ignore_conflicts=True)
+        return created
+
+
 class Movie(models.Model):
     id = models.BigAutoField(primary_key=True)
     title = models.CharField(max_length=500)
     poster_path = models.CharField(max_length=500)
     like_users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='like_movies')
+    # like_users 의 개수, movies.likes 에서 좋아요를 누르거나 취소할 때 함께 갱신
+    like_count = models.PositiveIntegerField(default=0)
+
+    objects = MovieQuerySet.as_manager()
+
+
+class ReviewQuerySet(LikeQuerySet):
+
+    def with_counts(self):
+        return self.annotate(num_comments=Count('reviewcomment'))
+
+    def for_list(self):
+        '''
+        ReviewListSerializer 로 직렬화할 때 리뷰 개수와 상관없이 쿼리 수가 일정하도록
+        댓글 수는 annotate 하고, 작성자는 join 한다. (리뷰별 최신 댓글은 attach_newest_comments)
+        '''
+        return self.with_counts().select_related('user')
 
 
 class Review(models.Model):
@@ -17,6 +79,58 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     like_users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='like_reviews')
+    like_count = models.PositiveIntegerField(default=0)
+
+    objects = ReviewQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='movies_review_feed_idx'),
+        ]
+
+
+# 리뷰/컬렉션 상세와 목록에 함께 내보내는 최신 댓글 수, 나머지는 댓글 목록 API 에서 cursor 로 받는다
+COMMENT_PREVIEW_SIZE = 3
+# newest() 의 UNION ALL 하나에 묶을 대상 수 (SQLite 의 compound SELECT 개수 제한 500)
+NEWEST_UNION_SIZE = 200
+
+
+class CommentQuerySet(LikeQuerySet):
+    # 댓글이 달리는 대상(리뷰, 컬렉션)의 FK 이름
+    parent_field = None
+
+    def for_list(self):
+        return self.select_related('user')
+
+    def newest_first(self):
+        return self.order_by('-created_at', '-pk')
+
+    def newest(self, parent_pks, count=COMMENT_PREVIEW_SIZE):
+        '''
+        parent_pks 의 대상마다 최신 댓글 count 개만 남긴다.
+        대상마다 (대상, created_at, id) 인덱스를 거꾸로 count 행만 읽는 ORDER BY ... LIMIT 쿼리를 UNION ALL 로 묶은
+        id 목록으로 거르므로, 읽는 행 수가 대상 수 x count 로 일정하다.
+        '''
+        parent_pks = list(parent_pks)
+        if not parent_pks:
+            return self.none()
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        column = qn(f'{self.parent_field}_id')
+        condition = Q()
+        for start in range(0, len(parent_pks), NEWEST_UNION_SIZE):
+            chunk = parent_pks[start:start + NEWEST_UNION_SIZE]
+            sql = ' UNION ALL '.join(
+                f'SELECT {qn("id")} FROM (SELECT {qn("id")} FROM {table} WHERE {column} = %s '
+                f'ORDER BY {qn("created_at")} DESC, {qn("id")} DESC LIMIT {int(count)}) AS {qn(f"newest_{i}")}'
+                for i in range(len(chunk))
+            )
+            condition |= Q(pk__in=RawSQL(sql, chunk))
+        return self.filter(condition).newest_first()
+
+
+class ReviewCommentQuerySet(CommentQuerySet):
+    parent_field = 'review'
 
 
 class ReviewComment(models.Model):
@@ -26,6 +140,23 @@ class ReviewComment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     like_users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='like_review_comments')
+    like_count = models.PositiveIntegerField(default=0)
+
+    objects = ReviewCommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['review', '-created_at', '-id'], name='movies_review_comment_idx'),
+        ]
+
+
+class CollectionQuerySet(LikeQuerySet):
+
+    def with_counts(self):
+        return self.annotate(num_comments=Count('collectioncomment'))
+
+    def for_list(self):
+        return self.with_counts().select_related('user').prefetch_related('movies')
 
 
 class Collection(models.Model):
@@ -36,8 +167,35 @@ class Collection(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     like_users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='like_collections')
+    like_count = models.PositiveIntegerField(default=0)
     cover_image = models.ImageField()
 
+    objects = CollectionQuerySet.as_manager()
+
+    def set_movies(self, movie_pks):
+        '''
+        담긴 영화를 movie_pks 로 맞춘다. 빠진 영화는 한 번에 지우고 새로 담긴 영화만 순서대로 한 번에 추가
+        '''
+        through = Collection.movies.through
+        current = set(through.objects.filter(collection=self).values_list('movie_id', flat=True))
+        movie_pks = list(dict.fromkeys(movie_pks))
+        removed = current.difference(movie_pks)
+        if removed:
+            through.objects.filter(collection=self, movie_id__in=removed).delete()
+        through.objects.bulk_create(
+            [through(collection=self, movie_id=movie_pk) for movie_pk in movie_pks if movie_pk not in current],
+            ignore_conflicts=True,
+        )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='movies_collection_feed_idx'),
+        ]
+
+
+class CollectionCommentQuerySet(CommentQuerySet):
+    parent_field = 'collection'
+
 
 class CollectionComment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -46,6 +204,36 @@ class CollectionComment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     like_users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='like_collection_comments')
+    like_count = models.PositiveIntegerField(default=0)
+
+    objects = CollectionCommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['collection', '-created_at', '-id'], name='movies_collection_comment_idx'),
+        ]
+
+
+# 댓글이 달리는 모델 -> 댓글 모델
+COMMENT_MODELS = {Review: ReviewComment, Collection: CollectionComment}
+
+
+def attach_newest_comments(parents, comments=None, count=COMMENT_PREVIEW_SIZE):
+    '''
+    parents(리뷰 또는 컬렉션 목록)마다 최신 댓글 count 개를 newest_comments 에 넣는다. (CommentQuerySet.newest() 쿼리 한 번)
+    comments: 댓글 queryset (기본 for_list(), liked_by_me 등을 annotate 할 때 넘긴다)
+    '''
+    parents = list(parents)
+    if not parents:
+        return parents
+    if comments is None:
+        comments = COMMENT_MODELS[type(parents[0])].objects.for_list()
+    grouped = {parent.pk: [] for parent in parents}
+    for comment in comments.newest(grouped, count):
+        grouped[getattr(comment, f'{comments.parent_field}_id')].append(comment)
+    for parent in parents:
+        parent.newest_comments = grouped[parent.pk]
+    return parents
 
 
 class Bookmark(models.Model):
@@ -54,3 +242,67 @@ class Bookmark(models.Model):
     content = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+
+class TmdbMovieInfo(models.Model):
+    '''
+    TMDB movie info 응답 캐시 (movies.tmdb 참고)
+    '''
+    movie_id = models.BigIntegerField(primary_key=True)
+    data = models.JSONField()
+    fetched_at = models.DateTimeField()
+    accessed_at = models.DateTimeField(db_index=True)
+
+
+class MovieNeighbor(models.Model):
+    '''
+    미리 계산해 둔 영화별 유사 영화 top-K (movies.recommend 참고)
+    '''
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['movie', 'neighbor'], name='unique_movie_neighbor'),
+        ]
+
+
+class SimilarityCheckpoint(models.Model):
+    '''
+    movies.similarity 가 마지막으로 반영한 활동 위치 (high-water mark), 한 행만 사용
+    '''
+    last_like_id = models.BigIntegerField(default=0)
+    last_collection_movie_id = models.BigIntegerField(default=0)
+    last_review_updated_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class TimelineEntry(models.Model):
+    '''
+    팔로우한 유저(User.like_users)의 활동을 팔로워마다 미리 복사해 둔 홈 피드 (movies.feed 참고)
+    '''
+    KIND_CHOICES = (
+        ('review', '리뷰 작성'),
+        ('collection', '컬렉션 작성'),
+        ('like_movie', '영화 좋아요'),
+        ('like_review', '리뷰 좋아요'),
+        ('like_collection', '컬렉션 좋아요'),
+    )
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # 피드에 보여줄 대상의 요약, 대상이 수정되면 movies.feed 가 갱신한다
+    data = models.JSONField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'kind', 'object_id', 'actor'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-id'], name='movies_timeline_feed_idx'),
+            models.Index(fields=['kind', 'object_id'], name='movies_timeline_object_idx'),
+        ]
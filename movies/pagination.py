@@ -0,0 +1,142 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    '''
+    (ordering_field, pk) 기준 keyset(cursor) 페이지네이션, 최신 항목부터 반환
+
+    OFFSET 없이 마지막으로 본 행의 위치부터 이어서 읽기 때문에 몇 번째 페이지든 비용이 같고,
+    중간에 새 글이 추가되어도 이미 받은 항목이 밀려서 중복되거나 빠지지 않는다.
+    '''
+    ordering_field = 'created_at'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    invalid_cursor_message = '잘못된 cursor 입니다.'
+
+    def __init__(self, ordering_field=None, base_url=None):
+        if ordering_field is not None:
+            self.ordering_field = ordering_field
+        # 다른 응답 안에 페이지를 끼워 넣을 때 next/previous 링크가 가리킬 주소
+        self.base_url = base_url
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        opts = queryset.model._meta
+        self.field = opts.pk if self.ordering_field == 'pk' else opts.get_field(self.ordering_field)
+        cursor = self.decode_cursor(request)
+        name = self.ordering_field
+
+        if cursor is None:
+            self.reverse = False
+            page = list(queryset.order_by(f'-{name}', '-pk')[:self.page_size + 1])
+        else:
+            self.reverse, value, pk = cursor
+            if self.reverse:
+                queryset = queryset.filter(
+                    Q(**{f'{name}__gt': value}) | Q(**{name: value, 'pk__gt': pk})
+                ).order_by(name, 'pk')
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{name}__lt': value}) | Q(**{name: value, 'pk__lt': pk})
+                ).order_by(f'-{name}', '-pk')
+            page = list(queryset[:self.page_size + 1])
+
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.reverse:
+            page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = page
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, value, pk = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            value = self.field.to_python(value)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if direction not in ('n', 'p') or value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return direction == 'p', value, pk
+
+    def encode_cursor(self, instance, reverse):
+        if isinstance(instance, dict):
+            # movies.rows 의 values() 행
+            value, pk = instance[self.ordering_field], instance['pk']
+            value = str(value) if self.ordering_field == 'pk' else value.isoformat()
+        else:
+            value, pk = self.field.value_to_string(instance), instance.pk
+        raw = '|'.join(('p' if reverse else 'n', value, str(pk)))
+        url = self.get_base_url()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, urlsafe_b64encode(raw.encode('ascii')).decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.get_base_url(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_base_url(self):
+        if self.base_url is not None:
+            return self.request.build_absolute_uri(self.base_url)
+        return self.request.build_absolute_uri()
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+def paginate_data(request, queryset, serializer_class, ordering_field=None, base_url=None):
+    '''
+    serializer_class 는 DRF serializer 또는 movies.rows 의 Rows (values() 로 읽어 바로 dict 로 만든다)
+    '''
+    paginator = KeysetPagination(ordering_field=ordering_field, base_url=base_url)
+    if hasattr(serializer_class, 'values'):
+        queryset = serializer_class.values(queryset)
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, context={'request': request})
+    return paginator.get_paginated_data(serializer.data)
+
+
+def paginate(request, queryset, serializer_class, ordering_field=None):
+    return Response(paginate_data(request, queryset, serializer_class, ordering_field=ordering_field))
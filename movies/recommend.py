@@ -0,0 +1,61 @@
+'''
+영화 추천
+
+유저가 좋아요/시청한 영화의 이웃 점수(movies.similarity 가 미리 계산한 MovieNeighbor)와
+장르 선호도 점수를 합쳐 순위를 매긴다. 요청마다 하는 일은 조회와 numpy 집계뿐이다.
+'''
+import numpy as np
+from .models import Movie, MovieNeighbor, TmdbMovieInfo
+
+
+# 최종 점수 = 이웃 점수 + GENRE_WEIGHT * 장르 점수 (둘 다 0~1 로 정규화)
+GENRE_WEIGHT = 0.3
+
+
+def _normalize(values):
+    top = values.max() if len(values) else 0
+    return values / top if top > 0 else values
+
+
+def genre_scores(movie_ids, genre_preference):
+    '''
+    TMDB 캐시의 장르 정보로 각 영화의 장르 선호도 점수 합을 계산 (장르 정보가 없으면 0)
+    장르는 TMDB 장르 id 와 이름 어느 쪽으로 저장되어 있어도 매칭한다.
+    '''
+    scores = np.zeros(len(movie_ids))
+    if not genre_preference:
+        return scores
+    position = {movie_id: i for i, movie_id in enumerate(movie_ids.tolist())}
+    infos = TmdbMovieInfo.objects.filter(movie_id__in=list(position)).values_list('movie_id', 'data')
+    for movie_id, data in infos:
+        for genre in data.get('genres') or ():
+            score = genre_preference.get(str(genre.get('id')), genre_preference.get(genre.get('name'), 0))
+            scores[position[movie_id]] += score
+    return scores
+
+
+def recommend(user, limit=20):
+    '''
+    [(movie_pk, score), ...] 점수 내림차순, 이미 좋아요/시청한 영화는 제외
+    '''
+    liked = set(Movie.like_users.through.objects.filter(user_id=user.pk).values_list('movie_id', flat=True))
+    watched = set(map(int, user.watched_movies_dict))
+    seeds = liked | watched
+    if not seeds:
+        return []
+
+    neighbors = np.array(
+        MovieNeighbor.objects.filter(movie_id__in=seeds).values_list('neighbor_id', 'score'),
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    candidates = neighbors[~np.isin(neighbors[:, 0], list(seeds))]
+    if not len(candidates):
+        return []
+
+    movie_ids, index = np.unique(candidates[:, 0].astype(np.int64), return_inverse=True)
+    neighbor_scores = np.bincount(index, weights=candidates[:, 1])
+    positive_genre_scores = np.clip(genre_scores(movie_ids, user.genre_preference), 0, None)
+    scores = _normalize(neighbor_scores) + GENRE_WEIGHT * _normalize(positive_genre_scores)
+
+    order = np.argsort(-scores, kind='stable')[:limit]
+    return [(int(movie_ids[i]), round(float(scores[i]), 4)) for i in order]
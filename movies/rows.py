@@ -0,0 +1,210 @@
+'''
+목록 응답용 읽기 전용 빠른 직렬화
+
+DRF ModelSerializer 는 행마다 모델 인스턴스를 만들고 필드를 하나씩 거치므로 큰 목록에서 CPU 를 많이 쓴다.
+여기 클래스들은 같은 이름의 serializer 와 똑같은 key/값을 .values() 로 읽은 행에서 바로 dict 로 만든다.
+
+    rows = ReviewListRows.values(Review.objects.for_list())   # 페이지네이션/슬라이스 전에
+    ReviewListRows(rows, many=True).data
+
+movies.pagination.paginate_data 에 serializer 대신 넘기면 values() 를 알아서 적용한다.
+like_users 를 내보내는 ?like_users=full 은 for_request() 로 원래 serializer 를 쓴다.
+liked_by_me 가 있는 클래스는 queryset 에 with_like_state() 가 annotate 되어 있어야 한다.
+'''
+from collections import defaultdict
+from django.utils import timezone
+from BFS.metrics import timed_serializer
+from .models import Collection, ReviewComment
+from .serializers import (
+    BookmarkSerializer, CollectionCommentSerializer, CollectionListSerializer, MovieSerializer, ReviewCommentSerializer,
+    ReviewListSerializer, full_like_users,
+)
+
+
+def _datetime(value, tz):
+    # DRF DateTimeField 의 기본(ISO 8601) 표현과 같다
+    if value is None:
+        return None
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _user(row):
+    return {'pk': row['user_id'], 'username': row['user__username'], 'nickname': row['user__nickname']}
+
+
+USER_FIELDS = ('user_id', 'user__username', 'user__nickname')
+
+
+class Rows:
+    # values() 로 읽을 필드, 같은 모양의 DRF serializer
+    fields = ()
+    serializer_class = None
+
+    def __init__(self, instance, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @classmethod
+    def values(cls, queryset):
+        # values() 행에는 prefetch 를 붙일 수 없으므로 지운다 (필요한 관계는 to_representation 에서 한 번에 읽는다)
+        return queryset.prefetch_related(None).values(*cls.fields)
+
+    @classmethod
+    def for_request(cls, request):
+        '''
+        ?like_users=full 이면 like_users 를 채우는 원래 serializer, 아니면 이 클래스
+        '''
+        return cls.serializer_class if full_like_users(request) else cls
+
+    @property
+    @timed_serializer
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        data = self.to_representation(rows, timezone.get_current_timezone())
+        return data if self.many else data[0]
+
+    def to_representation(self, rows, tz):
+        raise NotImplementedError
+
+
+class MovieRows(Rows):
+    fields = ('pk', 'title', 'poster_path', 'like_count', 'liked_by_me', 'num_bookmarks')
+    serializer_class = MovieSerializer
+
+    def to_representation(self, rows, tz):
+        return [
+            {
+                'pk': row['pk'],
+                'title': row['title'],
+                'poster_path': row['poster_path'],
+                'like_count': row['like_count'],
+                'liked_by_me': bool(row['liked_by_me']),
+                'bookmark_count': row['num_bookmarks'],
+            }
+            for row in rows
+        ]
+
+
+class ReviewCommentRows(Rows):
+    fields = ('pk', *USER_FIELDS, 'review_id', 'content', 'like_count', 'created_at', 'updated_at')
+    serializer_class = ReviewCommentSerializer
+
+    def to_representation(self, rows, tz):
+        return [
+            {
+                'pk': row['pk'],
+                'user': _user(row),
+                'review': row['review_id'],
+                'content': row['content'],
+                'like_count': row['like_count'],
+                'created_at': _datetime(row['created_at'], tz),
+                'updated_at': _datetime(row['updated_at'], tz),
+            }
+            for row in rows
+        ]
+
+
+class ReviewListRows(Rows):
+    '''
+    ReviewListSerializer, 리뷰별 최신 댓글은 newest() 로 쿼리 한 번에 읽는다.
+    '''
+    fields = (
+        'pk', 'content', *USER_FIELDS, 'movie_id', 'rating', 'like_count', 'created_at', 'updated_at', 'num_comments',
+    )
+    serializer_class = ReviewListSerializer
+
+    def to_representation(self, rows, tz):
+        comments = defaultdict(list)
+        if rows:
+            newest = ReviewComment.objects.newest([row['pk'] for row in rows])
+            for comment in ReviewCommentRows(ReviewCommentRows.values(newest), many=True).data:
+                comments[comment['review']].append(comment)
+        return [
+            {
+                'pk': row['pk'],
+                'content': row['content'],
+                'user': _user(row),
+                'movie': row['movie_id'],
+                'rating': row['rating'],
+                'like_count': row['like_count'],
+                'created_at': _datetime(row['created_at'], tz),
+                'updated_at': _datetime(row['updated_at'], tz),
+                'reviewcomment_set': comments[row['pk']],
+                'comment_count': row['num_comments'],
+            }
+            for row in rows
+        ]
+
+
+class CollectionListRows(Rows):
+    '''
+    CollectionListSerializer, 담긴 영화 pk 는 through 테이블에서 쿼리 한 번에 읽는다.
+    '''
+    fields = (
+        'pk', *USER_FIELDS, 'title', 'content', 'like_count', 'liked_by_me', 'num_comments', 'created_at', 'updated_at',
+    )
+    serializer_class = CollectionListSerializer
+
+    def to_representation(self, rows, tz):
+        movies = defaultdict(list)
+        if rows:
+            through = Collection.movies.through.objects.filter(collection_id__in=[row['pk'] for row in rows])
+            # serializer(prefetch_related('movies'))와 같은 영화 pk 순서
+            for collection_pk, movie_pk in through.order_by('movie_id').values_list('collection_id', 'movie_id'):
+                movies[collection_pk].append(movie_pk)
+        return [
+            {
+                'pk': row['pk'],
+                'user': _user(row),
+                'title': row['title'],
+                'content': row['content'],
+                'like_count': row['like_count'],
+                'liked_by_me': bool(row['liked_by_me']),
+                'comment_count': row['num_comments'],
+                'movies': movies[row['pk']],
+                'created_at': _datetime(row['created_at'], tz),
+                'updated_at': _datetime(row['updated_at'], tz),
+            }
+            for row in rows
+        ]
+
+
+class CollectionCommentRows(Rows):
+    fields = ('pk', *USER_FIELDS, 'content', 'like_count', 'liked_by_me', 'created_at', 'updated_at')
+    serializer_class = CollectionCommentSerializer
+
+    def to_representation(self, rows, tz):
+        return [
+            {
+                'pk': row['pk'],
+                'user': _user(row),
+                'content': row['content'],
+                'like_count': row['like_count'],
+                'liked_by_me': bool(row['liked_by_me']),
+                'created_at': _datetime(row['created_at'], tz),
+                'updated_at': _datetime(row['updated_at'], tz),
+            }
+            for row in rows
+        ]
+
+
+class BookmarkRows(Rows):
+    fields = ('pk', 'user_id', 'movie_id', 'content', 'created_at', 'updated_at')
+    serializer_class = BookmarkSerializer
+
+    def to_representation(self, rows, tz):
+        return [
+            {
+                'pk': row['pk'],
+                'user': row['user_id'],
+                'movie': row['movie_id'],
+                'content': row['content'],
+                'created_at': _datetime(row['created_at'], tz),
+                'updated_at': _datetime(row['updated_at'], tz),
+            }
+            for row in rows
+        ]
@@ -0,0 +1,225 @@
+'''
+리뷰 내용, 컬렉션 제목/내용, 영화 제목 검색
+
+검색 백엔드는 settings.SEARCH_BACKEND 로 바꿀 수 있다.
+(None 이면 SQLite 는 FTS5, PostgreSQL 은 tsvector + GIN 색인, 그 외 DB 는 icontains)
+색인은 movies.signals 가 저장/삭제 시점에 갱신한다.
+'''
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from .models import Collection, Movie, Review
+
+
+class SearchBackend:
+    '''
+    kind 는 'review', 'collection', 'movie' 중 하나
+    '''
+    def index(self, kind, instance):
+        pass
+
+    def index_many(self, kind, instances):
+        '''
+        signal 을 보내지 않는 bulk_create 뒤에 호출
+        '''
+        for instance in instances:
+            self.index(kind, instance)
+
+    def remove(self, kind, pk):
+        pass
+
+    def search(self, kind, keyword, offset, limit):
+        '''
+        관련도 순 pk 목록
+        '''
+        raise NotImplementedError
+
+    def rebuild(self):
+        '''
+        색인을 처음부터 다시 만들고 색인한 문서 수를 반환
+        '''
+        return 0
+
+
+class IContainsBackend(SearchBackend):
+    '''
+    별도 색인 없이 icontains 로 찾는다. (관련도 대신 최신순)
+    '''
+    lookups = {
+        'review': (Review, ('content',)),
+        'collection': (Collection, ('title', 'content')),
+        'movie': (Movie, ('title',)),
+    }
+
+    def search(self, kind, keyword, offset, limit):
+        model, fields = self.lookups[kind]
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': keyword})
+        return list(model.objects.filter(condition).order_by('-pk').values_list('pk', flat=True)[offset:offset + limit])
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    '''
+    SQLite FTS5 역색인, bm25 순으로 정렬
+
+    unicode61 토크나이저는 공백/문장부호로만 나누므로 '영화를' 같은 어절도 '영화' 로 찾을 수 있도록
+    검색어의 각 단어를 prefix 로 검색한다.
+    '''
+    table = 'movies_search_index'
+    kinds = ('review', 'collection', 'movie')
+
+    # (kind, pk) 를 rowid 하나로 만들어 갱신/삭제가 rowid 조회 한 번으로 끝나게 한다
+    def rowid(self, kind, pk):
+        return pk * len(self.kinds) + self.kinds.index(kind)
+
+    @staticmethod
+    def document(kind, instance):
+        if kind == 'review':
+            return '', instance.content
+        if kind == 'collection':
+            return instance.title, instance.content
+        return instance.title, ''
+
+    def index(self, kind, instance):
+        title, content = self.document(kind, instance)
+        rowid = self.rowid(kind, instance.pk)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [rowid])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, kind, title, content) VALUES (%s, %s, %s, %s)',
+                [rowid, kind, title, content],
+            )
+
+    def index_many(self, kind, instances):
+        rows = [(self.rowid(kind, instance.pk), kind, *self.document(kind, instance)) for instance in instances]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [row[:1] for row in rows])
+            cursor.executemany(f'INSERT INTO {self.table} (rowid, kind, title, content) VALUES (%s, %s, %s, %s)', rows)
+
+    def remove(self, kind, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [self.rowid(kind, pk)])
+
+    @staticmethod
+    def match_expression(keyword):
+        terms = re.findall(r'\w+', keyword)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def rebuild(self):
+        sources = (
+            ('review', Review, "''", 'content'),
+            ('collection', Collection, 'title', 'content'),
+            ('movie', Movie, 'title', "''"),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            for kind, model, title, content in sources:
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, kind, title, content) '
+                    f'SELECT id * %s + %s, %s, {title}, {content} FROM {model._meta.db_table}',
+                    [len(self.kinds), self.kinds.index(kind), kind],
+                )
+            cursor.execute(f'SELECT count(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+    def search(self, kind, keyword, offset, limit):
+        expression = self.match_expression(keyword)
+        if not expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s AND kind = %s '
+                'ORDER BY rank LIMIT %s OFFSET %s',
+                [expression, kind, limit, offset],
+            )
+            return [rowid // len(self.kinds) for rowid, in cursor.fetchall()]
+
+
+class PostgresSearchBackend(SQLiteFTS5Backend):
+    '''
+    PostgreSQL tsvector 색인 테이블(GIN 인덱스), ts_rank 순으로 정렬 (SearchVector / SearchRank 와 같은 함수)
+
+    한국어 사전이 없으므로 'simple' 설정으로 공백/문장부호로만 나누고, FTS5 백엔드처럼 검색어의 각 단어를 prefix(:*) 로 찾는다.
+    테이블은 movies 0010 마이그레이션이 만든다. rowid 는 FTS5 백엔드와 같은 방식
+    '''
+    config = 'simple'
+
+    def vector(self, title, content):
+        return f"to_tsvector('{self.config}', {title} || ' ' || {content})"
+
+    def index(self, kind, instance):
+        self.index_many(kind, [instance])
+
+    def index_many(self, kind, instances):
+        rows = [(self.rowid(kind, instance.pk), kind, *self.document(kind, instance)) for instance in instances]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, kind, document) VALUES (%s, %s, {self.vector("%s", "%s")}) '
+                'ON CONFLICT (rowid) DO UPDATE SET kind = EXCLUDED.kind, document = EXCLUDED.document',
+                rows,
+            )
+
+    @staticmethod
+    def match_expression(keyword):
+        terms = re.findall(r'\w+', keyword)
+        return ' & '.join(f"'{term}':*" for term in terms)
+
+    def rebuild(self):
+        sources = (
+            ('review', Review, "''", 'content'),
+            ('collection', Collection, 'title', 'content'),
+            ('movie', Movie, 'title', "''"),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            for kind, model, title, content in sources:
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, kind, document) '
+                    f'SELECT id * %s + %s, %s, {self.vector(title, content)} FROM {model._meta.db_table}',
+                    [len(self.kinds), self.kinds.index(kind), kind],
+                )
+            cursor.execute(f'SELECT count(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+    def search(self, kind, keyword, offset, limit):
+        expression = self.match_expression(keyword)
+        if not expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table}, to_tsquery('{self.config}', %s) AS query "
+                'WHERE kind = %s AND document @@ query '
+                'ORDER BY ts_rank(document, query) DESC, rowid DESC LIMIT %s OFFSET %s',
+                [expression, kind, limit, offset],
+            )
+            return [rowid // len(self.kinds) for rowid, in cursor.fetchall()]
+
+
+# settings.SEARCH_BACKEND 가 None 일 때 DB 별 기본 백엔드
+DEFAULT_BACKENDS = {
+    'sqlite': 'movies.search.SQLiteFTS5Backend',
+    'postgresql': 'movies.search.PostgresSearchBackend',
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = settings.SEARCH_BACKEND
+        if path is None:
+            path = DEFAULT_BACKENDS.get(connection.vendor, 'movies.search.IContainsBackend')
+        _backend = import_string(path)()
+    return _backend
+
+
+def search(kind, keyword, offset=0, limit=20):
+    return get_backend().search(kind, keyword, offset, limit)
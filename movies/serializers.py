@@ -1,29 +1,109 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Manager
 from rest_framework import serializers
-from .models import Movie, Review, ReviewComment, Collection, CollectionComment, Bookmark
-
-
-class MovieSerializer(serializers.ModelSerializer):
-    like_count = serializers.IntegerField(
-        source = 'like_users.count',
-        read_only = True
-    )
-    bookmark_count = serializers.IntegerField(
-        source = 'bookmark_set.count',
-        read_only = True
-    )
+from BFS.metrics import TimedListSerializer, TimedSerializerMixin
+from .models import COMMENT_PREVIEW_SIZE, Movie, attach_newest_comments, Review, ReviewComment, Collection, CollectionComment, Bookmark, TimelineEntry
+
+
+class CountField(serializers.IntegerField):
+    '''
+    queryset 에 annotate 된 값이 있으면 그대로 쓰고, 없을 때만 related manager 의 count() 를 호출
+    '''
+    def __init__(self, annotation, related_name, **kwargs):
+        self.annotation = annotation
+        self.related_name = related_name
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        value = getattr(instance, self.annotation, None)
+        if value is None:
+            value = getattr(instance, self.related_name).count()
+        return int(value)
+
+
+class NewestCommentsField(serializers.Field):
+    '''
+    최신 댓글 COMMENT_PREVIEW_SIZE 개, attach_newest_comments() 로 미리 불러온 newest_comments 가 없을 때만 조회
+    (전체 댓글은 댓글 목록 API 에서 cursor 로 나눠 받는다)
+    '''
+    def __init__(self, serializer_class, related_name, **kwargs):
+        self.serializer_class = serializer_class
+        self.related_name = related_name
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        comments = getattr(instance, 'newest_comments', None)
+        if comments is None:
+            comments = getattr(instance, self.related_name).for_list().newest_first()[:COMMENT_PREVIEW_SIZE]
+        return self.serializer_class(comments, many=True, context=self.context).data
+
+
+class NewestCommentsListSerializer(TimedListSerializer):
+    '''
+    many=True 로 직렬화할 때 목록 전체의 최신 댓글을 attach_newest_comments() 로 한 번에 불러온다.
+    '''
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, Manager) else data)
+        attach_newest_comments([item for item in items if not hasattr(item, 'newest_comments')])
+        return super().to_representation(items)
+
+
+def full_like_users(request):
+    '''
+    ?like_users=full 로 좋아요 누른 유저 pk 목록 전체를 요청했는지
+    '''
+    return request is not None and request.query_params.get('like_users') == 'full'
+
+
+class LikedByMeField(serializers.BooleanField):
+    '''
+    요청한 유저가 좋아요를 눌렀는지, with_like_state() 로 annotate 된 값이 없으면 조회한다.
+    (context 에 request 가 없으면 False, 캐시한 응답에는 view 에서 채운다)
+    '''
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        value = getattr(instance, 'liked_by_me', None)
+        if value is None:
+            request = self.context.get('request')
+            if request is None or not request.user.is_authenticated:
+                return False
+            value = instance.like_users.filter(pk=request.user.pk).exists()
+        return bool(value)
+
+
+class LikeStateMixin:
+    '''
+    like_users 는 full_like_users() 일 때만 내보내고, 기본은 like_count 와 liked_by_me
+    '''
+    def get_fields(self):
+        fields = super().get_fields()
+        if not full_like_users(self.context.get('request')):
+            fields.pop('like_users', None)
+        return fields
+
+
+class MovieSerializer(TimedSerializerMixin, LikeStateMixin, serializers.ModelSerializer):
+    like_count = serializers.IntegerField(read_only=True)
+    liked_by_me = LikedByMeField()
+    bookmark_count = CountField('num_bookmarks', 'bookmark_set')
 
     class Meta:
         model = Movie
-        fields = ('pk', 'title', 'poster_path', 'like_users', 'like_count', 'bookmark_count')
+        fields = ('pk', 'title', 'poster_path', 'like_users', 'like_count', 'liked_by_me', 'bookmark_count')
         read_only_fields = ('title', 'poster_path', 'like_users', 'bookmark_count')
+        list_serializer_class = TimedListSerializer
 
 
-class ReviewCommentSerializer(serializers.ModelSerializer):
-    like_count = serializers.IntegerField(
-        source = 'like_users.count',
-        read_only = True
-    )
+class ReviewCommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    like_count = serializers.IntegerField(read_only=True)
     
     class UserSerializer(serializers.ModelSerializer):
 
@@ -37,17 +117,12 @@ class ReviewCommentSerializer(serializers.ModelSerializer):
         model = ReviewComment
         fields = ('pk', 'user', 'review', 'content', 'like_count', 'created_at', 'updated_at',)
         read_only_fields = ('user', 'review',)
+        list_serializer_class = TimedListSerializer
 
 
-class ReviewListSerializer(serializers.ModelSerializer):
-    like_count = serializers.IntegerField(
-        source = 'like_users.count',
-        read_only = True
-    )
-    comment_count = serializers.IntegerField(
-        source = 'reviewcomment_set.count',
-        read_only = True
-    )
+class ReviewListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    like_count = serializers.IntegerField(read_only=True)
+    comment_count = CountField('num_comments', 'reviewcomment_set')
 
     class UserSerializer(serializers.ModelSerializer):
 
@@ -56,22 +131,18 @@ class ReviewListSerializer(serializers.ModelSerializer):
             fields = ('pk', 'username', 'nickname')
 
     user = UserSerializer(read_only=True)
-    reviewcomment_set = ReviewCommentSerializer(many=True, read_only=True)
+    reviewcomment_set = NewestCommentsField(ReviewCommentSerializer, 'reviewcomment_set')
     
     class Meta:
         model = Review
         fields = ('pk', 'content', 'user', 'movie', 'rating', 'like_count', 'created_at', 'updated_at', 'reviewcomment_set', 'comment_count')
+        list_serializer_class = NewestCommentsListSerializer
 
 
-class ReviewSerializer(serializers.ModelSerializer):
-    like_count = serializers.IntegerField(
-        source = 'like_users.count',
-        read_only = True
-    )
-    comment_count = serializers.IntegerField(
-        source = 'reviewcomment_set.count',
-        read_only = True
-    )
+class ReviewSerializer(TimedSerializerMixin, LikeStateMixin, serializers.ModelSerializer):
+    like_count = serializers.IntegerField(read_only=True)
+    liked_by_me = LikedByMeField()
+    comment_count = CountField('num_comments', 'reviewcomment_set')
 
     class UserSerializer(serializers.ModelSerializer):
 
@@ -80,23 +151,19 @@ class ReviewSerializer(serializers.ModelSerializer):
             fields = ('pk', 'username', 'nickname')
 
     user = UserSerializer(read_only=True)
-    reviewcomment_set = ReviewCommentSerializer(many=True, read_only=True)
+    reviewcomment_set = NewestCommentsField(ReviewCommentSerializer, 'reviewcomment_set')
 
     class Meta:
         model = Review
-        fields = ('pk', 'user', 'like_users', 'movie', 'content', 'rating', 'like_count', 'reviewcomment_set', 'comment_count', 'created_at', 'updated_at')
+        fields = ('pk', 'user', 'like_users', 'movie', 'content', 'rating', 'like_count', 'liked_by_me', 'reviewcomment_set', 'comment_count', 'created_at', 'updated_at')
         read_only_fields = ('user', 'movie', 'like_users', )
+        list_serializer_class = NewestCommentsListSerializer
 
 
-class CollectionListSerializer(serializers.ModelSerializer):
-    like_count = serializers.IntegerField(
-        source = 'like_users.count',
-        read_only = True
-    )
-    comment_count = serializers.IntegerField(
-        source = 'collectioncomment_set.count',
-        read_only=True
-    )
+class CollectionListSerializer(TimedSerializerMixin, LikeStateMixin, serializers.ModelSerializer):
+    like_count = serializers.IntegerField(read_only=True)
+    liked_by_me = LikedByMeField()
+    comment_count = CountField('num_comments', 'collectioncomment_set')
 
     class UserSerializer(serializers.ModelSerializer):
 
@@ -108,16 +175,15 @@ class CollectionListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Collection
-        fields = ('pk', 'user', 'title', 'content', 'like_users', 'like_count', 'comment_count', 'movies', 'created_at', 'updated_at',)
+        fields = ('pk', 'user', 'title', 'content', 'like_users', 'like_count', 'liked_by_me', 'comment_count', 'movies', 'created_at', 'updated_at',)
         read_only_fields = ('user',)
+        list_serializer_class = TimedListSerializer
 
 
 
-class CollectionCommentSerializer(serializers.ModelSerializer):
-    like_count = serializers.IntegerField(
-        source = 'like_users.count',
-        read_only = True
-    )
+class CollectionCommentSerializer(TimedSerializerMixin, LikeStateMixin, serializers.ModelSerializer):
+    like_count = serializers.IntegerField(read_only=True)
+    liked_by_me = LikedByMeField()
 
     class UserSerializer(serializers.ModelSerializer):
 
@@ -129,19 +195,15 @@ class CollectionCommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CollectionComment
-        fields = ('pk', 'user', 'content', 'like_count', 'like_users', 'created_at', 'updated_at',)
+        fields = ('pk', 'user', 'content', 'like_count', 'liked_by_me', 'like_users', 'created_at', 'updated_at',)
         read_only_fields = ('user', 'collection', 'like_users', 'created_at', 'updated_at',)
+        list_serializer_class = TimedListSerializer
 
 
-class CollectionSerializer(serializers.ModelSerializer):
-    like_count = serializers.IntegerField(
-        source = 'like_users.count',
-        read_only = True
-    )
-    comment_count = serializers.IntegerField(
-        source = 'collectioncomment_set.count',
-        read_only = True
-    )
+class CollectionSerializer(TimedSerializerMixin, LikeStateMixin, serializers.ModelSerializer):
+    like_count = serializers.IntegerField(read_only=True)
+    liked_by_me = LikedByMeField()
+    comment_count = CountField('num_comments', 'collectioncomment_set')
 
     class UserSerializer(serializers.ModelSerializer):
 
@@ -150,33 +212,31 @@ class CollectionSerializer(serializers.ModelSerializer):
             fields = ('pk', 'username', 'nickname')
 
     user = UserSerializer(read_only=True)
-    movie_pks = serializers.ListField(write_only=True)
-    collectioncomment_set = CollectionCommentSerializer(many=True, read_only=True)
+    movie_pks = serializers.ListField(child=serializers.IntegerField(), write_only=True)
+    collectioncomment_set = NewestCommentsField(CollectionCommentSerializer, 'collectioncomment_set')
 
     def create(self, validated_data):
         movie_pks = validated_data.pop('movie_pks')
         collection = Collection.objects.create(**validated_data)
-        for movie_pk in movie_pks:
-            collection.movies.add(movie_pk)
+        collection.set_movies(movie_pks)
         return collection
 
     def update(self, collection, validated_data):
         movie_pks = validated_data.pop('movie_pks')
         for attr, value in validated_data.items():
             setattr(collection, attr, value)
-            collection.save()
-        collection.movies.clear()
-        for movie_pk in movie_pks:
-            collection.movies.add(movie_pk)
+        collection.save()
+        collection.set_movies(movie_pks)
         return collection
 
     class Meta:
         model = Collection
-        fields = ('pk', 'title', 'user', 'content', 'movies', 'like_users', 'movie_pks', 'like_count', 'comment_count' ,'collectioncomment_set', 'created_at', 'updated_at',)
+        fields = ('pk', 'title', 'user', 'content', 'movies', 'like_users', 'movie_pks', 'like_count', 'liked_by_me', 'comment_count' ,'collectioncomment_set', 'created_at', 'updated_at',)
         read_only_fields = ('like_users', 'movies', 'user',)
+        list_serializer_class = NewestCommentsListSerializer
 
 
-class UserLikeMovieSerializer(serializers.ModelSerializer):
+class UserLikeMovieSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     
     class Meta:
         model = get_user_model()
@@ -184,9 +244,26 @@ class UserLikeMovieSerializer(serializers.ModelSerializer):
         read_only_fields = ('pk', 'username', 'nickname', 'like_movies')
 
 
-class BookmarkSerializer(serializers.ModelSerializer):
+class BookmarkSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Bookmark
         fields = ('pk', 'user', 'movie', 'content', 'created_at', 'updated_at')
         read_only_fields = ('user', 'movie', )
+        list_serializer_class = TimedListSerializer
+
+
+class TimelineEntrySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+
+    class UserSerializer(serializers.ModelSerializer):
+
+        class Meta:
+            model = get_user_model()
+            fields = ('pk', 'username', 'nickname')
+
+    actor = UserSerializer(read_only=True)
+
+    class Meta:
+        model = TimelineEntry
+        fields = ('pk', 'kind', 'actor', 'object_id', 'data', 'created_at')
+        list_serializer_class = TimedListSerializer
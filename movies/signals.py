@@ -0,0 +1,174 @@
+'''
+검색 색인(movies.search), 응답 캐시(movies.cache), 팔로워 타임라인(movies.feed) 동기화
+'''
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import cache, feed
+from .likes import LIKE_MODELS, like_changed
+from .models import Bookmark, Collection, CollectionComment, Movie, Review, ReviewComment
+from .search import get_backend
+
+
+SEARCH_KINDS = {Review: 'review', Collection: 'collection', Movie: 'movie'}
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=Movie)
+def index_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:  # loaddata 는 건너뛴다 (manage.py rebuild_search_index)
+        get_backend().index(SEARCH_KINDS[sender], instance)
+
+
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=Movie)
+def remove_search_document(sender, instance, **kwargs):
+    get_backend().remove(SEARCH_KINDS[sender], instance.pk)
+
+
+def cache_keys(instance):
+    if isinstance(instance, Review):
+        return cache.review_keys(instance.pk, instance.movie_id)
+    if isinstance(instance, ReviewComment):
+        return cache.review_keys(instance.review_id)
+    if isinstance(instance, CollectionComment):
+        return cache.collection_keys(instance.collection_id)
+    if isinstance(instance, Bookmark):
+        return cache.movie_keys(instance.movie_id)
+    return cache.KEYS[type(instance)](instance.pk)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=ReviewComment)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=CollectionComment)
+@receiver(post_save, sender=Bookmark)
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=ReviewComment)
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=CollectionComment)
+@receiver(post_delete, sender=Bookmark)
+def invalidate_cache(sender, instance, **kwargs):
+    cache.invalidate(cache_keys(instance))
+
+
+# 리뷰/컬렉션/댓글 응답에 함께 들어가는 작성자 필드
+AUTHOR_FIELDS = ('username', 'nickname')
+
+
+def _author_fields(user):
+    # 불러오지 않은(deferred) 필드는 읽지 않는다
+    return tuple(user.__dict__.get(field) for field in AUTHOR_FIELDS)
+
+
+@receiver(post_init, sender=get_user_model())
+def remember_author_fields(sender, instance, **kwargs):
+    instance._saved_author_fields = _author_fields(instance)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_cache_on_author(sender, instance, created, raw=False, **kwargs):
+    '''
+    닉네임 등 작성자 필드가 바뀌었을 때만 그 유저가 쓴 리뷰, 컬렉션, 댓글이 들어간 캐시를 지운다.
+    (로그인, 비밀번호 변경처럼 작성자 필드가 그대로인 저장은 쿼리 없이 건너뛴다)
+    '''
+    fields = _author_fields(instance)
+    changed = fields != getattr(instance, '_saved_author_fields', None)
+    instance._saved_author_fields = fields
+    if cache.get_cache() is None or created or raw or not changed:
+        return
+    reviews = Review.objects.filter(user=instance).values_list('pk', 'movie_id')
+    commented = Review.objects.filter(reviewcomment__user=instance).values_list('pk', 'movie_id').distinct()
+    collections = Collection.objects.filter(
+        Q(user=instance) | Q(collectioncomment__user=instance),
+    ).values_list('pk', flat=True).distinct()
+    keys = [key for review_pk, movie_pk in {*reviews, *commented} for key in cache.review_keys(review_pk, movie_pk)]
+    keys += [key for collection_pk in collections for key in cache.collection_keys(collection_pk)]
+    cache.invalidate(keys)
+
+
+@receiver(like_changed)
+def invalidate_cache_on_like(sender, pk, **kwargs):
+    cache.invalidate(cache.KEYS[sender](pk))
+
+
+def invalidate_cache_on_m2m(sender, instance, action, reverse, model, pk_set, **kwargs):
+    '''
+    like_users 를 .add() / .remove() / .clear() 로 바꾼 경우
+    '''
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        objects = [(type(instance), instance.pk)]
+    elif action == 'pre_clear':  # user.like_reviews.clear() 등, 지워질 대상을 미리 찾는다
+        field = model.like_users.field
+        pks = sender.objects.filter(**{field.m2m_reverse_field_name(): instance.pk})
+        objects = [(model, pk) for pk in pks.values_list(f'{field.m2m_field_name()}_id', flat=True)]
+    else:
+        objects = [(model, pk) for pk in pk_set]
+    cache.invalidate([key for liked_model, pk in objects for key in cache.KEYS[liked_model](pk)])
+
+
+for liked_model in LIKE_MODELS:
+    m2m_changed.connect(
+        invalidate_cache_on_m2m, sender=liked_model.like_users.through,
+        dispatch_uid=f'invalidate_cache_{liked_model.__name__}_like_users',
+    )
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Collection)
+def fan_out_activity(sender, instance, created, raw=False, **kwargs):
+    if raw:  # loaddata 는 건너뛴다 (manage.py rebuild_timelines)
+        return
+    if created:
+        feed.dispatch(('add', feed.OBJECT_KINDS[sender][0], instance.pk, instance.user_id, instance.created_at))
+    else:
+        feed.dispatch(('refresh', sender, instance.pk))
+
+
+@receiver(post_save, sender=Movie)
+def refresh_timeline(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        feed.dispatch(('refresh', sender, instance.pk))
+
+
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=Movie)
+def remove_from_timelines(sender, instance, **kwargs):
+    feed.dispatch(('delete', sender, instance.pk))
+
+
+@receiver(like_changed)
+def fan_out_like(sender, pk, user, liked, **kwargs):
+    kind = feed.LIKE_KINDS.get(sender)
+    if kind is None:
+        return
+    if liked:
+        feed.dispatch(('add', kind, pk, user.pk, timezone.now()))
+    else:
+        feed.dispatch(('remove', kind, pk, user.pk))
+
+
+@receiver(m2m_changed, sender=get_user_model().like_users.through)
+def follow_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    User.like_users (팔로우) 변경, reverse 면 instance 가 팔로우 당한 쪽 (interested_in)
+    '''
+    if action == 'post_clear':
+        feed.dispatch(('clear', 'actor' if reverse else 'owner', instance.pk))
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    event = 'follow' if action == 'post_add' else 'unfollow'
+    for pk in pk_set:
+        owner_pk, actor_pk = (pk, instance.pk) if reverse else (instance.pk, pk)
+        if owner_pk != actor_pk:
+            feed.dispatch((event, owner_pk, actor_pk))
@@ -0,0 +1,282 @@
+'''
+영화-영화 유사도 배치 작업 (manage.py build_movie_neighbors)
+
+좋아요, 리뷰 평점, 컬렉션 담기를 (유저 x 영화) implicit feedback 행렬 하나로 합치고,
+열(영화)끼리의 코사인 유사도 중 영화마다 상위 K 개만 MovieNeighbor 에 저장한다.
+
+- 테이블은 pk 순으로 chunk 씩 읽어 numpy 배열로 쌓고,
+- 유사도는 영화 batch 단위로 희소 행렬 곱을 해서 한 번에 (영화 수 x 영화 수) 행렬을 만들지 않으며,
+- incremental 모드는 SimilarityCheckpoint 이후에 활동이 생긴 영화와, 그 영화를 이웃으로 저장해 둔 영화의 행을
+  다시 계산한다. 읽는 활동은 그 영화들과 같은 유저가 활동한 영화들의 것뿐이고, 나머지 영화는 바뀐 영화와의
+  새 점수만 합쳐 상위 K 개를 남긴다. (전체 재계산과 같은 결과)
+  (좋아요 취소/리뷰 삭제는 추적하지 않으므로 주기적으로 전체 재계산 필요)
+'''
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+from django.db.models import Max
+from .models import Collection, Movie, MovieNeighbor, Review, SimilarityCheckpoint
+
+
+DEFAULT_TOP_K = 50
+CHUNK_SIZE = 10000
+BATCH_SIZE = 1000
+# id__in 조건 하나에 넣을 id 수 (SQLite 변수 개수 제한)
+FILTER_SIZE = 500
+
+# (유저, 영화) 가중치, 같은 쌍에 여러 활동이 있으면 더해진다
+LIKE_WEIGHT = 1.0
+COLLECTION_WEIGHT = 0.5
+# 리뷰는 평점 / 5 (0 ~ 1)
+
+LikeThrough = Movie.like_users.through
+CollectionMovieThrough = Collection.movies.through
+
+
+def stream(queryset, fields, chunk_size=CHUNK_SIZE):
+    '''
+    pk 순으로 chunk_size 행씩 (len, len(fields)) float 배열로 읽는다. (OFFSET 없이 keyset)
+    '''
+    last_pk = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', *fields)[:chunk_size]
+        )
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        yield np.array(rows, dtype=np.float64)[:, 1:]
+
+
+class Checkpoint:
+    '''
+    이번 실행이 반영할 활동의 끝 위치, 실행 도중 생긴 활동은 다음 실행에서 반영된다.
+    '''
+    def __init__(self):
+        self.last_like_id = LikeThrough.objects.aggregate(value=Max('pk'))['value'] or 0
+        self.last_collection_movie_id = CollectionMovieThrough.objects.aggregate(value=Max('pk'))['value'] or 0
+        self.last_review_updated_at = Review.objects.aggregate(value=Max('updated_at'))['value']
+
+    def save(self):
+        SimilarityCheckpoint.objects.update_or_create(pk=1, defaults={
+            'last_like_id': self.last_like_id,
+            'last_collection_movie_id': self.last_collection_movie_id,
+            'last_review_updated_at': self.last_review_updated_at,
+        })
+
+
+def _filtered(queryset, field, ids):
+    '''
+    ids 가 None 이면 queryset, 아니면 field__in 을 FILTER_SIZE 개씩 나눈 queryset 들
+    '''
+    if ids is None:
+        yield queryset
+        return
+    ids = sorted(ids)
+    for start in range(0, len(ids), FILTER_SIZE):
+        yield queryset.filter(**{f'{field}__in': ids[start:start + FILTER_SIZE]})
+
+
+def load_interactions(checkpoint, chunk_size=CHUNK_SIZE, users=None, movies=None):
+    '''
+    (유저 id, 영화 id, 가중치) 배열
+
+    users 또는 movies(id 집합)가 주어지면 그 유저/영화의 활동만 읽는다.
+    '''
+    def tables(queryset, user_field):
+        if users is not None:
+            return _filtered(queryset, user_field, users)
+        return _filtered(queryset, 'movie_id', movies)
+
+    user_ids, movie_ids, weights = [], [], []
+
+    likes = LikeThrough.objects.filter(pk__lte=checkpoint.last_like_id)
+    for queryset in tables(likes, 'user_id'):
+        for chunk in stream(queryset, ('user_id', 'movie_id'), chunk_size):
+            user_ids.append(chunk[:, 0])
+            movie_ids.append(chunk[:, 1])
+            weights.append(np.full(len(chunk), LIKE_WEIGHT))
+
+    for queryset in tables(Review.objects.all(), 'user_id'):
+        for chunk in stream(queryset, ('user_id', 'movie_id', 'rating'), chunk_size):
+            user_ids.append(chunk[:, 0])
+            movie_ids.append(chunk[:, 1])
+            weights.append(chunk[:, 2] / 5)
+
+    collected = CollectionMovieThrough.objects.filter(pk__lte=checkpoint.last_collection_movie_id)
+    for queryset in tables(collected, 'collection__user_id'):
+        for chunk in stream(queryset, ('collection__user_id', 'movie_id'), chunk_size):
+            user_ids.append(chunk[:, 0])
+            movie_ids.append(chunk[:, 1])
+            weights.append(np.full(len(chunk), COLLECTION_WEIGHT))
+
+    if not user_ids:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([])
+    return (
+        np.concatenate(user_ids).astype(np.int64),
+        np.concatenate(movie_ids).astype(np.int64),
+        np.concatenate(weights),
+    )
+
+
+def load_neighborhood(checkpoint, movies, chunk_size=CHUNK_SIZE):
+    '''
+    movies 의 행(다른 모든 영화와의 유사도)을 정확히 계산하는 데 필요한 활동만 읽는다.
+
+    movies 에 활동한 유저들이 활동한 영화(movies 와 점수가 0 이 아닌 영화)의 열을 빠짐없이 읽으므로
+    내적과 열의 크기가 전체 데이터로 계산한 것과 같다.
+    '''
+    users, _, _ = load_interactions(checkpoint, chunk_size, movies=movies)
+    _, related, _ = load_interactions(checkpoint, chunk_size, users=set(users.tolist()))
+    return load_interactions(checkpoint, chunk_size, movies=set(related.tolist()) | set(movies))
+
+
+def changed_movies(since):
+    '''
+    since(SimilarityCheckpoint) 이후 활동이 생긴 영화 id
+    '''
+    movies = set(LikeThrough.objects.filter(pk__gt=since.last_like_id).values_list('movie_id', flat=True))
+    movies.update(
+        CollectionMovieThrough.objects.filter(pk__gt=since.last_collection_movie_id).values_list('movie_id', flat=True)
+    )
+    reviews = Review.objects.all()
+    if since.last_review_updated_at is not None:
+        reviews = reviews.filter(updated_at__gt=since.last_review_updated_at)
+    movies.update(reviews.values_list('movie_id', flat=True))
+    return movies
+
+
+def top_k_similar(users, movies, weights, top_k=DEFAULT_TOP_K, only=None, batch_size=BATCH_SIZE):
+    '''
+    열(영화)끼리 코사인 유사도의 영화별 top-K
+
+    only 가 주어지면 그 영화들의 행만 계산한다. top_k 가 None 이면 점수가 0 보다 큰 이웃을 모두 남긴다.
+    (영화 id, 이웃 id, 점수) 배열을 반환
+    '''
+    empty = np.array([], dtype=np.int64)
+    if not len(users):
+        return empty, empty, np.array([])
+
+    user_ids, user_index = np.unique(users, return_inverse=True)
+    movie_ids, movie_index = np.unique(movies, return_inverse=True)
+    matrix = sparse.csc_matrix(
+        (weights, (user_index, movie_index)),
+        shape=(len(user_ids), len(movie_ids)),
+    )  # 같은 (유저, 영화) 는 합쳐진다
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsc()
+    normalized_t = normalized.T.tocsr()
+
+    rows = np.arange(len(movie_ids)) if only is None else np.flatnonzero(np.isin(movie_ids, list(only)))
+    sources, targets, scores = [], [], []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        block = (normalized_t[batch] @ normalized).tocsr()
+        for i, source in enumerate(batch):
+            begin, end = block.indptr[i], block.indptr[i + 1]
+            row_targets = block.indices[begin:end]
+            row_scores = block.data[begin:end]
+            keep = (row_targets != source) & (row_scores > 0)
+            row_targets, row_scores = row_targets[keep], row_scores[keep]
+            if top_k is not None and len(row_targets) > top_k:
+                best = np.argpartition(-row_scores, top_k)[:top_k]
+                row_targets, row_scores = row_targets[best], row_scores[best]
+            sources.append(np.full(len(row_targets), movie_ids[source]))
+            targets.append(movie_ids[row_targets])
+            scores.append(row_scores)
+
+    if not sources:
+        return empty, empty, np.array([])
+    return np.concatenate(sources), np.concatenate(targets), np.concatenate(scores)
+
+
+def _neighbors(sources, targets, scores):
+    return [
+        MovieNeighbor(movie_id=source, neighbor_id=target, score=score)
+        for source, target, score in zip(sources.tolist(), targets.tolist(), scores.tolist())
+    ]
+
+
+def _best(groups, scores, top_k):
+    '''
+    같은 groups 값끼리 점수 상위 top_k 개인 위치의 bool 배열
+    '''
+    order = np.lexsort((-scores, groups))
+    group_start = np.r_[0, np.flatnonzero(np.diff(groups[order])) + 1]
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - np.repeat(group_start, np.diff(np.r_[group_start, len(order)]))
+    return rank < top_k
+
+
+def _trim(movies, top_k):
+    '''
+    movies 의 MovieNeighbor 를 점수 상위 top_k 개만 남긴다.
+    '''
+    rows = [
+        row
+        for queryset in _filtered(MovieNeighbor.objects.all(), 'movie_id', movies)
+        for row in queryset.values_list('pk', 'movie_id', 'score')
+    ]
+    rows = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    if not len(rows):
+        return
+    extra = rows[~_best(rows[:, 1], rows[:, 2], top_k), 0].astype(np.int64).tolist()
+    for start in range(0, len(extra), BATCH_SIZE):
+        MovieNeighbor.objects.filter(pk__in=extra[start:start + BATCH_SIZE]).delete()
+
+
+def rebuild(top_k=DEFAULT_TOP_K, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    '''
+    MovieNeighbor 전체를 다시 계산, 저장한 이웃 수를 반환
+    '''
+    checkpoint = Checkpoint()
+    users, movies, weights = load_interactions(checkpoint, chunk_size)
+    neighbors = _neighbors(*top_k_similar(users, movies, weights, top_k, batch_size=batch_size))
+    with transaction.atomic():
+        MovieNeighbor.objects.all().delete()
+        MovieNeighbor.objects.bulk_create(neighbors, batch_size=batch_size)
+        checkpoint.save()
+    return len(neighbors)
+
+
+def refresh(top_k=DEFAULT_TOP_K, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    '''
+    마지막 실행 이후 활동이 생긴 영화와 관련된 이웃만 다시 계산, 저장한 이웃 수를 반환
+    (체크포인트가 없으면 rebuild)
+    '''
+    since = SimilarityCheckpoint.objects.filter(pk=1).first()
+    if since is None:
+        return rebuild(top_k, chunk_size, batch_size)
+
+    checkpoint = Checkpoint()
+    changed = changed_movies(since)
+    if not changed:
+        checkpoint.save()
+        return 0
+
+    # 바뀐 영화를 이웃으로 저장해 둔 영화는 그 점수가 내려갔을 수 있고, 그러면 top-K 밖에 있던 이웃이 들어와야 하므로
+    # 저장된 이웃으로는 알 수 없다. 이 영화들은 행 전체를 다시 계산한다.
+    recompute = set(changed)
+    for queryset in _filtered(MovieNeighbor.objects.all(), 'neighbor_id', changed):
+        recompute.update(queryset.values_list('movie_id', flat=True))
+
+    users, movies, weights = load_neighborhood(checkpoint, recompute, chunk_size)
+    sources, targets, scores = top_k_similar(users, movies, weights, None, only=recompute, batch_size=batch_size)
+    best = _best(sources, scores, top_k)
+    # 나머지 영화의 저장된 이웃에는 바뀐 영화가 없어 점수가 그대로이므로, 바뀐 영화와의 새 점수를 더하고
+    # 상위 K 개만 남기면 된다. (바뀐 영화의 top-K 에 들지 않아도 반대 방향으로는 들 수 있어 전체 행에서 고른다)
+    reverse = np.isin(sources, list(changed)) & ~np.isin(targets, list(recompute))
+    others = set(targets[reverse].tolist())
+
+    with transaction.atomic():
+        for queryset in _filtered(MovieNeighbor.objects.all(), 'movie_id', recompute):
+            queryset.delete()
+        neighbors = (
+            _neighbors(sources[best], targets[best], scores[best])
+            + _neighbors(targets[reverse], sources[reverse], scores[reverse])
+        )
+        MovieNeighbor.objects.bulk_create(neighbors, batch_size=batch_size)
+        _trim(others, top_k)
+        checkpoint.save()
+    return len(neighbors)
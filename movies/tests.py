@@ -1,3 +1,1400 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock, skipUnless
+import requests
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date, urlencode
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer, ListSerializer
+from rest_framework.test import APIClient
+from BFS import db
+from BFS import metrics
+from BFS import tasks
+from BFS.renderers import FastJSONRenderer
+from . import cache as response_cache
+from . import feed
+from . import search as search_index
+from . import tmdb
+from . import rows
+from .likes import add_like, remove_like, toggle_like
+from .models import (
+    COMMENT_PREVIEW_SIZE, Bookmark, Collection, CollectionComment, Movie, MovieNeighbor, Review, ReviewComment, TimelineEntry,
+    TmdbMovieInfo, attach_newest_comments,
+)
+from .recommend import recommend
+from .serializers import ReviewCommentSerializer, ReviewSerializer
+from .similarity import load_interactions, rebuild as build_neighbors, refresh
+from .tmdb_stub import StubTmdbServer
 
-# Create your tests here.
+
+class ReviewQueryCountTest(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.client = APIClient()
+        self.users = [
+            get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}')
+            for i in range(3)
+        ]
+        self.movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='/poster.jpg')
+
+    def add_reviews(self, count):
+        for _ in range(count):
+            for user in self.users:
+                review = Review.objects.create(user=user, movie=self.movie, content='리뷰', rating=4.5)
+                for liker in self.users:
+                    add_like(Review, review.pk, liker)
+                for commenter in self.users:
+                    comment = ReviewComment.objects.create(user=commenter, review=review, content='댓글')
+                    add_like(ReviewComment, comment.pk, user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assertConstantQueries(self, url):
+        self.add_reviews(1)
+        small = self.count_queries(url)
+        self.add_reviews(5)
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_review_list_query_count_is_constant(self):
+        self.assertConstantQueries('/movies/review/')
+
+    def test_movie_detail_query_count_is_constant(self):
+        self.assertConstantQueries(f'/movies/{self.movie.pk}/')
+
+    def test_review_list_counts(self):
+        self.add_reviews(1)
+        response = self.client.get('/movies/review/')
+        review = response.json()['results'][0]
+        self.assertEqual(review['like_count'], 3)
+        self.assertEqual(review['comment_count'], 3)
+        self.assertEqual(len(review['reviewcomment_set']), 3)
+        self.assertEqual(review['reviewcomment_set'][0]['like_count'], 1)
+
+
+class KeysetPaginationTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='/poster.jpg')
+        for i in range(7):
+            Review.objects.create(user=self.user, movie=self.movie, content=f'리뷰 {i}', rating=3.0)
+
+    def walk(self, url):
+        pks = []
+        while url:
+            data = self.client.get(url).json()
+            pks.extend(review['pk'] for review in data['results'])
+            url = data['next']
+            # 페이지를 넘기는 도중에 새 리뷰가 추가되어도 이미 본 항목이 다시 나오면 안 된다
+            Review.objects.create(user=self.user, movie=self.movie, content='새 리뷰', rating=3.0)
+        return pks
+
+    def test_pages_are_stable_under_concurrent_inserts(self):
+        expected = list(Review.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self.walk('/movies/review/?page_size=3'), expected)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get('/movies/review/?page_size=3').json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual(previous['results'], first['results'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/movies/review/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+    def test_collection_list_is_paginated(self):
+        for i in range(3):
+            Collection.objects.create(user=self.user, title=f'컬렉션 {i}', content='')
+        data = self.client.get('/movies/collection/?page_size=2').json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNone(data['next'])
+
+
+class LikeCountTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.client.force_authenticate(self.user)
+        movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='/poster.jpg')
+        self.review = Review.objects.create(user=self.user, movie=movie, content='리뷰', rating=3.0)
+
+    def test_toggle_updates_stored_count(self):
+        url = f'/movies/review/{self.review.pk}/like/'
+        self.assertEqual(self.client.post(url).json(), {'like': True, 'like_count': 1})
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.like_count, 1)
+        self.assertEqual(self.client.post(url).json(), {'like': False, 'like_count': 0})
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.like_count, 0)
+
+    def test_add_like_is_idempotent(self):
+        self.assertEqual(add_like(Review, self.review.pk, self.user), (True, 1))
+        self.assertEqual(add_like(Review, self.review.pk, self.user), (False, 1))
+
+    def test_put_and_delete_are_idempotent(self):
+        url = f'/movies/review/{self.review.pk}/like/'
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.client.put(url).json(), {'like': True, 'like_count': 1})
+            like_queries = [query for query in context.captured_queries if 'like_' in query['sql']]
+            self.assertEqual(len(like_queries), 2)  # INSERT, UPDATE ... RETURNING (또는 SELECT)
+        for _ in range(2):
+            self.assertEqual(self.client.delete(url).json(), {'like': False, 'like_count': 0})
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.like_count, 0)
+
+    def test_like_missing_object(self):
+        self.assertEqual(self.client.put('/movies/review/999/like/').status_code, 404)
+        self.assertEqual(self.client.put('/movies/review/comment/999/like/').status_code, 404)
+        self.assertFalse(Review.like_users.through.objects.exists())
+
+    def test_movie_like_retry_applies_preference_once(self):
+        data = {'genre_list': [18]}
+        self.client.put('/movies/550/like/', data, format='json')
+        liked = self.user.genre_preference
+        self.assertEqual(self.client.put('/movies/550/like/', data, format='json').json()['like_count'], 1)
+        self.assertEqual(self.user.genre_preference, liked)
+        self.client.delete('/movies/550/like/', data, format='json')
+        self.client.delete('/movies/550/like/', data, format='json')
+        self.assertEqual(self.user.genre_preference, {'18': 0})
+
+    def test_toggle_conflict_keeps_like(self):
+        # 삭제(0 행)와 INSERT 사이에 동시 요청이 좋아요를 먼저 넣은 경우
+        add_like(Movie, 550, self.user)
+        with mock.patch('movies.likes._delete', return_value=0), \
+                mock.patch('accounts.tasks.remove_watched_movie.delay') as remove, \
+                mock.patch('accounts.tasks.add_watched_movie.delay') as add:
+            self.assertEqual(toggle_like(Movie, 550, self.user), (False, True, 1))
+            data = {'title': '파이트 클럽', 'poster_path': '/poster.jpg'}
+            self.assertEqual(self.client.post('/movies/550/like/', data, format='json').json(), {'like': True, 'like_count': 1})
+        remove.assert_not_called()
+        add.assert_not_called()
+        self.assertEqual(Movie.objects.get(pk=550).like_count, 1)
+
+    def test_update_without_returning(self):
+        # SQLite 3.35 미만은 UPDATE 후 SELECT
+        with mock.patch('movies.likes._can_return', return_value=False):
+            self.assertEqual(add_like(Review, self.review.pk, self.user), (True, 1))
+            self.assertEqual(toggle_like(Review, self.review.pk, self.user), (True, False, 0))
+
+    def test_concurrent_likes(self):
+        users = [get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}') for i in range(5)]
+        for user in users * 2:
+            add_like(Review, self.review.pk, user)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.like_count, 5)
+
+    def test_like_state_batch(self):
+        other = Review.objects.create(user=self.user, movie_id=550, content='다른 리뷰', rating=3.0)
+        add_like(Review, self.review.pk, self.user)
+        add_like(Collection, Collection.objects.create(user=self.user, title='모음', content='내용').pk, self.user)
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(f'/movies/likes/?review={self.review.pk},{other.pk},999&movie=550').json()
+        self.assertEqual(len(context), 2)
+        self.assertEqual(data, {
+            'movie': [{'pk': 550, 'like': False, 'like_count': 0}],
+            'review': [
+                {'pk': self.review.pk, 'like': True, 'like_count': 1},
+                {'pk': other.pk, 'like': False, 'like_count': 0},
+            ],
+        })
+
+    def test_like_state_limits(self):
+        pks = ','.join(map(str, range(1, 302)))
+        self.assertEqual(self.client.get(f'/movies/likes/?review={pks}').status_code, 400)
+        self.assertEqual(self.client.get('/movies/likes/?review=a').status_code, 400)
+
+    def test_reconcile_like_counts(self):
+        self.review.like_users.add(self.user)  # like_count 를 거치지 않은 변경
+        out = StringIO()
+        call_command('reconcile_like_counts', stdout=out)
+        self.assertIn('Review: 1', out.getvalue())
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.like_count, 1)
+
+
+class TmdbCacheTest(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.server = StubTmdbServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        settings_override = override_settings(TMDB_BASE_URL=self.server.base_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_movie_detail_creates_movie_from_cached_info(self):
+        response = APIClient().get('/movies/550/')
+        self.assertEqual(response.json()['movie_serializer']['title'], '영화 550')
+        Movie.objects.all().delete()
+        APIClient().get('/movies/550/')
+        self.assertEqual(self.server.requests, ['/3/movie/550'])
+
+    def test_expired_entry_is_refetched(self):
+        tmdb.movie_info(550)
+        TmdbMovieInfo.objects.update(fetched_at=timezone.now() - timezone.timedelta(days=30))
+        tmdb.movie_info(550)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_expired_entry_is_served_when_tmdb_is_down(self):
+        tmdb.movie_info(550)
+        TmdbMovieInfo.objects.update(fetched_at=timezone.now() - timezone.timedelta(days=30))
+        self.server.fail = True
+        with mock.patch.object(tmdb.refresh, 'delay') as refresh:
+            self.assertEqual(tmdb.movie_info(550)['title'], '영화 550')
+        refresh.assert_called_once_with(550)
+        # 갱신 작업은 재시도 후 실패 (eager 에서는 예외가 그대로 올라온다)
+        with self.assertLogs('BFS.tasks', 'ERROR'), self.assertRaises(requests.RequestException):
+            tmdb.refresh.delay(550)
+
+    @override_settings(TMDB_CACHE_MAX_ENTRIES=1, TMDB_CACHE_EVICT_EVERY=3)
+    def test_least_recently_used_entry_is_evicted(self):
+        tmdb._inserts.count = 0
+        # 정리는 새 항목을 3개 넣을 때마다 한 번
+        for movie_pk in (1, 2, 3):
+            with CaptureQueriesContext(connection) as queries:
+                tmdb.movie_info(movie_pk)
+            evicted = sum('OFFSET' in query['sql'] for query in queries)
+            self.assertEqual(evicted, movie_pk == 3)
+            if movie_pk < 3:
+                TmdbMovieInfo.objects.filter(pk=movie_pk).update(accessed_at=timezone.now() - timezone.timedelta(days=3 - movie_pk))
+                self.assertEqual(TmdbMovieInfo.objects.count(), movie_pk)
+        self.assertEqual(list(TmdbMovieInfo.objects.values_list('pk', flat=True)), [3])
+
+    def test_concurrent_fetches_are_deduplicated(self):
+        self.server.delay = 0.2
+        threads = [threading.Thread(target=tmdb._fetch, args=(550,)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests, ['/3/movie/550'])
+
+    def test_warm_tmdb_cache(self):
+        tmdb.movie_info(1)
+        call_command('warm_tmdb_cache', '1', '2', '3', stdout=StringIO())
+        self.assertEqual(TmdbMovieInfo.objects.count(), 3)
+        self.assertEqual(sorted(self.server.requests), ['/3/movie/1', '/3/movie/2', '/3/movie/3'])
+
+
+class AsyncViewTest(TransactionTestCase):
+    # ORM 호출이 sync_to_async 스레드에서 일어나므로 테스트 트랜잭션으로 감쌀 수 없다
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.server = StubTmdbServer(delay=0.1).__enter__()
+        self.addCleanup(self.server.__exit__)
+        settings_override = override_settings(TMDB_BASE_URL=self.server.base_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    async def test_concurrent_first_hits_share_one_tmdb_request(self):
+        client = AsyncClient()
+        responses = await asyncio.gather(*[client.get('/movies/async/550/') for _ in range(5)])
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['movie_serializer']['title'], '영화 550')
+        self.assertEqual(self.server.requests, ['/3/movie/550'])
+
+    async def test_matches_sync_view(self):
+        client = AsyncClient()
+        async_data = (await client.get('/movies/async/550/')).json()
+        sync_data = await sync_to_async(lambda: APIClient().get('/movies/550/').json())()
+        self.assertEqual(async_data, sync_data)
+
+    async def test_search_matches_sync_view_on_later_pages(self):
+        def create():
+            user = get_user_model().objects.create(username='user', nickname='nick')
+            movie = Movie.objects.create(pk=551, title='영화', poster_path='')
+            # TransactionTestCase 의 flush 는 검색 색인을 지우지 않으므로 signal 로 지운다
+            self.addCleanup(user.delete)
+            self.addCleanup(movie.delete)
+            for i in range(3):
+                Review.objects.create(user=user, movie=movie, content='비동기검색 ' * (i + 1), rating=3.0)
+
+        await sync_to_async(create)()
+        query = urlencode({'keyword': '비동기검색', 'page': 2, 'page_size': 1})
+        async_data = (await AsyncClient().get(f'/movies/async/search/?{query}')).json()
+        sync_data = await sync_to_async(lambda: APIClient().get(f'/movies/search/?{query}').json())()
+        self.assertEqual(async_data, sync_data)
+        self.assertEqual(async_data['page'], 2)
+        self.assertEqual(len(async_data['review_serializer']), 1)
+
+
+class RecommendTest(TestCase):
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}')
+            for i in range(4)
+        ]
+        self.movies = [
+            Movie.objects.create(pk=i, title=f'영화 {i}', poster_path='')
+            for i in range(1, 6)
+        ]
+
+    def like(self, user, *movie_pks):
+        for movie_pk in movie_pks:
+            add_like(Movie, movie_pk, user)
+
+    def test_build_neighbors_keeps_top_k(self):
+        self.like(self.users[0], 1, 2, 3, 4)
+        self.like(self.users[1], 1, 2)
+        self.assertEqual(build_neighbors(top_k=2), 4 * 2)
+        best = MovieNeighbor.objects.filter(movie_id=1).order_by('-score').first()
+        self.assertEqual(best.neighbor_id, 2)
+
+    def test_recommend_ranks_co_liked_movies(self):
+        self.like(self.users[0], 1, 2, 3)
+        self.like(self.users[1], 1, 2)
+        self.like(self.users[2], 1, 4)
+        self.like(self.users[3], 1)
+        build_neighbors()
+
+        ranked = [movie_pk for movie_pk, score in recommend(self.users[3])]
+        self.assertEqual(ranked, [2, 3, 4])
+
+    def test_genre_preference_breaks_ties(self):
+        self.like(self.users[0], 1, 2, 3)
+        self.like(self.users[3], 1)
+        build_neighbors()
+        TmdbMovieInfo.objects.create(
+            movie_id=3, data={'genres': [{'id': 27, 'name': '공포'}]},
+            fetched_at=timezone.now(), accessed_at=timezone.now(),
+            )
+        self.users[3].add_movie_to_genre_preference(99, ['27'])
+
+        ranked = [movie_pk for movie_pk, score in recommend(self.users[3])]
+        self.assertEqual(ranked, [3, 2])
+
+    def test_recommend_endpoint(self):
+        self.like(self.users[0], 1, 2)
+        self.like(self.users[1], 1)
+        build_neighbors()
+        client = APIClient()
+        client.force_authenticate(self.users[1])
+        response = client.get('/movies/recommend/')
+        self.assertEqual(response.json(), {'movies': [{'pk': 2, 'score': 1.0}]})
+
+    def test_recommend_endpoint_rejects_invalid_limit(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        for limit in ('0', '-5', 'ten'):
+            self.assertEqual(client.get(f'/movies/recommend/?limit={limit}').status_code, 400)
+        self.assertEqual(client.get('/movies/recommend/?limit=1000').status_code, 200)
+
+
+class SimilarityBatchTest(TestCase):
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}')
+            for i in range(3)
+        ]
+        for i in range(1, 7):
+            Movie.objects.create(pk=i, title=f'영화 {i}', poster_path='')
+        add_like(Movie, 1, self.users[0])
+        add_like(Movie, 2, self.users[0])
+        add_like(Movie, 2, self.users[1])
+        Review.objects.create(user=self.users[1], movie_id=3, content='', rating=5.0)
+        collection = Collection.objects.create(user=self.users[2], title='', content='')
+        collection.movies.add(1, 4)
+
+    def neighbors(self):
+        return {
+            (movie_id, neighbor_id): round(score, 6)
+            for movie_id, neighbor_id, score in MovieNeighbor.objects.values_list('movie_id', 'neighbor_id', 'score')
+        }
+
+    def test_combines_likes_reviews_and_collections(self):
+        build_neighbors()
+        pairs = set(self.neighbors())
+        self.assertEqual(pairs, {(1, 2), (2, 1), (2, 3), (3, 2), (1, 4), (4, 1)})
+
+    def test_chunked_result_matches(self):
+        build_neighbors()
+        expected = self.neighbors()
+        build_neighbors(chunk_size=1, batch_size=1)
+        self.assertEqual(self.neighbors(), expected)
+
+    def test_incremental_refresh_matches_rebuild(self):
+        build_neighbors(top_k=2)
+        add_like(Movie, 5, self.users[0])
+        Review.objects.create(user=self.users[2], movie_id=6, content='', rating=4.0)
+        self.assertGreater(refresh(top_k=2), 0)
+        refreshed = self.neighbors()
+
+        build_neighbors(top_k=2)
+        self.assertEqual(refreshed, self.neighbors())
+
+    def test_refresh_matches_rebuild_after_score_decrease(self):
+        users = [
+            get_user_model().objects.create(username=f'other{i}', nickname=f'other{i}')
+            for i in range(4)
+        ]
+        for i in range(7, 10):
+            Movie.objects.create(pk=i, title=f'영화 {i}', poster_path='')
+        add_like(Movie, 7, users[0])
+        add_like(Movie, 8, users[0])
+        add_like(Movie, 8, users[1])
+        add_like(Movie, 9, users[1])
+        build_neighbors(top_k=1)
+        self.assertEqual(self.neighbors()[8, 7], round(0.5 ** 0.5, 6))
+
+        # 7 의 좋아요가 늘어 (8, 7) 점수가 (8, 9) 보다 낮아지면 8 의 이웃은 9 로 바뀌어야 한다
+        add_like(Movie, 7, users[2])
+        add_like(Movie, 7, users[3])
+        refresh(top_k=1)
+        refreshed = self.neighbors()
+        self.assertIn((8, 9), refreshed)
+
+        build_neighbors(top_k=1)
+        self.assertEqual(refreshed, self.neighbors())
+
+    def test_refresh_reads_only_related_activity(self):
+        build_neighbors()
+        add_like(Movie, 5, self.users[0])
+        with mock.patch('movies.similarity.load_interactions', wraps=load_interactions) as load:
+            refresh()
+        self.assertTrue(all(call.kwargs.keys() & {'users', 'movies'} for call in load.call_args_list))
+
+    def test_refresh_without_new_activity(self):
+        build_neighbors()
+        self.assertEqual(refresh(), 0)
+
+
+class SearchTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        Movie.objects.create(pk=680, title='펄프 픽션', poster_path='')
+        self.reviews = [
+            Review.objects.create(user=self.user, movie=self.movie, content=content, rating=4.0)
+            for content in ('클럽 장면이 좋았다', '배우들의 연기가 좋았다', '클럽 클럽 클럽 영화를 다시 보고 싶다')
+        ]
+        self.collection = Collection.objects.create(user=self.user, title='클럽 영화 모음', content='')
+
+    def search(self, keyword, **params):
+        response = self.client.get('/movies/search/', {'keyword': keyword, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranked_results(self):
+        data = self.search('클럽')
+        self.assertEqual(
+            [review['pk'] for review in data['review_serializer']],
+            [self.reviews[2].pk, self.reviews[0].pk],
+        )
+        self.assertEqual([c['pk'] for c in data['collection_serializer']], [self.collection.pk])
+        self.assertEqual([m['pk'] for m in data['movie_serializer']], [550])
+
+    def test_prefix_match(self):
+        data = self.search('영화')  # '영화를'
+        self.assertEqual([review['pk'] for review in data['review_serializer']], [self.reviews[2].pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        review = self.reviews[1]
+        review.content = '클럽'
+        review.save()
+        self.assertIn(review.pk, [r['pk'] for r in self.search('클럽')['review_serializer']])
+        review.delete()
+        self.assertNotIn(review.pk, [r['pk'] for r in self.search('클럽')['review_serializer']])
+
+    def test_pagination(self):
+        first = self.search('클럽', page_size=1)
+        second = self.search('클럽', page_size=1, page=2)
+        self.assertEqual([r['pk'] for r in first['review_serializer']], [self.reviews[2].pk])
+        self.assertEqual([r['pk'] for r in second['review_serializer']], [self.reviews[0].pk])
+        self.assertEqual(second['page'], 2)
+
+    def test_empty_keyword(self):
+        data = self.search('')
+        self.assertEqual(data['review_serializer'], [])
+        self.assertEqual(self.search('"*')['review_serializer'], [])
+
+    def test_rebuild_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM movies_search_index')
+        self.assertEqual(self.search('클럽')['review_serializer'], [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('클럽')['review_serializer']), 2)
+
+    def test_icontains_backend(self):
+        backend = search_index.IContainsBackend()
+        self.assertEqual(backend.search('review', '클럽', 0, 10), [self.reviews[2].pk, self.reviews[0].pk])
+        self.assertEqual(backend.search('movie', '펄프', 0, 10), [680])
+
+    def test_default_backend_per_database(self):
+        self.addCleanup(setattr, search_index, '_backend', None)
+        for vendor, backend in (
+            ('sqlite', search_index.SQLiteFTS5Backend),
+            ('postgresql', search_index.PostgresSearchBackend),
+            ('mysql', search_index.IContainsBackend),
+        ):
+            search_index._backend = None
+            with mock.patch.object(connection, 'vendor', vendor):
+                self.assertIs(type(search_index.get_backend()), backend)
+        self.assertEqual(search_index.PostgresSearchBackend.match_expression("클럽 '영화"), "'클럽':* & '영화':*")
+
+
+class CollectionBulkTest(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Movie.objects.create(pk=1, title='이미 있는 영화', poster_path='/old.jpg')
+
+    def movie_infos(self, pks):
+        return [[pk, f'/{pk}.jpg', f'영화 {pk}'] for pk in pks]
+
+    def create(self, pks):
+        data = {'title': '모음', 'content': '내용', 'movie_infos': self.movie_infos(pks)}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/movies/collection/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(context)
+
+    def test_query_count_does_not_grow_with_movies(self):
+        _, small = self.create(range(1, 4))
+        data, large = self.create(range(1, 201))
+        self.assertEqual(small, large)
+        self.assertEqual(data['movies'], list(range(1, 201)))
+        self.assertEqual(Movie.objects.count(), 200)
+        self.assertEqual(Movie.objects.get(pk=1).title, '이미 있는 영화')
+
+    def test_new_movies_are_searchable(self):
+        self.create([2, 3])
+        self.assertCountEqual(search_index.search('movie', '영화'), [1, 2, 3])
+
+    def test_update_applies_membership_diff(self):
+        data, _ = self.create([1, 2, 3])
+        collection = Collection.objects.get(pk=data['pk'])
+        through = Collection.movies.through
+        kept = through.objects.get(collection=collection, movie_id=2).pk
+
+        response = self.client.put(
+            f'/movies/collection/{collection.pk}/',
+            {'title': '새 제목', 'content': '내용', 'movie_infos': self.movie_infos([2, 4])},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()['movies']), [2, 4])
+        self.assertEqual(through.objects.get(collection=collection, movie_id=2).pk, kept)
+        collection.refresh_from_db()
+        self.assertEqual(collection.title, '새 제목')
+
+    def test_invalid_collection_rolls_back_movies(self):
+        data = {'content': '내용', 'movie_infos': self.movie_infos([7, 8])}  # title 누락
+        response = self.client.post('/movies/collection/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Movie.objects.filter(pk__in=[7, 8]).exists())
+
+
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        response_cache.stats.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.client.force_authenticate(self.user)
+        self.movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        self.review = Review.objects.create(user=self.user, movie=self.movie, content='리뷰', rating=4.0)
+        self.collection = Collection.objects.create(user=self.user, title='모음', content='내용')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(context)
+
+    def test_second_read_skips_database(self):
+        # ETag validator 쿼리 + liked_by_me 조회 (force_authenticate 라 인증 쿼리는 없다)
+        for url, expected in (
+            ('/movies/550/', 2),
+            (f'/movies/review/{self.review.pk}/', 2),
+            (f'/movies/review/{self.review.pk}/comment/', 1),
+            (f'/movies/collection/{self.collection.pk}/', 2),
+            (f'/movies/collection/{self.collection.pk}/comment/', 1),
+        ):
+            first, _ = self.get(url)
+            second, queries = self.get(url)
+            self.assertEqual(first, second)
+            self.assertEqual(queries, expected, url)
+
+        stats = response_cache.stats.snapshot()
+        self.assertEqual(stats['movie'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_comment_invalidates_review_and_movie(self):
+        self.get(f'/movies/review/{self.review.pk}/')
+        self.get('/movies/550/')
+        self.client.post(f'/movies/review/{self.review.pk}/comment/', {'content': '댓글'})
+        review, _ = self.get(f'/movies/review/{self.review.pk}/')
+        movie, _ = self.get('/movies/550/')
+        self.assertEqual(review['comment_count'], 1)
+        self.assertEqual(movie['reviews'][0]['comment_count'], 1)
+
+    def test_like_invalidates(self):
+        self.get(f'/movies/collection/{self.collection.pk}/')
+        self.client.post(f'/movies/collection/{self.collection.pk}/like')
+        data, _ = self.get(f'/movies/collection/{self.collection.pk}/')
+        self.assertEqual(data['like_count'], 1)
+
+        self.get('/movies/550/')
+        self.user.like_movies.add(self.movie)  # m2m_changed
+        data, _ = self.get('/movies/550/')
+        self.assertEqual(data['movie_serializer']['like_count'], 0)  # like_count 를 거치지 않은 변경
+        self.assertTrue(data['movie_serializer']['liked_by_me'])
+
+    def test_nickname_change_invalidates_authored_entries(self):
+        other = get_user_model().objects.create(username='other', nickname='other')
+        ReviewComment.objects.create(user=other, review=self.review, content='댓글')
+        CollectionComment.objects.create(user=other, collection=self.collection, content='댓글')
+        urls = [
+            '/movies/550/', f'/movies/review/{self.review.pk}/', f'/movies/review/{self.review.pk}/comment/',
+            f'/movies/collection/{self.collection.pk}/', f'/movies/collection/{self.collection.pk}/comment/',
+        ]
+        for url in urls:
+            self.get(url)
+        other.nickname = 'renamed'
+        other.save()
+        for url in urls:
+            self.assertIn('renamed', json.dumps(self.get(url)[0], ensure_ascii=False), url)
+
+    def test_save_without_author_change_keeps_entries(self):
+        self.get(f'/movies/review/{self.review.pk}/')
+        self.user.save(update_fields=['last_login'])
+        self.user.set_password('password')
+        with self.assertNumQueries(1):
+            self.user.save()
+        _, queries = self.get(f'/movies/review/{self.review.pk}/')
+        self.assertEqual(queries, 2)
+
+    def test_unrelated_write_keeps_entry(self):
+        other = Collection.objects.create(user=self.user, title='다른 모음', content='내용')
+        self.get(f'/movies/collection/{self.collection.pk}/')
+        CollectionComment.objects.create(user=self.user, collection=other, content='댓글')
+        _, queries = self.get(f'/movies/collection/{self.collection.pk}/')
+        self.assertEqual(queries, 2)
+
+    def test_stale_build_is_not_served(self):
+        # 무효화 전에 읽은 값이 무효화 후에 저장되어도 새 버전에서는 보이지 않는다
+        def build():
+            self.review.content = '수정'
+            self.review.save()
+            return {'content': '리뷰'}
+
+        response_cache.cached('review', self.review.pk, build)
+        data, _ = self.get(f'/movies/review/{self.review.pk}/')
+        self.assertEqual(data['content'], '수정')
+
+    def test_stats_requires_admin(self):
+        self.assertEqual(self.client.get('/movies/cache/stats/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/movies/cache/stats/').status_code, 200)
+
+
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.client.force_authenticate(self.user)
+        self.movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        self.review = Review.objects.create(user=self.user, movie=self.movie, content='리뷰', rating=4.0)
+        self.collection = Collection.objects.create(user=self.user, title='모음', content='내용')
+        self.urls = [
+            '/movies/550/', f'/movies/review/{self.review.pk}/', f'/movies/review/{self.review.pk}/comment/',
+            f'/movies/collection/{self.collection.pk}/', f'/movies/collection/{self.collection.pk}/comment/',
+        ]
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified_skips_serializer(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertIn('ETag', response)
+            response_cache.get_cache().clear()
+            with CaptureQueriesContext(connection) as context:
+                not_modified = self.revalidate(url, response['ETag'])
+            self.assertEqual(not_modified.status_code, 304, url)
+            self.assertEqual(len(context), 1)  # validator 쿼리만
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_last_modified(self):
+        response = self.client.get(f'/movies/review/{self.review.pk}/')
+        self.review.refresh_from_db()
+        self.assertEqual(response['Last-Modified'], http_date(self.review.updated_at.timestamp()))
+
+    def assertChanges(self, url, change):
+        etag = self.client.get(url)['ETag']
+        change()
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_likes_change_etag(self):
+        other = get_user_model().objects.create(username='other', nickname='other')
+        add_like(Review, self.review.pk, self.user)
+        url = f'/movies/review/{self.review.pk}/'
+        # 좋아요 수는 같아도 누른 사람이 바뀌면 다른 ETag
+        self.assertChanges(url, lambda: (remove_like(Review, self.review.pk, self.user), add_like(Review, self.review.pk, other)))
+        self.assertChanges('/movies/550/', lambda: add_like(Movie, 550, other))
+
+    def test_comments_change_etag(self):
+        self.assertChanges(
+            f'/movies/collection/{self.collection.pk}/comment/',
+            lambda: CollectionComment.objects.create(user=self.user, collection=self.collection, content='댓글'),
+        )
+        self.assertChanges(
+            '/movies/550/',
+            lambda: ReviewComment.objects.create(user=self.user, review=self.review, content='댓글'),
+        )
+
+    def test_author_nickname_changes_etag(self):
+        ReviewComment.objects.create(user=self.user, review=self.review, content='댓글')
+        CollectionComment.objects.create(user=self.user, collection=self.collection, content='댓글')
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.assertEqual(self.client.put(f'/accounts/profile/{self.user.pk}/', {'nickname': 'new'}).status_code, 200)
+        for url, etag in etags.items():
+            response = self.revalidate(url, etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etag, url)
+
+    def test_collection_movies_change_etag(self):
+        self.assertChanges(f'/movies/collection/{self.collection.pk}/', lambda: self.collection.set_movies([550]))
+
+    def test_if_modified_since_alone_is_ignored(self):
+        response = self.client.get(f'/movies/review/{self.review.pk}/')
+        response = self.client.get(f'/movies/review/{self.review.pk}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+
+class DatabaseConfigTest(TestCase):
+
+    def file_connection(self, tmp, **settings_dict):
+        default = connections['default']
+        return default.__class__({**default.settings_dict, 'NAME': os.path.join(tmp, 'db.sqlite3'), **settings_dict})
+
+    def test_sqlite_connections_use_wal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wrapper = self.file_connection(tmp)
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], 20000)
+            finally:
+                wrapper.close()
+
+    def test_registered_by_project_app(self):
+        # movies 앱이 아니라 BFS 앱(BFS.apps.BFSConfig)이 연결 설정을 건다
+        self.assertEqual(apps.get_app_config('BFS').name, 'BFS')
+        self.assertIn(db.configure_sqlite, [receiver() for _, receiver in connection_created.receivers])
+
+    def test_broken_persistent_connection_is_closed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wrapper = self.file_connection(tmp, CONN_MAX_AGE=60)
+            wrapper.ensure_connection()
+            with mock.patch('BFS.db.connections') as connections, mock.patch.object(wrapper, 'is_usable', return_value=False):
+                connections.all.return_value = [wrapper]
+                db.check_connections()
+            self.assertIsNone(wrapper.connection)
+
+
+class LikeStateRepresentationTest(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.client = APIClient()
+        self.users = [get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}') for i in range(3)]
+        self.client.force_authenticate(self.users[0])
+        self.collections = [
+            Collection.objects.create(user=self.users[0], title=f'모음 {i}', content='내용') for i in range(3)
+        ]
+        for user in self.users:
+            add_like(Collection, self.collections[0].pk, user)
+        add_like(Collection, self.collections[1].pk, self.users[1])
+
+    def test_compact_list(self):
+        with CaptureQueriesContext(connection) as context:
+            results = self.client.get('/movies/collection/').json()['results']
+        self.assertEqual(len(context), 2)  # 컬렉션(+ liked_by_me, 작성자), 담긴 영화 / like_users 는 불러오지 않는다
+        states = {item['pk']: (item['like_count'], item['liked_by_me']) for item in results}
+        self.assertEqual(states, {
+            self.collections[0].pk: (3, True),
+            self.collections[1].pk: (1, False),
+            self.collections[2].pk: (0, False),
+        })
+        self.assertNotIn('like_users', results[0])
+
+    def test_full_like_users_opt_in(self):
+        results = self.client.get('/movies/collection/?like_users=full').json()['results']
+        like_users = {item['pk']: sorted(item['like_users']) for item in results}
+        self.assertEqual(like_users[self.collections[0].pk], [user.pk for user in self.users])
+
+    def test_cached_detail_is_per_user(self):
+        url = f'/movies/collection/{self.collections[1].pk}/'
+        self.assertFalse(self.client.get(url).json()['liked_by_me'])
+        self.client.force_authenticate(self.users[1])
+        data = self.client.get(url).json()
+        self.assertTrue(data['liked_by_me'])
+        self.assertNotIn('like_users', data)
+        self.assertEqual(self.client.get(url, {'like_users': 'full'}).json()['like_users'], [self.users[1].pk])
+
+    def test_etag_differs_per_user(self):
+        url = f'/movies/collection/{self.collections[1].pk}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(self.users[1])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CommentThreadTest(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.client.force_authenticate(self.user)
+        self.movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        self.reviews = [
+            Review.objects.create(user=self.user, movie=self.movie, content='리뷰', rating=4.0) for _ in range(2)
+        ]
+        self.collection = Collection.objects.create(user=self.user, title='모음', content='내용')
+        self.review_comments = [
+            ReviewComment.objects.create(user=self.user, review=self.reviews[0], content=f'댓글 {i}') for i in range(7)
+        ]
+        ReviewComment.objects.create(user=self.user, review=self.reviews[1], content='다른 리뷰 댓글')
+        self.collection_comments = [
+            CollectionComment.objects.create(user=self.user, collection=self.collection, content=f'댓글 {i}')
+            for i in range(7)
+        ]
+
+    def walk(self, url):
+        pks = []
+        while url:
+            data = self.client.get(url).json()
+            pks.extend(comment['pk'] for comment in data['results'])
+            url = data['next']
+        return pks
+
+    def test_detail_embeds_newest_comments(self):
+        newest = [comment.pk for comment in reversed(self.review_comments)][:COMMENT_PREVIEW_SIZE]
+        review = self.client.get(f'/movies/review/{self.reviews[0].pk}/').json()
+        self.assertEqual([comment['pk'] for comment in review['reviewcomment_set']], newest)
+        self.assertEqual(review['comment_count'], 7)
+
+        collection = self.client.get(f'/movies/collection/{self.collection.pk}/').json()
+        self.assertEqual(len(collection['collectioncomment_set']), COMMENT_PREVIEW_SIZE)
+        self.assertEqual(collection['collectioncomment_set'][0]['pk'], self.collection_comments[-1].pk)
+        self.assertEqual(collection['comment_count'], 7)
+
+    def test_list_embeds_newest_comments_per_review(self):
+        results = self.client.get('/movies/review/').json()['results']
+        embedded = {review['pk']: [comment['pk'] for comment in review['reviewcomment_set']] for review in results}
+        self.assertEqual(embedded[self.reviews[0].pk], [comment.pk for comment in reversed(self.review_comments)][:COMMENT_PREVIEW_SIZE])
+        self.assertEqual(len(embedded[self.reviews[1].pk]), 1)
+
+    def test_newest_is_one_query_per_page(self):
+        with self.assertNumQueries(1):
+            comments = list(ReviewComment.objects.newest([review.pk for review in self.reviews]))
+        newest = [comment.pk for comment in reversed(self.review_comments)][:COMMENT_PREVIEW_SIZE]
+        self.assertEqual(
+            [comment.pk for comment in comments if comment.review_id == self.reviews[0].pk], newest,
+        )
+        self.assertEqual(len(comments), COMMENT_PREVIEW_SIZE + 1)
+        self.assertFalse(ReviewComment.objects.newest([]).exists())
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite EXPLAIN QUERY PLAN 형식')
+    def test_newest_reads_each_review_through_index(self):
+        # 리뷰마다 인덱스에서 LIMIT 만큼만 읽는 독립 쿼리 (댓글 행마다 다시 실행되는 상관 서브쿼리가 아니다)
+        sql, params = ReviewComment.objects.newest([review.pk for review in self.reviews]).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('movies_review_comment_idx', plan)
+        self.assertNotIn('CORRELATED', plan)
+
+    def test_attach_newest_comments(self):
+        reviews = attach_newest_comments(Review.objects.filter(pk__in=[review.pk for review in self.reviews]).iterator())
+        previews = {review.pk: [comment.pk for comment in review.newest_comments] for review in reviews}
+        self.assertEqual(previews[self.reviews[0].pk], [comment.pk for comment in reversed(self.review_comments)][:COMMENT_PREVIEW_SIZE])
+        self.assertEqual(len(previews[self.reviews[1].pk]), 1)
+
+    def test_list_with_full_like_users_embeds_newest_comments(self):
+        with CaptureQueriesContext(connection) as context:
+            results = self.client.get('/movies/review/?like_users=full').json()['results']
+        embedded = {review['pk']: [comment['pk'] for comment in review['reviewcomment_set']] for review in results}
+        self.assertEqual(embedded[self.reviews[0].pk], [comment.pk for comment in reversed(self.review_comments)][:COMMENT_PREVIEW_SIZE])
+        self.assertEqual(sum('UNION ALL' in query['sql'] for query in context.captured_queries), 1)
+
+    def test_comment_lists_are_paginated(self):
+        expected = [comment.pk for comment in reversed(self.review_comments)]
+        self.assertEqual(self.walk(f'/movies/review/{self.reviews[0].pk}/comment/?page_size=3'), expected)
+        # 캐시는 페이지마다 따로 저장된다
+        self.assertEqual(self.walk(f'/movies/review/{self.reviews[0].pk}/comment/?page_size=3'), expected)
+
+        expected = [comment.pk for comment in reversed(self.collection_comments)]
+        self.assertEqual(self.walk(f'/movies/collection/{self.collection.pk}/comment/?page_size=3'), expected)
+
+    def test_cached_comment_page_marks_liked_by_me(self):
+        add_like(CollectionComment, self.collection_comments[-1].pk, self.user)
+        url = f'/movies/collection/{self.collection.pk}/comment/?page_size=2'
+        self.client.get(url)
+        other = get_user_model().objects.create(username='other', nickname='other')
+        self.client.force_authenticate(other)
+        self.assertFalse(self.client.get(url).json()['results'][0]['liked_by_me'])
+        self.client.force_authenticate(self.user)
+        self.assertTrue(self.client.get(url).json()['results'][0]['liked_by_me'])
+
+    def test_new_comment_shows_on_first_page(self):
+        url = f'/movies/collection/{self.collection.pk}/comment/?page_size=2'
+        self.client.get(url)
+        response = self.client.post(f'/movies/collection/{self.collection.pk}/comment/', {'content': '새 댓글'})
+        self.assertEqual(self.client.get(url).json()['results'][0]['pk'], response.json()['pk'])
+
+    def test_page_query_count_is_constant(self):
+        url = f'/movies/review/{self.reviews[0].pk}/comment/?page_size=3'
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for i in range(50):
+            ReviewComment.objects.create(user=self.user, review=self.reviews[0], content=f'추가 {i}')
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url)
+        self.assertEqual(len(small), len(large))
+
+
+class FeedTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}') for i in range(3)]
+        self.reader, self.author, self.stranger = self.users
+        self.client.force_authenticate(self.reader)
+        self.movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='/poster.jpg')
+
+    def follow(self, method='put'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(f'/accounts/follow/{self.author.pk}/').json()
+
+    def write_review(self, user, content='리뷰'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Review.objects.create(user=user, movie=self.movie, content=content, rating=4.0)
+
+    def feed(self):
+        return self.client.get('/movies/feed/').json()['results']
+
+    def test_followed_activity_is_fanned_out(self):
+        self.assertEqual(self.follow(), {'following': True, 'follower_count': 1})
+        review = self.write_review(self.author)
+        self.write_review(self.stranger)
+        with self.captureOnCommitCallbacks(execute=True):
+            add_like(Movie, self.movie.pk, self.author)
+            collection = Collection.objects.create(user=self.author, title='모음', content='내용')
+
+        entries = self.feed()
+        self.assertEqual(
+            [(entry['kind'], entry['object_id']) for entry in entries],
+            [('collection', collection.pk), ('like_movie', self.movie.pk), ('review', review.pk)],
+        )
+        self.assertEqual(entries[2]['data']['movie_title'], '파이트 클럽')
+        self.assertEqual(entries[2]['actor']['pk'], self.author.pk)
+
+    def test_unlike_edit_and_delete_update_timelines(self):
+        self.follow()
+        review = self.write_review(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            add_like(Movie, self.movie.pk, self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            remove_like(Movie, self.movie.pk, self.author)
+            review.content = '수정한 리뷰'
+            review.save()
+        entries = self.feed()
+        self.assertEqual([entry['kind'] for entry in entries], ['review'])
+        self.assertEqual(entries[0]['data']['content'], '수정한 리뷰')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        self.assertEqual(self.feed(), [])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        reviews = [self.write_review(self.author, f'리뷰 {i}') for i in range(2)]
+        self.follow()
+        self.assertEqual([entry['object_id'] for entry in self.feed()], [review.pk for review in reversed(reviews)])
+        self.assertEqual(self.follow('post'), {'following': False, 'follower_count': 0})
+        self.assertEqual(self.feed(), [])
+
+    def test_cannot_follow_self(self):
+        self.assertEqual(self.client.put(f'/accounts/follow/{self.reader.pk}/').status_code, 400)
+
+    @override_settings(FEED_MAX_ENTRIES=3)
+    def test_timeline_is_capped(self):
+        self.follow()
+        reviews = [self.write_review(self.author, f'리뷰 {i}') for i in range(5)]
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 3)
+        self.assertEqual([entry['object_id'] for entry in self.feed()], [review.pk for review in reversed(reviews)][:3])
+
+    def test_feed_is_single_query(self):
+        self.follow()
+        for i in range(5):
+            self.write_review(self.author, f'리뷰 {i}')
+        with self.assertNumQueries(1):
+            self.client.get('/movies/feed/')
+
+    def test_rebuild(self):
+        self.follow()
+        self.write_review(self.author)
+        TimelineEntry.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_timelines', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'entries: 1')
+        self.assertEqual(len(self.feed()), 1)
+
+
+@override_settings(TASK_RUNNER='thread')
+class FeedWorkerTest(TransactionTestCase):
+
+    def test_fan_out_runs_on_task_runner(self):
+        # 테스트 DB(공유 캐시 in-memory SQLite)는 동시에 쓰면 잠기므로 한 트랜잭션으로 쓰고 커밋 후 worker 를 기다린다
+        with transaction.atomic():
+            reader, author = [get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}') for i in range(2)]
+            reader.like_users.add(author)
+            movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+            for i in range(10):
+                Review.objects.create(user=author, movie=movie, content=f'리뷰 {i}', rating=4.0)
+        tasks.get_runner().join()
+        self.assertEqual(TimelineEntry.objects.filter(owner=reader, kind='review').count(), 10)
+
+
+class InstrumentationTest(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        metrics.registry.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.client.force_authenticate(self.user)
+        movie = Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        Review.objects.create(user=self.user, movie=movie, content='리뷰', rating=4.0)
+
+    def scrape(self):
+        with override_settings(METRICS_TOKEN='metrics-token'):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer metrics-token')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def value(self, text, name, **labels):
+        prefix = name + metrics._labels(**labels) + ' '
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        self.fail(f'{prefix} 없음')
+
+    def test_records_per_view_metrics(self):
+        queries = []
+        # 요청 시작 때 connection.queries 가 비워지므로 CaptureQueriesContext 대신 직접 센다
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            response = self.client.get('/movies/review/')
+        text = self.scrape()
+        labels = {'view': 'movies/review/', 'method': 'GET'}
+        self.assertEqual(self.value(text, 'bfs_requests_total', **labels, status=200), 1)
+        self.assertEqual(self.value(text, 'bfs_db_queries_total', **labels), len(queries))
+        self.assertGreater(len(queries), 0)
+        self.assertEqual(self.value(text, 'bfs_response_bytes_total', **labels), len(response.content))
+        self.assertGreater(self.value(text, 'bfs_serializer_seconds_total', **labels), 0)
+        self.assertEqual(self.value(text, 'bfs_request_duration_seconds_count', **labels), 1)
+        self.assertEqual(self.value(text, 'bfs_n_plus_one_requests_total', **labels), 0)
+
+    def test_flags_repeated_queries(self):
+        def view(request):
+            for _ in range(6):
+                list(Movie.objects.filter(pk=550))
+            return HttpResponse('ok')
+
+        middleware = metrics.InstrumentationMiddleware(view)
+        with self.assertLogs('BFS.metrics', 'WARNING') as logs:
+            middleware(RequestFactory().get('/movies/'))
+        self.assertIn('repeated queries', logs.output[0])
+        self.assertIn('6x SELECT', logs.output[0])
+        text = metrics.registry.render()
+        labels = {'view': 'unmatched', 'method': 'GET'}
+        self.assertEqual(self.value(text, 'bfs_duplicate_queries_total', **labels), 5)
+        self.assertEqual(self.value(text, 'bfs_n_plus_one_requests_total', **labels), 1)
+
+    def test_slow_request_log_is_sampled(self):
+        with override_settings(SLOW_REQUEST_MS=0), self.assertLogs('BFS.metrics', 'WARNING') as logs:
+            self.client.get('/movies/review/')
+        self.assertIn('slow request GET /movies/review/ (movies/review/) 200', logs.output[0])
+        with override_settings(SLOW_REQUEST_MS=0, SLOW_REQUEST_SAMPLE_RATE=0), self.assertNoLogs('BFS.metrics'):
+            self.client.get('/movies/review/')
+
+    def test_metrics_endpoint_is_restricted(self):
+        # 프록시 뒤에서는 모든 요청이 127.0.0.1 에서 오므로 주소로는 열지 않는다
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 404)
+        with override_settings(METRICS_TOKEN='metrics-token'):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer metrics-token').status_code, 200)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 404)
+
+    def test_does_not_patch_drf(self):
+        # timed_serializer 로 감싼 getter 에만 __wrapped__ 가 있다
+        self.assertFalse(hasattr(BaseSerializer.data.fget, '__wrapped__'))
+        self.assertFalse(hasattr(ListSerializer.data.fget, '__wrapped__'))
+        self.assertTrue(hasattr(type(ReviewSerializer()).data.fget, '__wrapped__'))
+        self.assertTrue(hasattr(type(ReviewCommentSerializer(many=True)).data.fget, '__wrapped__'))
+
+    @override_settings(INSTRUMENTATION=False)
+    def test_can_be_turned_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            metrics.InstrumentationMiddleware(lambda request: HttpResponse())
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/movies/review/').status_code, 200)
+        self.assertEqual(client.get('/metrics').status_code, 404)
+        self.assertEqual(metrics.registry.requests, {})
+
+
+class FastRowsTest(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.users = [get_user_model().objects.create(username=f'user{i}', nickname=f'nick{i}') for i in range(3)]
+        self.movies = [Movie.objects.create(pk=pk, title=f'영화 {pk}', poster_path='') for pk in (550, 13, 680)]
+        for i, user in enumerate(self.users):
+            review = Review.objects.create(user=user, movie=self.movies[i], content=f'리뷰 {i}', rating=4.5 - i)
+            for commenter in self.users[:i + 2]:
+                comment = ReviewComment.objects.create(user=commenter, review=review, content='댓글\u2028')
+                add_like(ReviewComment, comment.pk, user)
+            collection = Collection.objects.create(user=user, title=f'모음 {i}', content='내용')
+            collection.set_movies([movie.pk for movie in reversed(self.movies[i:])])
+            CollectionComment.objects.create(user=user, collection=collection, content='댓글')
+            Bookmark.objects.create(user=user, movie=self.movies[i], content='북마크')
+            add_like(Movie, self.movies[0].pk, user)
+            add_like(Collection, collection.pk, self.users[0])
+            add_like(Review, review.pk, self.users[1])
+
+    def assertSameAsSerializer(self, rows_class, queryset):
+        queryset = queryset.with_like_state(self.users[0]) if hasattr(queryset, 'with_like_state') else queryset
+        expected = rows_class.serializer_class(queryset.order_by('pk'), many=True).data
+        actual = rows_class(rows_class.values(queryset).order_by('pk'), many=True).data
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_rows_match_serializers(self):
+        self.assertSameAsSerializer(rows.MovieRows, Movie.objects.for_list())
+        self.assertSameAsSerializer(rows.ReviewListRows, Review.objects.for_list())
+        self.assertSameAsSerializer(rows.ReviewCommentRows, ReviewComment.objects.for_list())
+        self.assertSameAsSerializer(rows.CollectionListRows, Collection.objects.for_list())
+        self.assertSameAsSerializer(rows.CollectionCommentRows, CollectionComment.objects.for_list())
+        self.assertSameAsSerializer(rows.BookmarkRows, Bookmark.objects.all())
+
+    def test_list_query_count(self):
+        client = APIClient()
+        with self.assertNumQueries(2):  # 리뷰(+ 작성자, 댓글 수), 최신 댓글
+            results = client.get('/movies/review/?page_size=2').json()['results']
+        self.assertEqual([review['pk'] for review in results], [3, 2])
+        self.assertEqual(len(results[0]['reviewcomment_set']), COMMENT_PREVIEW_SIZE)
+        with self.assertNumQueries(2):  # 컬렉션(+ 작성자, 댓글 수, liked_by_me), 담긴 영화
+            results = client.get('/movies/collection/').json()['results']
+        self.assertEqual(results[-1]['movies'], [13, 550, 680])
+
+    def test_cursor_walks_values_rows(self):
+        client = APIClient()
+        url, pks = '/movies/review/?page_size=1', []
+        while url:
+            data = client.get(url).json()
+            pks += [review['pk'] for review in data['results']]
+            url = data['next']
+        self.assertEqual(pks, [3, 2, 1])
+        previous = client.get(client.get('/movies/review/?page_size=1').json()['next']).json()['previous']
+        self.assertEqual([review['pk'] for review in client.get(previous).json()['results']], [3])
+
+
+class FastJSONRendererTest(TestCase):
+    data = {
+        'text': '한글 \u2028 "따옴표"',
+        'time': timezone.now(),
+        'error': ErrorDetail('오류', code='invalid'),
+        'nested': [{'pk': 1, 'rating': 4.5, 'flag': None}],
+        1: 'int key',
+    }
+
+    def test_same_output_as_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch('BFS.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_indent_uses_json_renderer(self):
+        rendered = FastJSONRenderer().render({'pk': 1}, 'application/json; indent=2')
+        self.assertEqual(rendered, b'{\n  "pk": 1\n}')
+
+
+class ImportDataTest(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='user', nickname='nick')
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def run_import(self, kind, path, *args):
+        out = StringIO()
+        call_command('import_data', kind, path, '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_jsonl_and_csv(self):
+        movies = self.write('movies.jsonl', '\n'.join([
+            '{"id": 550, "title": "파이트 클럽", "poster_path": "/fc.jpg"}',
+            '{"id": 680, "original_title": "Pulp Fiction"}',
+            '{"id": "잘못된 pk", "title": "?"}',
+        ]) + '\n')
+        out = self.run_import('movie', movies)
+        self.assertIn('movie: 3 rows, 1 skipped', out)
+        self.assertEqual(Movie.objects.get(pk=680).title, 'Pulp Fiction')
+
+        reviews = self.write('reviews.csv', (
+            'id,user_id,movie_id,content,rating,created_at,movie_title\n'
+            f'10,{self.user.pk},550,클럽 장면이 좋았다,4.5,2020-01-02T03:04:05+00:00,\n'
+            f'11,{self.user.pk},13,다시 보고 싶다,3.0,2020-01-03 00:00:00,포레스트 검프\n'
+            f'12,{self.user.pk},999,없는 영화,1.0,,\n'
+            f'13,12345,550,없는 유저,1.0,,\n'
+        ))
+        out = self.run_import('review', reviews)
+        self.assertIn('review: 4 rows, 2 skipped', out)
+        self.assertEqual(set(Review.objects.values_list('pk', flat=True)), {10, 11})
+        review = Review.objects.get(pk=10)
+        self.assertEqual(review.created_at.isoformat(), '2020-01-02T03:04:05+00:00')
+        self.assertEqual(review.updated_at, review.created_at)
+        self.assertEqual(Movie.objects.get(pk=13).title, '포레스트 검프')
+        self.assertEqual(search_index.get_backend().search('review', '클럽', 0, 10), [10])
+        self.assertFalse(os.path.exists(f'{reviews}.checkpoint'))
+
+        # 다시 넣어도 중복되지 않는다
+        self.run_import('review', reviews)
+        self.assertEqual(Review.objects.count(), 2)
+
+    def test_existing_rows_are_not_reindexed(self):
+        Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        Review.objects.create(pk=1, user=self.user, movie_id=550, content='original words', rating=3.0)
+        path = self.write('reviews.jsonl', (
+            f'{{"id": 1, "user_id": {self.user.pk}, "movie_id": 550, "content": "zebra", "rating": 1.0}}\n'
+            f'{{"id": 2, "user_id": {self.user.pk}, "movie_id": 550, "content": "zebra", "rating": 1.0}}\n'
+            f'{{"id": 2, "user_id": {self.user.pk}, "movie_id": 550, "content": "giraffe", "rating": 1.0}}\n'
+        ))
+        self.run_import('review', path)
+        self.assertEqual(Review.objects.get(pk=1).content, 'original words')
+        backend = search_index.get_backend()
+        self.assertEqual(backend.search('review', 'original', 0, 10), [1])
+        self.assertEqual(backend.search('review', 'zebra', 0, 10), [2])
+        self.assertEqual(backend.search('review', 'giraffe', 0, 10), [])
+
+    def test_timestamps_are_kept_without_touching_auto_now(self):
+        Movie.objects.create(pk=550, title='파이트 클럽', poster_path='')
+        path = self.write('reviews.jsonl', (
+            f'{{"id": 1, "user_id": {self.user.pk}, "movie_id": 550, "content": "a", "rating": 1.0, '
+            f'"created_at": "2019-05-01T00:00:00+00:00", "updated_at": "2019-06-01T00:00:00+00:00"}}\n'
+        ))
+        fields = [Review._meta.get_field('created_at'), Review._meta.get_field('updated_at')]
+        bulk_create = Review.objects.bulk_create
+
+        def check_flags(*args, **kwargs):
+            # 필드 객체는 프로세스 전체가 함께 쓰므로 가져오는 중에도 auto_now 를 바꾸지 않는다
+            self.assertEqual([(field.auto_now_add, field.auto_now) for field in fields], [(True, False), (False, True)])
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(Review.objects, 'bulk_create', side_effect=check_flags) as patched:
+            self.run_import('review', path)
+        patched.assert_called_once()
+        review = Review.objects.get(pk=1)
+        self.assertEqual(review.created_at.isoformat(), '2019-05-01T00:00:00+00:00')
+        self.assertEqual(review.updated_at.isoformat(), '2019-06-01T00:00:00+00:00')
+
+    def test_reviews_and_movie_likes_update_preferences(self):
+        Movie.objects.bulk_create([Movie(pk=pk, title=f'영화 {pk}', poster_path='') for pk in (550, 13)])
+        reviews = self.write('reviews.csv', (
+            'id,user_id,movie_id,content,rating,genre_ids\n'
+            f'1,{self.user.pk},550,리뷰,4.5,"18,53"\n'
+        ))
+        likes = self.write('likes.jsonl', (
+            f'{{"user_id": {self.user.pk}, "movie_id": 550, "genre_ids": [18]}}\n'
+            f'{{"user_id": {self.user.pk}, "movie_id": 13}}\n'
+        ))
+        for _ in range(2):  # 다시 넣어도 두 번 반영하지 않는다
+            self.run_import('review', reviews)
+            self.run_import('movie_like', likes)
+        self.assertEqual(self.user.watched_movies_dict, {'550': 2, '13': 1})
+        # 리뷰 4.5 점은 8, 좋아요는 10 (accounts.models._priority)
+        self.assertEqual(self.user.genre_preference, {'18': 18, '53': 8})
+
+    def test_resume_from_checkpoint(self):
+        path = self.write('movies.jsonl', ''.join(f'{{"id": {pk}, "title": "영화 {pk}"}}\n' for pk in range(1, 6)))
+        self.write('movies.jsonl.checkpoint', '{"kind": "movie", "done": 3}')
+        out = self.run_import('movie', path)
+        self.assertIn('3 행 다음부터', out)
+        self.assertEqual(list(Movie.objects.order_by('pk').values_list('pk', flat=True)), [4, 5])
+
+        self.write('movies.jsonl.checkpoint', '{"kind": "review", "done": 3}')
+        with self.assertRaises(CommandError):
+            self.run_import('movie', path)
+        self.run_import('movie', path, '--restart')
+        self.assertEqual(Movie.objects.count(), 5)
+
+    def test_collections_and_likes(self):
+        Movie.objects.bulk_create([Movie(pk=pk, title=f'영화 {pk}', poster_path='') for pk in (1, 2)])
+        other = get_user_model().objects.create(username='other', nickname='other')
+        collections = self.write('collections.jsonl', (
+            f'{{"id": 7, "user_id": {self.user.pk}, "title": "모음", "content": "", "movies": [1, 2, 3]}}\n'
+        ))
+        self.run_import('collection', collections)
+        self.assertEqual(sorted(Collection.objects.get(pk=7).movies.values_list('pk', flat=True)), [1, 2])
+
+        likes = self.write('likes.csv', (
+            'user_id,object_id\n'
+            f'{self.user.pk},7\n{other.pk},7\n{other.pk},7\n{other.pk},8\n'
+        ))
+        self.run_import('collection_like', likes)
+        self.assertEqual(Collection.objects.get(pk=7).like_count, 2)
+        self.assertEqual(Collection.objects.get(pk=7).like_users.count(), 2)
@@ -0,0 +1,232 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import requests
+import tmdbsimple as tmdb
+from BFS.tasks import task
+from .models import TmdbMovieInfo
+
+
+# LRU 순서를 위한 accessed_at 갱신은 이 간격마다 한 번만 (읽을 때마다 쓰지 않도록)
+TOUCH_INTERVAL = timezone.timedelta(hours=1)
+
+
+class TimeoutSession(requests.Session):
+    '''
+    tmdbsimple 은 timeout 을 넘기지 않으므로 세션에서 기본값을 채워준다.
+    '''
+    def request(self, *args, **kwargs):
+        kwargs.setdefault('timeout', settings.TMDB_TIMEOUT)
+        return super().request(*args, **kwargs)
+
+
+tmdb.API_KEY = settings.TMDB_API_KEY
+tmdb.REQUESTS_SESSION = TimeoutSession()
+
+
+class SingleFlight:
+    '''
+    같은 key 로 동시에 들어온 호출은 하나만 실행하고 나머지는 그 결과를 기다려 같이 받는다.
+    do() 는 (결과, 다른 호출의 결과를 받았는지) 를 반환
+    '''
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = self.Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, False
+
+
+_flight = SingleFlight()
+
+
+class InsertCounter:
+    '''
+    캐시에 새로 넣은 항목 수를 세다가 every 개가 쌓일 때마다 add() 가 True 를 반환한다. (프로세스 단위)
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def add(self, count, every):
+        with self.lock:
+            self.count += count
+            if self.count < every:
+                return False
+            self.count = 0
+            return True
+
+
+_inserts = InsertCounter()
+
+
+def fetch_movie_info(movie_pk):
+    '''
+    캐시를 거치지 않고 TMDB 에서 바로 받아온다.
+    '''
+    movie = tmdb.Movies(movie_pk)
+    movie.base_uri = settings.TMDB_BASE_URL
+    return movie.info(language=settings.TMDB_LANGUAGE)
+
+
+def is_fresh(entry, now):
+    return now - entry.fetched_at < settings.TMDB_CACHE_TTL
+
+
+def store(infos, existing=()):
+    '''
+    {movie_pk: info} 를 캐시에 저장, existing 은 이미 캐시에 행이 있는 movie_pk
+    '''
+    now = timezone.now()
+    entries = [
+        TmdbMovieInfo(movie_id=movie_pk, data=data, fetched_at=now, accessed_at=now)
+        for movie_pk, data in infos.items()
+    ]
+    updated = [entry for entry in entries if entry.pk in existing]
+    created = [entry for entry in entries if entry.pk not in existing]
+    with transaction.atomic():
+        TmdbMovieInfo.objects.bulk_update(updated, ['data', 'fetched_at', 'accessed_at'])
+        # 다른 요청이 먼저 저장했다면 그쪽 값을 그대로 둔다
+        TmdbMovieInfo.objects.bulk_create(created, ignore_conflicts=True)
+    # 정리 쿼리는 TMDB_CACHE_EVICT_EVERY 개를 넣을 때마다 한 번, 요청 처리 후에
+    # (그 사이 프로세스마다 최대 TMDB_CACHE_EVICT_EVERY 개까지 TMDB_CACHE_MAX_ENTRIES 를 넘을 수 있다)
+    if created and _inserts.add(len(created), settings.TMDB_CACHE_EVICT_EVERY):
+        evict.delay()
+
+
+@task()
+def evict(max_entries=None):
+    '''
+    max_entries 를 넘는 만큼 가장 오래 사용하지 않은 항목부터 지운다.
+    '''
+    if max_entries is None:
+        max_entries = settings.TMDB_CACHE_MAX_ENTRIES
+    cutoff = (
+        TmdbMovieInfo.objects.order_by('-accessed_at')
+        .values_list('accessed_at', flat=True)[max_entries:max_entries + 1]
+    )
+    cutoff = list(cutoff)
+    if not cutoff:
+        return 0
+    deleted, _ = TmdbMovieInfo.objects.filter(accessed_at__lte=cutoff[0]).delete()
+    return deleted
+
+
+def _touch(entries, now):
+    stale = [entry.pk for entry in entries if now - entry.accessed_at >= TOUCH_INTERVAL]
+    if stale:
+        TmdbMovieInfo.objects.filter(pk__in=stale).update(accessed_at=now)
+
+
+def _fetch(movie_pk):
+    '''
+    (info, 다른 스레드가 받아온 결과인지)
+    '''
+    return _flight.do(movie_pk, lambda: fetch_movie_info(movie_pk))
+
+
+def lookup(movie_pk):
+    '''
+    (신선한 캐시 값 또는 None, 캐시 행 또는 None)
+    '''
+    now = timezone.now()
+    entry = TmdbMovieInfo.objects.filter(movie_id=movie_pk).first()
+    if entry is not None and is_fresh(entry, now):
+        _touch([entry], now)
+        return entry.data, entry
+    return None, entry
+
+
+@task(ordered_by='movie_pk')
+def refresh(movie_pk):
+    '''
+    만료된 캐시 항목을 다시 받아온다. (요청 처리 후 BFS.tasks 에서, 실패하면 재시도)
+    '''
+    data, entry = lookup(movie_pk)
+    if data is not None:  # 앞서 넣은 갱신 작업이 이미 받아왔다
+        return
+    data, shared = _fetch(movie_pk)
+    if not shared:
+        store({movie_pk: data}, existing={movie_pk} if entry is not None else ())
+
+
+def movie_info(movie_pk):
+    '''
+    TMDB movie info, 캐시에 있으면 캐시에서 반환
+    만료된 항목은 기다리지 않고 그대로 반환하고 갱신은 refresh 작업으로 미룬다. (TMDB 장애 중에도 만료된 값을 준다)
+    '''
+    data, entry = lookup(movie_pk)
+    if data is not None:
+        return data
+    if entry is not None:
+        refresh.delay(movie_pk)
+        return entry.data
+
+    data, shared = _fetch(movie_pk)
+    if not shared:
+        store({movie_pk: data})
+    return data
+
+
+def movie_infos(movie_pks, workers=8):
+    '''
+    여러 영화의 TMDB movie info 를 {movie_pk: info} 로 반환, 받아오지 못한 영화는 빠진다.
+    캐시는 한 번의 쿼리로 확인하고, 없거나 만료된 것만 workers 개씩 동시에 받아온다.
+    (DB 는 호출한 스레드에서만 사용)
+    '''
+    now = timezone.now()
+    movie_pks = set(movie_pks)
+    entries = {entry.pk: entry for entry in TmdbMovieInfo.objects.filter(movie_id__in=movie_pks)}
+    fresh = [entry for entry in entries.values() if is_fresh(entry, now)]
+    _touch(fresh, now)
+    infos = {entry.pk: entry.data for entry in fresh}
+
+    def fetch(movie_pk):
+        try:
+            return movie_pk, _fetch(movie_pk)[0]
+        except requests.RequestException:
+            return movie_pk, None
+
+    missing = [movie_pk for movie_pk in movie_pks if movie_pk not in infos]
+    if missing:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = dict(executor.map(fetch, missing))
+        store(
+            {movie_pk: data for movie_pk, data in fetched.items() if data is not None},
+            existing=entries.keys(),
+            )
+        for movie_pk, data in fetched.items():
+            if data is not None:
+                infos[movie_pk] = data
+            elif movie_pk in entries:
+                infos[movie_pk] = entries[movie_pk].data
+    return infos
@@ -0,0 +1,74 @@
+import asyncio
+import weakref
+from asgiref.sync import sync_to_async
+from django.conf import settings
+import httpx
+from . import tmdb
+
+
+class AsyncTmdbClient:
+    '''
+    이벤트 루프 하나에서 공유하는 TMDB 클라이언트
+
+    연결은 httpx 커넥션 풀로 재사용하고, 동시에 나가는 요청 수는 TMDB_MAX_CONCURRENCY 로 제한하며,
+    같은 영화에 대한 동시 요청은 하나의 요청 결과를 같이 기다린다.
+    '''
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            base_url=settings.TMDB_BASE_URL,
+            timeout=settings.TMDB_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.TMDB_MAX_CONCURRENCY,
+                max_keepalive_connections=settings.TMDB_MAX_CONCURRENCY,
+                ),
+            )
+        self.semaphore = asyncio.Semaphore(settings.TMDB_MAX_CONCURRENCY)
+        self.inflight = {}
+
+    async def fetch_movie_info(self, movie_pk):
+        async with self.semaphore:
+            response = await self.client.get(
+                f'/movie/{movie_pk}',
+                params={'api_key': settings.TMDB_API_KEY, 'language': settings.TMDB_LANGUAGE},
+                )
+        response.raise_for_status()
+        return response.json()
+
+    async def _load(self, movie_pk, cached):
+        data = await self.fetch_movie_info(movie_pk)
+        await sync_to_async(tmdb.store)({movie_pk: data}, existing={movie_pk} if cached else ())
+        return data
+
+    async def movie_info(self, movie_pk):
+        '''
+        movies.tmdb.movie_info 의 async 버전
+        '''
+        data, entry = await sync_to_async(tmdb.lookup)(movie_pk)
+        if data is not None:
+            return data
+
+        task = self.inflight.get(movie_pk)
+        if task is None:
+            task = self.inflight[movie_pk] = asyncio.ensure_future(self._load(movie_pk, entry is not None))
+            task.add_done_callback(lambda _: self.inflight.pop(movie_pk, None))
+        try:
+            # 기다리던 요청 하나가 취소되어도 다른 요청이 같이 기다리는 작업은 계속 진행
+            return await asyncio.shield(task)
+        except httpx.HTTPError:
+            if entry is None:
+                raise
+            return entry.data  # TMDB 장애 시 만료된 캐시라도 돌려준다
+
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    '''
+    현재 이벤트 루프의 AsyncTmdbClient (httpx 클라이언트는 루프를 넘나들 수 없으므로 루프마다 하나)
+    '''
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncTmdbClient()
+    return client
@@ -0,0 +1,67 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubTmdbServer:
+    '''
+    테스트/벤치마크용 로컬 TMDB 서버, GET /3/movie/<id> 에 가짜 movie info 를 돌려준다.
+
+        with StubTmdbServer(delay=0.2) as server:
+            settings.TMDB_BASE_URL = server.base_url
+    '''
+    path_pattern = re.compile(r'^/3/movie/(\d+)$')
+
+    def __init__(self, delay=0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                stub.requests.append(path)
+                if stub.delay:
+                    time.sleep(stub.delay)
+                match = stub.path_pattern.match(path)
+                if stub.fail or match is None:
+                    self.send_response(503 if stub.fail else 404)
+                    self.end_headers()
+                    return
+                body = json.dumps(stub.movie(int(match.group(1)))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+
+    @staticmethod
+    def movie(movie_pk):
+        return {
+            'id': movie_pk,
+            'title': f'영화 {movie_pk}',
+            'poster_path': f'/{movie_pk}.jpg',
+            'genres': [{'id': 18, 'name': '드라마'}],
+        }
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/3'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
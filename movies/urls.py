@@ -1,11 +1,14 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 
 urlpatterns = [
     path('<int:movie_pk>/', views.movie_detail),
-    path('<int:movie_pk>/like/', views.movie_like),  # 영화 좋아요
+    path('<int:movie_pk>/like/', views.movie_like),  # 영화 좋아요 (POST 토글, PUT 좋아요, DELETE 취소, 다른 좋아요도 같다)
     path('<int:movie_pk>/like/only/', views.movie_like_only),  # 영화 무조건 좋아요만
+    path('recommend/', views.movie_recommend),  # 로그인한 유저 맞춤 추천
+    path('likes/', views.like_state),  # 여러 영화/리뷰/컬렉션/댓글의 좋아요 여부와 좋아요 수
+    path('feed/', views.feed),  # 팔로우한 유저의 활동 피드
 
     path('review/', views.review_list),
     path('<int:movie_pk>/review/', views.review_create),
@@ -15,6 +18,7 @@ urlpatterns = [
 
     path('review/<int:review_pk>/comment/', views.review_comment_list_create),
     path('review/comment/<int:comment_pk>/', views.review_comment_detail),
+    path('review/comment/<int:comment_pk>/like/', views.review_comment_like),
 
     path('collection/', views.collection_list_create),
     path('collection/<int:collection_pk>/', views.collection_detail),
@@ -24,6 +28,11 @@ urlpatterns = [
     path('collection/comment/<int:comment_pk>/', views.collection_comment_detail),
     path('collection/comment/<int:comment_pk>/like/', views.collection_comment_like),
 
-    # path('search/', views.search),
+    path('search/', views.search),
+    path('cache/stats/', views.cache_stats),  # 응답 캐시 hit/miss (관리자)
+
+    # ASGI 용 async 뷰 (movies.async_views)
+    path('async/<int:movie_pk>/', async_views.movie_detail),
+    path('async/search/', async_views.search),
     # path('<int:movie_pk>/bookmark/', views.bookmark_create),  # 해당 영화에 해당 유저가 작성한 북마크 반환 & 북마크 생성
 ]
\ No newline at end of file
@@ -1,62 +1,134 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
-from django.http.response import JsonResponse
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
-from .models import Bookmark, Movie, Review, ReviewComment, Collection, CollectionComment   
+from accounts import tasks
+from .models import Bookmark, Movie, Review, ReviewComment, Collection, CollectionComment, TimelineEntry, attach_newest_comments
+from .cache import cached
+from .conditional import conditional
+from .likes import add_like, like_states, liked_pks, remove_like, toggle_like
+from .pagination import paginate, paginate_data
+from .recommend import recommend
+from .rows import CollectionListRows, MovieRows, ReviewListRows
 from .serializers import (
     CollectionCommentSerializer, 
     ReviewListSerializer, 
     ReviewSerializer, 
     ReviewCommentSerializer, 
-    CollectionListSerializer, 
     CollectionSerializer,
     MovieSerializer,
-    BookmarkSerializer
+    BookmarkSerializer,
+    TimelineEntrySerializer,
+    full_like_users,
     )
-import tmdbsimple as tmdb
+from . import cache
+from . import search as search_index
+from . import tmdb
 
 
-tmdb.API_KEY = 'YOUR_API_KEY_HERE'
+def create_movie(movie_pk, tmdb_movie_info):
+    # 같은 영화에 대한 첫 요청이 동시에 들어와도 한 행만 생기도록 pk 로만 조회
+    movie, created = Movie.objects.get_or_create(
+        pk=movie_pk,
+        defaults={
+            'title': tmdb_movie_info['title'],
+            'poster_path': tmdb_movie_info['poster_path'] or '',
+        },
+        )
+    return movie
 
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def movie_detail(request, movie_pk):
-    if not Movie.objects.filter(pk=movie_pk):
-        tmdb_movie_info = tmdb.Movies(movie_pk).info(language='ko')
-        title = tmdb_movie_info['title']
-        poster_path = tmdb_movie_info['poster_path']
-
-        movie, created = Movie.objects.get_or_create(
-            pk=movie_pk, 
-            title=title, 
-            poster_path = poster_path
-            )
-    else:
-        movie = Movie.objects.get(pk=movie_pk)
+def create_movies(movie_infos):
+    '''
+    [[movie_pk, poster_path, title], ...] 중 DB 에 없는 영화를 한 번에 추가하고 movie_pk 목록을 반환
+    '''
+    movies = {}
+    for movie_pk, poster_path, title in movie_infos:
+        movies.setdefault(int(movie_pk), Movie(pk=int(movie_pk), title=title, poster_path=poster_path or ''))
+    created = Movie.objects.create_missing(list(movies.values()))
+    search_index.get_backend().index_many('movie', created)
+    return list(movies)
 
-    reviews = Review.objects.filter(movie_id=movie_pk).all()
-    reviews_serializer = ReviewListSerializer(reviews, many=True)
-    movie_serializer = MovieSerializer(movie)
 
-    movie_info = {
-        'pk': movie_pk,
+def movie_detail_data(movie, request=None):
+    reviews = ReviewListRows.values(Review.objects.filter(movie_id=movie.pk).for_list())
+    reviews_serializer = ReviewListRows(reviews, many=True)
+    movie_serializer = MovieSerializer(movie, context={'request': request})
+
+    return {
+        'pk': movie.pk,
         'reviews': reviews_serializer.data,
         'movie_serializer': movie_serializer.data
     }
-    return JsonResponse(movie_info)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@conditional('movie', 'movie_pk')
+def movie_detail(request, movie_pk):
+    def build(request):
+        movie = Movie.objects.filter(pk=movie_pk).first()
+        if movie is None:
+            movie = create_movie(movie_pk, tmdb.movie_info(movie_pk))
+        return movie_detail_data(movie, request)
+
+    def mark(request, data):
+        mark_liked(request, [data['movie_serializer']], Movie)
+
+    return Response(cached_with_like_state(request, 'movie', movie_pk, build, mark))
+
+
+def like_user(request):
+    return request.user if request is not None else None
+
+
+def mark_liked(request, items, model):
+    '''
+    캐시한 (유저와 무관한) 직렬화 결과에 요청한 유저의 liked_by_me 를 채운다. (쿼리 한 번)
+    캐시에서 꺼낸 값은 매번 새로 만든 객체라 바로 고쳐도 된다.
+    '''
+    liked = liked_pks(model, [item['pk'] for item in items], request.user)
+    for item in items:
+        item['liked_by_me'] = item['pk'] in liked
+
+
+def cached_with_like_state(request, resource, pk, build, mark, variant=''):
+    '''
+    build(None) 결과를 캐시하고 liked_by_me 는 mark(request, data) 로 요청마다 채운다.
+    ?like_users=full 이면 캐시를 거치지 않고 build(request)
+    '''
+    if full_like_users(request):
+        return build(request)
+    data = cached(resource, pk, lambda: build(None), variant)
+    mark(request, data)
+    return data
+
+
+def comment_page(request):
+    '''
+    댓글 목록 캐시 variant, 페이지를 정하는 cursor 와 page_size
+    '''
+    return f"{request.GET.get('cursor', '')}|{request.GET.get('page_size', '')}"
+
+
+@api_view(['GET'])
+def feed(request):
+    '''
+    팔로우한 유저의 최근 리뷰, 컬렉션, 좋아요 (movies.feed 가 미리 채워 둔 타임라인을 인덱스 순서대로 읽는다)
+    '''
+    entries = TimelineEntry.objects.filter(owner=request.user).select_related('actor')
+    return paginate(request, entries, TimelineEntrySerializer)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def review_list(request):
-    reviews = Review.objects.all().order_by('-created_at')
-    serializer = ReviewListSerializer(reviews, many=True)
-    return Response(serializer.data)
+    reviews = Review.objects.for_list()
+    return paginate(request, reviews, ReviewListRows)
 
 
 @api_view(['GET'])
@@ -65,8 +137,8 @@ def user_review(request, movie_pk, user_pk):
     해당 유저가 작성한 해당 영화의 리뷰 반환
     '''
     user = get_object_or_404(get_user_model(), pk=user_pk)
-    if user.review_set.filter(movie=movie_pk).exists():
-        user_review = user.review_set.get(movie=movie_pk)
+    user_review = Review.objects.for_list().filter(user=user, movie=movie_pk).first()
+    if user_review is not None:
         serializer = ReviewListSerializer(user_review)
         return Response(serializer.data)
     return Response(None)
@@ -78,8 +150,8 @@ def user_reviews(request, user_pk):
     '''
     해당 유저가 작성한 모든 리뷰 반환
     '''
-    reviews = Review.objects.filter(user_id=user_pk).annotate(comment_count=Count('reviewcomment'))
-    serializer = ReviewListSerializer(reviews, many=True)
+    reviews = ReviewListRows.values(Review.objects.filter(user_id=user_pk).for_list())
+    serializer = ReviewListRows(reviews, many=True)
     return Response(serializer.data)
 
 
@@ -89,60 +161,49 @@ def review_create(request, movie_pk):
     poster_path = request.data['poster_path']
     genre_list = request.data['genre_list']
 
-    movie, created = Movie.objects.get_or_create(
-        pk=movie_pk,
-        title=movie_title,
-        poster_path = poster_path
-        )
+    # 리뷰가 참조하므로 영화는 바로 만들고, 시청 기록/선호도는 응답 후에 갱신
+    movie = create_movie(movie_pk, {'title': movie_title, 'poster_path': poster_path})
     
     serializer = ReviewSerializer(data=request.data)
     if serializer.is_valid(raise_exception=True):
         rating = request.data['rating']
-        user = get_object_or_404(get_user_model(), pk=request.user.pk)
-        user.add_movie_to_watched(movie_pk = movie_pk)
-        user.add_movie_to_genre_preference(movie_pk = movie_pk, genre_list = genre_list, star_rating = rating)
-        user.save()
-
         serializer.save(user=request.user, movie=movie)
+        tasks.add_watched_movie.delay(request.user.pk, movie.pk, genre_list, star_rating=rating)
         return Response(serializer.data)
 
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AllowAny])
+@conditional('review', 'review_pk')
 def review_detail(request, review_pk):
-    review = get_object_or_404(Review, pk=review_pk)
-
     if request.method == 'GET':
-        serializer = ReviewSerializer(review)
-        return Response(serializer.data)
+        def build(request):
+            reviews = Review.objects.with_counts().with_like_state(like_user(request), full_like_users(request))
+            return ReviewSerializer(get_object_or_404(reviews, pk=review_pk), context={'request': request}).data
+
+        def mark(request, data):
+            mark_liked(request, [data], Review)
+
+        return Response(cached_with_like_state(request, 'review', review_pk, build, mark))
+
+    review = get_object_or_404(Review, pk=review_pk)
 
     if request.method == 'PUT':
         original_rating = review.rating 
         serializer = ReviewSerializer(review, data=request.data)
         if serializer.is_valid(raise_exception=True):
             updated_rating = request.data['rating']
+            serializer.save()
             if original_rating != updated_rating:
-                user = get_object_or_404(get_user_model(), pk=request.user.pk)
-                user.update_movie_to_genre_preference(
-                    movie_pk = review.movie.pk,
-                    genre_list = request.data['genre_list'],
-                    original_rating = original_rating,
-                    updated_rating = updated_rating,
+                tasks.update_movie_rating.delay(
+                    request.user.pk, review.movie_id, request.data['genre_list'], original_rating, updated_rating,
                     )
-                user.save()
-            serializer.save()
             return Response(serializer.data)
     
     if request.method == 'DELETE':
-        user = get_object_or_404(get_user_model(), pk=request.user.pk)
-        user.delete_movie_from_watched(movie_pk = review.movie.pk)
-        user.delete_movie_from_genre_preference(
-            movie_pk = review.movie.pk, 
-            genre_list = request.data['genre_list'], 
-            star_rating = review.rating
+        tasks.remove_watched_movie.delay(
+            request.user.pk, review.movie_id, request.data['genre_list'], star_rating=review.rating,
             )
-        user.save()
-
         review.delete()
         data = {
             'delete': f'{review_pk}번 리뷰가 삭제되었습니다.'
@@ -152,11 +213,14 @@ def review_detail(request, review_pk):
 
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
+@conditional('review_comments', 'review_pk')
 def review_comment_list_create(request, review_pk):
     if request.method == 'GET':
-        review_comments = ReviewComment.objects.filter(review_id=review_pk)
-        serializer = ReviewCommentSerializer(review_comments, many=True)
-        return Response(serializer.data)
+        def build():
+            review_comments = ReviewComment.objects.filter(review_id=review_pk).for_list()
+            return paginate_data(request, review_comments, ReviewCommentSerializer)
+
+        return Response(cached('review_comments', review_pk, build, comment_page(request)))
 
     if request.method == 'POST':
         review = get_object_or_404(Review, pk=review_pk)
@@ -192,45 +256,55 @@ def review_comment_detail(request, comment_pk):
 @permission_classes([AllowAny])
 def collection_list_create(request):
     if request.method == 'GET':
-        collections = Collection.objects.all()
-        serializer = CollectionListSerializer(collections, many=True)
-        return Response(serializer.data)
+        collections = Collection.objects.for_list().with_like_state(request.user, full_like_users(request))
+        return paginate(request, collections, CollectionListRows.for_request(request))
 
     if request.method == 'POST':
-        print('creating collection')
         movie_infos = request.data.pop('movie_infos')
         if not movie_infos:
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        movie_pks = []
-        for movie_pk, poster_path, title in movie_infos:
-            movie_pks.append(movie_pk)
-            movie = Movie.objects.get_or_create(pk=movie_pk, title=title, poster_path = poster_path)
-        request.data['movie_pks'] = movie_pks
 
-        serializer = CollectionSerializer(data=request.data)
         user = get_object_or_404(get_user_model(), pk=request.user.pk)
-        if serializer.is_valid(raise_exception=True):
-            serializer.save(user=user)
-            return Response(serializer.data)
+        with transaction.atomic():
+            request.data['movie_pks'] = create_movies(movie_infos)
+            serializer = CollectionSerializer(data=request.data)
+            if serializer.is_valid(raise_exception=True):
+                serializer.save(user=user)
+        return Response(serializer.data)
 
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AllowAny])
+@conditional('collection', 'collection_pk')
 def collection_detail(request, collection_pk):
-    collection = get_object_or_404(Collection, pk=collection_pk)
-
     if request.method == 'GET':
-        serializer = CollectionSerializer(collection)
-        return Response(serializer.data)
+        def build(request):
+            user, full = like_user(request), full_like_users(request)
+            comments = CollectionComment.objects.for_list().with_like_state(user, full)
+            collections = Collection.objects.with_counts().with_like_state(user, full)
+            collection, = attach_newest_comments([get_object_or_404(collections, pk=collection_pk)], comments)
+            return CollectionSerializer(collection, context={'request': request}).data
+
+        def mark(request, data):
+            mark_liked(request, [data], Collection)
+            mark_liked(request, data['collectioncomment_set'], CollectionComment)
+
+        return Response(cached_with_like_state(request, 'collection', collection_pk, build, mark))
+
+    collection = get_object_or_404(Collection, pk=collection_pk)
 
     if collection.user != request.user:
         return Response({'detail': '권한이 없습니다'}, status=status.HTTP_403_FORBIDDEN)
 
     if request.method == 'PUT':
-        serializer = CollectionSerializer(collection, data=request.data)
-        if serializer.is_valid(raise_exception=True):
-            serializer.save()
-            return Response(serializer.data)
+        with transaction.atomic():
+            movie_infos = request.data.pop('movie_infos', None)
+            if movie_infos:
+                request.data['movie_pks'] = create_movies(movie_infos)
+            serializer = CollectionSerializer(collection, data=request.data)
+            if serializer.is_valid(raise_exception=True):
+                serializer.save()
+        return Response(serializer.data)
     
     if request.method == 'DELETE':
         collection.delete()
@@ -242,11 +316,22 @@ def collection_detail(request, collection_pk):
 
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
+@conditional('collection_comments', 'collection_pk')
 def collection_comment_list_create(request, collection_pk):
     if request.method == 'GET':
-        collection_comments = CollectionComment.objects.filter(collection_id=collection_pk)
-        serializer = CollectionCommentSerializer(collection_comments, many=True)
-        return Response(serializer.data)
+        def build(like_request):
+            collection_comments = (
+                CollectionComment.objects.filter(collection_id=collection_pk).for_list()
+                .with_like_state(like_user(like_request), full_like_users(like_request))
+            )
+            return paginate_data(request, collection_comments, CollectionCommentSerializer)
+
+        def mark(request, data):
+            mark_liked(request, data['results'], CollectionComment)
+
+        return Response(cached_with_like_state(
+            request, 'collection_comments', collection_pk, build, mark, comment_page(request),
+        ))
 
     if request.method == 'POST':
         collection = get_object_or_404(Collection, pk=collection_pk)
@@ -278,40 +363,45 @@ def collection_comment_detail(request, comment_pk):
         return Response(data, status=status.HTTP_204_NO_CONTENT)
 
 
-@api_view(['POST'])
-def movie_like(request, movie_pk):
-    user = get_object_or_404(get_user_model(), pk=request.user.pk)
-
-    title = request.data['title']
-    poster_path = request.data['poster_path']
-    movie, created = Movie.objects.get_or_create(
-        pk=movie_pk,
-        title=title,
-        poster_path = poster_path)
-
-    genre_list = request.data['movie_genre']
+def set_like(request, model, pk):
+    '''
+    POST: 토글, PUT: 좋아요 (idempotent), DELETE: 좋아요 취소 (idempotent)
+    (상태가 바뀌었는지, 좋아요 여부, 좋아요 수)
+    '''
+    try:
+        if request.method == 'PUT':
+            changed, like_count = add_like(model, pk, request.user)
+            return changed, True, like_count
+        if request.method == 'DELETE':
+            changed, like_count = remove_like(model, pk, request.user)
+            return changed, False, like_count
+        return toggle_like(model, pk, request.user)
+    except model.DoesNotExist:
+        raise Http404
+
+
+def like_response(liked, like_count):
+    data = {
+        'like': liked,
+        'like_count': like_count
+    }
+    return Response(data, status=status.HTTP_200_OK)
 
-    if movie.like_users.filter(pk=request.user.pk).exists(): 
-        movie.like_users.remove(request.user)  # 좋아요 취소
-        user.delete_movie_from_genre_preference(movie_pk = movie_pk, genre_list = genre_list)
-        user.delete_movie_from_watched(movie_pk = movie_pk)
-        user.save()
 
-        data = {
-            'like': False,
-            'like_count': movie.like_users.count()
-        }
-    else:
-        movie.like_users.add(request.user)  # 좋아요 하기
-        user.add_movie_to_genre_preference(movie_pk = movie_pk, genre_list = genre_list)
-        user.add_movie_to_watched(movie_pk = movie_pk)
-        user.save()
+@api_view(['POST', 'PUT', 'DELETE'])
+def movie_like(request, movie_pk):
+    # 처음 보는 영화면 요청에 담긴 정보로 만든다 (POST 는 필수)
+    if request.method == 'POST' or 'title' in request.data:
+        create_movie(movie_pk, {'title': request.data['title'], 'poster_path': request.data['poster_path']})
+    genre_list = request.data.get('movie_genre', request.data.get('genre_list', []))
 
-        data = {
-            'like': True,
-            'like_count': movie.like_users.count()
-        }
-    return Response(data, status=status.HTTP_200_OK)
+    changed, liked, like_count = set_like(request, Movie, movie_pk)
+    if changed:  # 재시도로 같은 요청이 다시 와도 선호도는 한 번만 반영
+        if liked:
+            tasks.add_watched_movie.delay(request.user.pk, movie_pk, genre_list)
+        else:
+            tasks.remove_watched_movie.delay(request.user.pk, movie_pk, genre_list)
+    return like_response(liked, like_count)
 
 
 @api_view(['POST'])
@@ -321,98 +411,159 @@ def movie_like_only(request, movie_pk):
     movie_poster_path = request.data['poster_path']
     movie_pk = request.data['pk']
 
-    movie, created = Movie.objects.get_or_create(
-        pk=movie_pk, 
-        title=movie_title, 
-        poster_path = movie_poster_path)
-
-    if movie.like_users.filter(pk=request.user.pk).exists(): 
-        pass
-    else:
-        movie.like_users.add(request.user)  # 좋아요 하기
-        user = get_object_or_404(get_user_model(), pk=request.user.pk)
-        user.add_movie_to_genre_preference(movie_pk = movie_pk, genre_list = genre_list)
-        user.add_movie_to_watched(movie_pk = movie_pk)
-        user.save()
+    create_movie(movie_pk, {'title': movie_title, 'poster_path': movie_poster_path})
+
+    newly_liked, like_count = add_like(Movie, movie_pk, request.user)  # 좋아요 하기
+    if newly_liked:
+        tasks.add_watched_movie.delay(request.user.pk, movie_pk, genre_list)
     return Response(status=status.HTTP_200_OK)
 
 
-@api_view(['POST'])
+@api_view(['POST', 'PUT', 'DELETE'])
 def review_like(request, review_pk):
-    review = get_object_or_404(Review, pk=review_pk)
+    _, liked, like_count = set_like(request, Review, review_pk)
+    return like_response(liked, like_count)
 
-    if review.like_users.filter(pk=request.user.pk).exists(): 
-        review.like_users.remove(request.user)  # 좋아요 취소
-        data = {
-            'like': False,
-            'like_count': review.like_users.count()
-        }
-    else:
-        review.like_users.add(request.user)  # 좋아요 하기
-        data = {
-            'like': True,
-            'like_count': review.like_users.count()
-        }
-    return Response(data, status=status.HTTP_200_OK)
 
+@api_view(['POST', 'PUT', 'DELETE'])
+def review_comment_like(request, comment_pk):
+    _, liked, like_count = set_like(request, ReviewComment, comment_pk)
+    return like_response(liked, like_count)
 
-@api_view(['POST'])
-def collection_like(request, collection_pk):
-    collection = get_object_or_404(Collection, pk=collection_pk)
 
-    if collection.like_users.filter(pk=request.user.pk).exists(): 
-        collection.like_users.remove(request.user)  # 좋아요 취소
-        data = {
-            'like': False,
-            'like_count': collection.like_users.count()
-        }
-    else:
-        collection.like_users.add(request.user)  # 좋아요 하기
-        data = {
-            'like': True,
-            'like_count': collection.like_users.count()
-        }
-    return Response(data, status=status.HTTP_200_OK)
+@api_view(['POST', 'PUT', 'DELETE'])
+def collection_like(request, collection_pk):
+    _, liked, like_count = set_like(request, Collection, collection_pk)
+    return like_response(liked, like_count)
 
 
-@api_view(['POST'])
+@api_view(['POST', 'PUT', 'DELETE'])
 def collection_comment_like(request, comment_pk):
+    _, liked, like_count = set_like(request, CollectionComment, comment_pk)
+    return like_response(liked, like_count)
 
-    collection_comment = get_object_or_404(CollectionComment, pk=comment_pk)
 
-    if collection_comment.like_users.filter(pk=request.user.pk).exists(): 
-        collection_comment.like_users.remove(request.user)  # 좋아요 취소
-        data = {
-            'like': False,
-            'like_count': collection_comment.like_users.count()
-        }
-    else:
-        collection_comment.like_users.add(request.user)  # 좋아요 하기
-        data = {
-            'like': True,
-            'like_count': collection_comment.like_users.count()
-        }
-    return Response(data, status=status.HTTP_200_OK)
+# like_state 에서 받는 종류
+LIKE_STATE_MODELS = {
+    'movie': Movie,
+    'review': Review,
+    'review_comment': ReviewComment,
+    'collection': Collection,
+    'collection_comment': CollectionComment,
+}
+LIKE_STATE_MAX_PKS = 300
 
 
 @api_view(['GET'])
-@permission_classes([AllowAny])
-def search(request):
-    keyword = request.GET.get('keyword')
-
-    reviews = Review.objects.filter(content__icontains=keyword)
-    review_serializer = ReviewListSerializer(reviews, many=True)
+def like_state(request):
+    '''
+    ?review=1,2,3&collection=4,5 처럼 종류별 pk 목록을 받아 로그인한 유저의 좋아요 여부와 좋아요 수를 반환
+    (종류마다 쿼리 한 번, 종류당 pk 는 LIKE_STATE_MAX_PKS 개까지)
+    '''
+    requested = {}
+    for kind in LIKE_STATE_MODELS:
+        values = request.query_params.get(kind)
+        if not values:
+            continue
+        try:
+            pks = {int(pk) for pk in values.split(',') if pk}
+        except ValueError:
+            return Response({'error': f'{kind} 는 쉼표로 구분한 정수여야 합니다.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(pks) > LIKE_STATE_MAX_PKS:
+            return Response({'error': f'{kind} 는 {LIKE_STATE_MAX_PKS}개까지 요청할 수 있습니다.'}, status=status.HTTP_400_BAD_REQUEST)
+        requested[kind] = pks
+
+    data = {}
+    for kind, pks in requested.items():
+        data[kind] = [
+            {'pk': pk, 'like': liked, 'like_count': like_count}
+            for pk, liked, like_count in like_states(LIKE_STATE_MODELS[kind], pks, request.user)
+        ]
+    return Response(data)
 
-    collections = Collection.objects.filter(
-        Q(title__icontains=keyword) | Q(content__icontains=keyword)
-    )
-    collection_serializer = CollectionListSerializer(collections, many=True)
 
-    search_results = {
-        'review_serializer': review_serializer.data,
-        'collection_serializer': collection_serializer.data
+@api_view(['GET'])
+def movie_recommend(request):
+    '''
+    로그인한 유저에게 추천하는 영화 pk 목록 (점수 내림차순)
+    '''
+    try:
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return Response({'error': 'limit 은 1 이상의 정수여야 합니다.'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(limit, 100)
+
+    data = {
+        'movies': [
+            {'pk': movie_pk, 'score': score}
+            for movie_pk, score in recommend(request.user, limit=limit)
+        ]
     }
-    return JsonResponse(search_results)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    '''
+    응답 캐시(movies.cache)의 리소스별 hit/miss, 이 프로세스에서 집계한 값
+    '''
+    return Response(cache.stats.snapshot())
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search(request):
+    return Response(search_data(
+        request.GET.get('keyword'),
+        page=request.GET.get('page'),
+        page_size=request.GET.get('page_size'),
+        request=request,
+    ))
+
+
+# 검색 결과 종류별 (응답 key, queryset, movies.rows)
+SEARCH_RESULTS = {
+    'review': ('review_serializer', lambda: Review.objects.for_list(), ReviewListRows),
+    'collection': ('collection_serializer', lambda: Collection.objects.for_list(), CollectionListRows),
+    'movie': ('movie_serializer', lambda: Movie.objects.for_list(), MovieRows),
+}
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+def _positive_int(value, default, maximum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    if value < 1:
+        return default
+    return min(value, maximum) if maximum else value
+
+
+def search_data(keyword, page=None, page_size=None, request=None):
+    '''
+    리뷰, 컬렉션, 영화 검색 결과를 종류별로 관련도 순 page 번째 page_size 개씩 반환 (movies.search)
+    request 가 있으면 liked_by_me 를 그 유저 기준으로 채운다.
+    '''
+    page = _positive_int(page, 1)
+    page_size = _positive_int(page_size, SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE)
+    data = {'page': page}
+    for kind, (key, queryset, rows_class) in SEARCH_RESULTS.items():
+        pks = search_index.search(kind, keyword or '', (page - 1) * page_size, page_size) if keyword else []
+        queryset = queryset().with_like_state(like_user(request), full_like_users(request)).filter(pk__in=pks)
+        serializer_class = rows_class.for_request(request)
+        if serializer_class is rows_class:
+            objects = {row['pk']: row for row in rows_class.values(queryset)}
+        else:
+            objects = queryset.in_bulk()
+        data[key] = serializer_class(
+            [objects[pk] for pk in pks if pk in objects], many=True, context={'request': request},
+        ).data
+    return data
 
 
 @api_view(['GET', 'POST', 'PUT', 'DELETE'])